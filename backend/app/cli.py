@@ -0,0 +1,318 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+from app.models import (
+    Category, CustomerStats, InvoiceExport, Order, OrderItem, Product, RevokedToken, SearchTrigram, StockAlert
+)
+from app.invoice_exports import run_invoice_export
+from app.order_archive import archive_orders
+from app import partitioning
+from app.events import run_dispatcher
+from app.rollups import rebuild_rollups, rollup_date_bounds
+from app.snapshots import write_snapshot
+from app.inventory import DEFAULT_REORDER_THRESHOLD, sync_stock_alerts
+from app.search import create_trigram_indexes, rebuild_search_index, uses_pg_trgm
+from app.customer_stats import refresh_all_customer_stats
+from app.revocation import purge_expired_tokens
+from app.user_import import IMPORT_CHUNK_SIZE, import_users
+from app.datagen import BATCH_SIZE, DEMO_ADMIN, DEMO_CUSTOMER, generate_data
+from datetime import datetime, timedelta
+import time
+from sqlalchemy import func, inspect, or_, select, text, update
+
+orders_cli = AppGroup('orders', help='Order maintenance commands.')
+outbox_cli = AppGroup('outbox', help='Order event outbox commands.')
+analytics_cli = AppGroup('analytics', help='Sales rollup commands.')
+inventory_cli = AppGroup('inventory', help='Stock level commands.')
+search_cli = AppGroup('search', help='Admin search index commands.')
+customers_cli = AppGroup('customers', help='Customer statistics commands.')
+tokens_cli = AppGroup('tokens', help='Token revocation commands.')
+data_cli = AppGroup('data', help='Generated data commands.')
+
+
+def _add_missing_columns(table, columns):
+    """ALTER TABLE to add each (name, DDL type) column the table lacks"""
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table)}
+    for name, ddl_type in columns:
+        if name not in existing:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl_type}'))
+            click.echo(f'Added column {table}.{name}')
+    db.session.commit()
+
+
+def _product_value(column):
+    return select(column).where(Product.id == OrderItem.product_id).scalar_subquery()
+
+
+# Denormalized order_items columns: DDL type and the value to backfill
+ORDER_ITEM_SNAPSHOT_COLUMNS = {
+    'product_name': ('VARCHAR(120)', _product_value(Product.name)),
+    'product_sku': ('VARCHAR(50)', _product_value(Product.sku)),
+    'product_image': ('VARCHAR(200)', _product_value(Product.primary_image)),
+    'product_size': ('VARCHAR(20)', _product_value(Product.size)),
+    'product_color': ('VARCHAR(50)', _product_value(Product.color)),
+    'order_created_at': ('TIMESTAMP', select(Order.created_at).where(Order.id == OrderItem.order_id).scalar_subquery()),
+}
+
+
+@orders_cli.command('snapshot-items')
+@click.option('--batch-size', default=1000, show_default=True, help='Order items updated per transaction.')
+def snapshot_items(batch_size):
+    """Add denormalized product and order columns to order_items and backfill them."""
+    _add_missing_columns('order_items', [(name, ddl_type) for name, (ddl_type, _) in ORDER_ITEM_SNAPSHOT_COLUMNS.items()])
+
+    values = {name: value for name, (_, value) in ORDER_ITEM_SNAPSHOT_COLUMNS.items()}
+
+    # Walk the table in primary key order so every batch is an index range
+    last_id = 0
+    updated = 0
+    while True:
+        ids = db.session.execute(
+            select(OrderItem.id).where(
+                OrderItem.id > last_id,
+                or_(OrderItem.product_name.is_(None), OrderItem.order_created_at.is_(None))
+            ).order_by(OrderItem.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        db.session.execute(
+            update(OrderItem).where(OrderItem.id.in_(ids)).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+        last_id = ids[-1]
+        updated += len(ids)
+        click.echo(f'Backfilled {updated} order items (last id {last_id})')
+
+    click.echo(f'Done, {updated} order items backfilled.')
+
+
+@orders_cli.command('export-invoices')
+@click.argument('start_date', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('end_date', type=click.DateTime(formats=['%Y-%m-%d']))
+def export_invoices(start_date, end_date):
+    """Export every invoice between START_DATE and END_DATE into one ZIP."""
+    export = InvoiceExport(start_date=start_date.date(), end_date=end_date.date())
+    db.session.add(export)
+    db.session.commit()
+
+    run_invoice_export(export.id)
+
+    export = InvoiceExport.query.get(export.id)
+    click.echo(f'Exported {export.processed_orders} invoices to {export.file_path}')
+
+
+@orders_cli.command('init-partitions')
+@click.option('--months-ahead', default=3, show_default=True, help='Future monthly partitions to create.')
+def init_partitions(months_ahead):
+    """Partition orders and order_items by month (PostgreSQL only).
+
+    Run before 'db.create_all()' on a new database, or once on an existing
+    one to convert the plain tables.
+    """
+    if not partitioning.init_partitions(months_ahead):
+        click.echo('Database does not support partitioning; orders stay in plain tables.')
+        return
+    click.echo('orders and order_items are partitioned by month.')
+
+
+@orders_cli.command('create-partitions')
+@click.option('--months-ahead', default=3, show_default=True, help='Future monthly partitions to create.')
+def create_partitions(months_ahead):
+    """Create partitions for the coming months (run monthly)."""
+    for name in partitioning.create_upcoming_partitions(months_ahead):
+        click.echo(f'Ensured partition {name}')
+
+
+@orders_cli.command('archive')
+@click.option('--retention-days', default=None, type=int, help='Keep orders newer than this in the hot tables.')
+@click.option('--batch-size', default=1000, show_default=True, help='Orders archived per transaction.')
+def archive(retention_days, batch_size):
+    """Move orders older than the retention window to order_archive."""
+    retention_days = retention_days or current_app.config['ORDER_RETENTION_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    archived = archive_orders(cutoff, batch_size)
+    click.echo(f'Archived {archived} orders created before {cutoff:%Y-%m-%d}.')
+
+    for name in partitioning.drop_archived_partitions(cutoff.date()):
+        click.echo(f'Dropped empty partition {name}')
+
+
+@outbox_cli.command('dispatch')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when no events are due.')
+@click.option('--once', is_flag=True, help='Exit once no events are due.')
+def dispatch(poll_interval, once):
+    """Deliver pending order events to handlers and the HTTP sink."""
+    delivered = run_dispatcher(poll_interval=poll_interval, once=once)
+    click.echo(f'Processed {delivered} events.')
+
+
+@analytics_cli.command('rebuild-rollups')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild (default: yesterday).')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild (default: today).')
+@click.option('--all', 'rebuild_all', is_flag=True, help='Rebuild every day with orders (initial backfill).')
+def rebuild_rollups_command(since, until, rebuild_all):
+    """Recompute the daily sales rollups from the orders tables, one day per transaction."""
+    today = datetime.utcnow().date()
+    if rebuild_all:
+        first, last = rollup_date_bounds()
+        if first is None:
+            click.echo('No orders to roll up.')
+            return
+        since, until = first, max(last, today)
+    else:
+        since = since.date() if since else today - timedelta(days=1)
+        until = until.date() if until else today
+
+    day, skipped = since, 0
+    while day <= until:
+        if rebuild_rollups(day, day) is None:
+            skipped += 1
+        db.session.commit()
+        day += timedelta(days=1)
+    click.echo(f'Rebuilt rollups from {since} to {until}.')
+    if skipped:
+        click.echo(f'Kept {skipped} days with archived orders as they were.')
+
+
+@analytics_cli.command('snapshot')
+def snapshot():
+    """Export orders, items, products and users to a columnar snapshot."""
+    directory = write_snapshot()
+    click.echo(f'Wrote analytics snapshot {directory}')
+
+
+@inventory_cli.command('init-thresholds')
+def init_thresholds():
+    """Add the reorder threshold columns, low stock index and stock_alerts table."""
+    _add_missing_columns('categories', [('reorder_threshold', 'INTEGER')])
+    _add_missing_columns('products', [
+        ('reorder_threshold', 'INTEGER'),
+        ('low_stock_threshold', f'INTEGER NOT NULL DEFAULT {DEFAULT_REORDER_THRESHOLD}'),
+    ])
+
+    # Products inherit their category's threshold unless they set their own
+    category_threshold = select(Category.reorder_threshold).where(
+        Category.id == Product.category_id
+    ).scalar_subquery()
+    db.session.execute(
+        update(Product).values(
+            low_stock_threshold=func.coalesce(Product.reorder_threshold, category_threshold, DEFAULT_REORDER_THRESHOLD)
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+
+    StockAlert.__table__.create(db.engine, checkfirst=True)
+    for index in Product.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    sync_stock_alerts()
+    db.session.commit()
+    click.echo('Low stock thresholds and alerts are ready.')
+
+
+@inventory_cli.command('scan-stock')
+@click.option('--interval', default=60.0, show_default=True, help='Seconds between scans.')
+@click.option('--once', is_flag=True, help='Scan once and exit.')
+def scan_stock(interval, once):
+    """Open and resolve low stock alerts for changes made outside checkout."""
+    while True:
+        opened, resolved = sync_stock_alerts()
+        db.session.commit()
+        if opened or resolved or once:
+            click.echo(f'Opened {opened} and resolved {resolved} stock alerts.')
+        if once:
+            return
+        time.sleep(interval)
+
+
+@search_cli.command('init-index')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows indexed per transaction (trigram table).')
+def init_search_index(batch_size):
+    """Create the admin search indexes: pg_trgm GIN indexes, or the trigram table elsewhere.
+
+    Outside PostgreSQL, rerun to rebuild the trigram table, e.g. after archiving.
+    """
+    if uses_pg_trgm():
+        create_trigram_indexes()
+        click.echo('Created pg_trgm indexes on orders and users.')
+        return
+    SearchTrigram.__table__.create(db.engine, checkfirst=True)
+    counts = rebuild_search_index(batch_size)
+    click.echo(f"Indexed {counts['order']} orders and {counts['user']} users.")
+
+
+@customers_cli.command('refresh-stats')
+@click.option('--batch-size', default=1000, show_default=True, help='Users recomputed per transaction.')
+def refresh_stats(batch_size):
+    """Recompute customer_stats for every user (run daily to age segments)."""
+    CustomerStats.__table__.create(db.engine, checkfirst=True)
+    # Per-customer refreshes look orders up by user (partitioned orders already have an index)
+    if not any(index['column_names'][:1] == ['user_id'] for index in inspect(db.engine).get_indexes('orders')):
+        db.Index('ix_orders_user_id', Order.user_id).create(db.engine)
+    processed = refresh_all_customer_stats(batch_size)
+    click.echo(f'Refreshed statistics for {processed} customers.')
+
+
+@customers_cli.command('import')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows checked and inserted per transaction.')
+@click.option('--workers', type=int, default=None, help='Password hashing processes (default: one per CPU).')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False), help='Write rejected rows to this CSV file.')
+def import_customers(csv_path, chunk_size, workers, rejects_path):
+    """Import customers from a CSV file (password or bcrypt password_hash column)."""
+    rounds = current_app.config['BCRYPT_ROUNDS']
+    with open(csv_path, newline='', encoding='utf-8') as lines:
+        if rejects_path:
+            with open(rejects_path, 'w', newline='', encoding='utf-8') as reject_file:
+                stats = import_users(lines, rounds, chunk_size, workers, reject_file)
+        else:
+            stats = import_users(lines, rounds, chunk_size, workers)
+    click.echo(f'Imported {stats.imported} of {stats.read} rows, rejected {stats.rejected} '
+               f'in {stats.elapsed:.1f}s ({stats.rows_per_second:,.0f} rows/s).')
+    if stats.hashed:
+        click.echo(f'Hashed {stats.hashed} passwords in {stats.hash_seconds:.1f}s '
+                   f'({stats.hashed / max(stats.hash_seconds, 1e-9):,.0f} hashes/s).')
+    if stats.rejected and not rejects_path:
+        click.echo('Pass --rejects to write the rejected rows and reasons to a file.')
+
+
+@tokens_cli.command('purge')
+def purge_tokens():
+    """Delete revocations of expired tokens (run daily)."""
+    RevokedToken.__table__.create(db.engine, checkfirst=True)
+    purged = purge_expired_tokens()
+    click.echo(f'Purged {purged} expired token revocations.')
+
+
+@data_cli.command('generate')
+@click.option('--users', default=1000, show_default=True, help='Users, including the demo admin and customer.')
+@click.option('--categories', default=10, show_default=True, help='Categories.')
+@click.option('--products', default=2000, show_default=True, help='Products.')
+@click.option('--carts', default=1000, show_default=True, help='Cart rows.')
+@click.option('--orders', default=5000, show_default=True, help='Orders, with one to five items each.')
+@click.option('--seed', default=42, show_default=True, help='Random seed; the same seed writes the same rows.')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), help='End of the order history (default: today).')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows written per statement or COPY.')
+def generate(users, categories, products, carts, orders, seed, end_date, batch_size):
+    """Fill an empty database with realistic generated data."""
+    db.create_all()
+
+    def progress(step, rows, seconds):
+        if rows is None:
+            click.echo(f'Built {step} in {seconds:.1f}s.')
+        else:
+            click.echo(f'Wrote {rows:,} {step} in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s).')
+
+    started = time.perf_counter()
+    try:
+        counts = generate_data(users, categories, products, carts, orders, seed, end_date, batch_size, progress)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f'Generated {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s.')
+    click.echo(f'Admin: {DEMO_ADMIN[0]} / {DEMO_ADMIN[1]}')
+    click.echo(f'Customer: {DEMO_CUSTOMER[0]} / {DEMO_CUSTOMER[1]}')
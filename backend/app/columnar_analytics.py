@@ -0,0 +1,199 @@
+"""Cohort, RFM and basket analytics over columnar snapshots.
+
+Every function takes a Snapshot (see app.snapshots) and works only on its
+memory-mapped NumPy columns, so these analytics never touch the live
+database. Cancelled orders are excluded throughout.
+"""
+import json
+import os
+import threading
+import numpy as np
+from app.snapshots import column_path, current_snapshot_dir
+
+
+RFM_SEGMENTS = [
+    # (segment, minimum recency score, minimum frequency score); first match wins
+    ('champions', 4, 4),
+    ('loyal', 3, 3),
+    ('new', 4, 1),
+    ('at_risk', 1, 3),
+    ('needs_attention', 3, 1),
+    ('hibernating', 1, 1),
+]
+
+
+class Snapshot:
+    """Read-only view of one snapshot's columns"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json')) as handle:
+            self.manifest = json.load(handle)
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.manifest['name']
+
+    @property
+    def created_at(self):
+        return self.manifest['created_at']
+
+    def column(self, table, name):
+        """Memory-mapped column, trimmed to the rows actually written"""
+        key = (table, name)
+        with self._lock:
+            if key not in self._columns:
+                rows = self.manifest['tables'][table]['rows']
+                self._columns[key] = np.load(column_path(self.directory, table, name), mmap_mode='r')[:rows]
+            return self._columns[key]
+
+    def code(self, table, name, label):
+        return self.manifest['categories'][f'{table}.{name}'].index(label)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def load_current_snapshot(root=None):
+    """Return the current Snapshot, reopening it when a newer one is published, or None"""
+    global _snapshot
+    directory = current_snapshot_dir(root)
+    if directory is None:
+        return None
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.directory != directory:
+            _snapshot = Snapshot(directory)
+        return _snapshot
+
+
+def _valid_orders(snapshot):
+    """Boolean mask of orders that count as sales"""
+    return snapshot.column('orders', 'status') != snapshot.code('orders', 'status', 'cancelled')
+
+
+def _month_index(timestamps):
+    """Months since 1970-01 for datetime64 values"""
+    return timestamps.astype('datetime64[M]').astype(np.int64)
+
+
+def cohort_retention(snapshot, months=12):
+    """Share of each first-order-month cohort that ordered again k months later.
+
+    Returns cohorts oldest first, each with its size and a retention list
+    whose k-th entry covers the k-th month after the first order.
+    """
+    mask = _valid_orders(snapshot)
+    user_ids = snapshot.column('orders', 'user_id')[mask]
+    if user_ids.size == 0:
+        return []
+    order_months = _month_index(snapshot.column('orders', 'created_at')[mask])
+
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    first_month = np.full(users.size, np.iinfo(np.int64).max)
+    np.minimum.at(first_month, user_index, order_months)
+
+    offsets = order_months - first_month[user_index]
+    in_range = offsets < months
+    # Each user counts once per (cohort, offset) however many orders they placed
+    active = np.unique(user_index[in_range] * months + offsets[in_range])
+    active_users, active_offsets = np.divmod(active, months)
+
+    cohorts, cohort_index = np.unique(first_month, return_inverse=True)
+    cohort_sizes = np.bincount(cohort_index)
+    matrix = np.zeros((cohorts.size, months), dtype=np.int64)
+    np.add.at(matrix, (cohort_index[active_users], active_offsets), 1)
+
+    retention = matrix / cohort_sizes[:, None]
+    return [
+        {
+            'cohort': f'{month // 12 + 1970}-{month % 12 + 1:02d}',
+            'customers': int(size),
+            'retention': [round(float(value), 4) for value in row]
+        }
+        for month, size, row in zip(cohorts, cohort_sizes, retention)
+    ]
+
+
+def _quintile_scores(values, higher_is_better=True):
+    """Score values 1-5 by quintile"""
+    edges = np.quantile(values, [0.2, 0.4, 0.6, 0.8])
+    scores = np.searchsorted(edges, values, side='right') + 1
+    return scores if higher_is_better else 6 - scores
+
+
+def rfm_segments(snapshot, as_of=None):
+    """Segment customers by recency and frequency quintiles and summarize each segment's spend"""
+    mask = _valid_orders(snapshot)
+    user_ids = snapshot.column('orders', 'user_id')[mask]
+    if user_ids.size == 0:
+        return {'customers': 0, 'segments': {}}
+    created_at = snapshot.column('orders', 'created_at')[mask]
+    totals = snapshot.column('orders', 'total_amount')[mask]
+
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    frequency = np.bincount(user_index)
+    monetary = np.bincount(user_index, weights=totals)
+    last_order = np.full(users.size, np.datetime64('1970-01-01T00:00:00', 's'))
+    np.maximum.at(last_order, user_index, created_at)
+
+    as_of = np.datetime64(as_of or snapshot.created_at, 's')
+    recency_days = (as_of - last_order).astype('timedelta64[D]').astype(np.int64)
+
+    recency_score = _quintile_scores(recency_days, higher_is_better=False)
+    frequency_score = _quintile_scores(frequency)
+
+    segment = np.full(users.size, '', dtype=object)
+    for name, min_recency, min_frequency in RFM_SEGMENTS:
+        match = (segment == '') & (recency_score >= min_recency) & (frequency_score >= min_frequency)
+        segment[match] = name
+
+    summary = {}
+    for name, _, _ in RFM_SEGMENTS:
+        members = segment == name
+        count = int(members.sum())
+        if not count:
+            continue
+        summary[name] = {
+            'customers': count,
+            'avg_recency_days': round(float(recency_days[members].mean()), 1),
+            'avg_orders': round(float(frequency[members].mean()), 2),
+            'avg_monetary': round(float(monetary[members].mean()), 2)
+        }
+    return {'customers': int(users.size), 'as_of': str(as_of), 'segments': summary}
+
+
+def basket_metrics(snapshot, max_size=20):
+    """Distribution of units and distinct products per order, and order values"""
+    mask = _valid_orders(snapshot)
+    order_ids = snapshot.column('orders', 'id')[mask]
+    totals = snapshot.column('orders', 'total_amount')[mask]
+    if order_ids.size == 0:
+        return {'orders': 0}
+
+    item_order_ids = snapshot.column('order_items', 'order_id')
+    quantities = snapshot.column('order_items', 'quantity')
+    # Order ids are unique and sorted (the snapshot is written in id order)
+    position = np.searchsorted(order_ids, item_order_ids)
+    position = np.minimum(position, order_ids.size - 1)
+    counted = order_ids[position] == item_order_ids
+
+    units = np.bincount(position[counted], weights=quantities[counted], minlength=order_ids.size)
+    lines = np.bincount(position[counted], minlength=order_ids.size)
+
+    # Orders above max_size share the last bucket
+    histogram = np.bincount(np.minimum(units.astype(np.int64), max_size), minlength=max_size + 1)
+    p50, p90, p99 = np.percentile(totals, [50, 90, 99])
+    return {
+        'orders': int(order_ids.size),
+        'avg_units': round(float(units.mean()), 2),
+        'avg_distinct_products': round(float(lines.mean()), 2),
+        'avg_order_value': round(float(totals.mean()), 2),
+        'order_value_percentiles': {'p50': round(float(p50), 2), 'p90': round(float(p90), 2), 'p99': round(float(p99), 2)},
+        'units_distribution': {
+            (f'{size}+' if size == max_size else str(size)): int(count)
+            for size, count in enumerate(histogram) if count
+        }
+    }
@@ -0,0 +1,162 @@
+"""Materialized per-customer statistics for the admin user list.
+
+customer_stats holds one row per user: order count and lifetime value
+(cancelled orders excluded, archived orders included), first and last
+order dates, and a marketing segment. New users get a row on insert; order.created and order.cancelled
+outbox events, and order.status_changed events into or out of cancelled,
+refresh their customer's row; ``flask customers refresh-stats`` recomputes
+every row in batches, which also moves customers between the time-based
+segments, and should run daily. Users without a row yet (registered before
+customer_stats existed) are listed with the defaults of a prospect.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, event, func, insert, literal, select, union_all
+from app import db
+from app.events import ORDER_CANCELLED, ORDER_CREATED, ORDER_STATUS_CHANGED, handles
+from app.models import CustomerStats, Order, OrderArchive, User
+
+
+STATS_BATCH_SIZE = 1000
+VIP_LIFETIME_VALUE = 1000
+
+SEGMENTS = ['prospect', 'new', 'active', 'loyal', 'vip', 'at_risk', 'lapsed']
+
+# Users without a stats row sort as having no orders; callers add nulls_last()
+# so customers who never ordered come after the others either way round
+CUSTOMER_SORTS = {
+    'created_at': User.created_at,
+    'lifetime_value': func.coalesce(CustomerStats.lifetime_value, 0),
+    'orders_count': func.coalesce(CustomerStats.orders_count, 0),
+    'last_order_at': CustomerStats.last_order_at,
+}
+
+
+def segment_expression(orders_count, lifetime_value, first_order_at, last_order_at, now):
+    """SQL CASE assigning a segment; the first matching rule wins"""
+    return case(
+        (orders_count == 0, 'prospect'),
+        (last_order_at < now - timedelta(days=365), 'lapsed'),
+        (last_order_at < now - timedelta(days=180), 'at_risk'),
+        (lifetime_value >= VIP_LIFETIME_VALUE, 'vip'),
+        (orders_count >= 3, 'loyal'),
+        (first_order_at >= now - timedelta(days=90), 'new'),
+        else_='active'
+    )
+
+
+def _customer_orders(condition):
+    """Non-cancelled orders, live and archived, of the users matching ``condition``"""
+    user_ids = select(User.id).where(condition)
+    return union_all(
+        select(Order.user_id, Order.total_amount, Order.created_at).where(
+            Order.user_id.in_(user_ids), Order.status != 'cancelled'
+        ),
+        select(OrderArchive.user_id, OrderArchive.total_amount, OrderArchive.created_at).where(
+            OrderArchive.user_id.in_(user_ids), OrderArchive.status != 'cancelled'
+        )
+    ).subquery()
+
+
+def _stats_select(condition):
+    """Recomputed customer_stats rows for the users matching ``condition``"""
+    now = datetime.utcnow()
+    orders = _customer_orders(condition)
+    orders_count = func.count(orders.c.user_id)
+    lifetime_value = func.coalesce(func.sum(orders.c.total_amount), 0)
+    first_order_at = func.min(orders.c.created_at)
+    last_order_at = func.max(orders.c.created_at)
+    return select(
+        User.id,
+        orders_count,
+        lifetime_value,
+        first_order_at,
+        last_order_at,
+        segment_expression(orders_count, lifetime_value, first_order_at, last_order_at, now),
+        literal(now)
+    ).select_from(User).outerjoin(
+        orders, orders.c.user_id == User.id
+    ).where(condition).group_by(User.id)
+
+
+def _replace_stats(condition):
+    db.session.execute(
+        delete(CustomerStats).where(CustomerStats.user_id.in_(select(User.id).where(condition))),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(insert(CustomerStats).from_select(
+        ['user_id', 'orders_count', 'lifetime_value', 'first_order_at', 'last_order_at', 'segment', 'updated_at'],
+        _stats_select(condition)
+    ))
+
+
+def refresh_customer_stats(user_ids):
+    """Recompute the rows of the given users from their orders (the caller commits)"""
+    if user_ids:
+        _replace_stats(User.id.in_(sorted(set(user_ids))))
+
+
+def refresh_all_customer_stats(batch_size=STATS_BATCH_SIZE):
+    """Recompute every row, one range of user ids per transaction. Returns the users processed."""
+    last_id = 0
+    processed = 0
+    while True:
+        ids = db.session.execute(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return processed
+        _replace_stats(User.id.between(ids[0], ids[-1]))
+        db.session.commit()
+        last_id = ids[-1]
+        processed += len(ids)
+
+
+def filter_customers(query, segment=None, min_lifetime_value=None, min_orders=None,
+                     last_order_after=None, last_order_before=None):
+    """Outer join customer_stats onto a User query and apply the customer filters.
+
+    A missing row counts as a prospect with no orders.
+    """
+    query = query.outerjoin(CustomerStats, CustomerStats.user_id == User.id)
+    if segment:
+        query = query.filter(func.coalesce(CustomerStats.segment, 'prospect') == segment)
+    if min_lifetime_value is not None:
+        query = query.filter(func.coalesce(CustomerStats.lifetime_value, 0) >= min_lifetime_value)
+    if min_orders is not None:
+        query = query.filter(func.coalesce(CustomerStats.orders_count, 0) >= min_orders)
+    if last_order_after is not None:
+        query = query.filter(CustomerStats.last_order_at >= last_order_after)
+    if last_order_before is not None:
+        query = query.filter(CustomerStats.last_order_at < last_order_before)
+    return query
+
+
+def default_customer_stats(user):
+    """An unsaved row with a prospect's defaults, for users that have none yet"""
+    return CustomerStats(user_id=user.id, orders_count=0, lifetime_value=0, segment='prospect')
+
+
+@event.listens_for(User, 'after_insert')
+def create_customer_stats(mapper, connection, target):
+    connection.execute(insert(CustomerStats).values(
+        user_id=target.id,
+        orders_count=0,
+        lifetime_value=0,
+        segment='prospect',
+        updated_at=datetime.utcnow()
+    ))
+
+
+@handles(ORDER_CREATED)
+@handles(ORDER_CANCELLED)
+def refresh_customer_on_order_event(message):
+    # The dispatcher commits once the event is marked delivered
+    refresh_customer_stats([message['payload']['user_id']])
+
+
+@handles(ORDER_STATUS_CHANGED)
+def refresh_customer_on_status_change(message):
+    # Only cancelled orders are excluded from the stats, so other moves change nothing
+    payload = message['payload']
+    if 'cancelled' in (payload['status'], payload.get('previous_status')):
+        refresh_customer_stats([payload['user_id']])
@@ -0,0 +1,106 @@
+"""Admin dashboard statistics.
+
+The dashboard is built from four queries: one row of conditional
+aggregates over users, products and the daily sales rollup, plus the
+status distribution, top products and monthly revenue. Like the product
+analytics, top products count the units of paid orders only (the product
+rollups hold nothing else); the totals still count every order. The result is
+cached per process for DASHBOARD_CACHE_TTL seconds, and concurrent
+requests for a stale dashboard wait for a single recomputation.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func, select
+from app import db
+from app.cache import TTLCache
+from app.models import DailyOrderBreakdown, DailyProductSales, DailySales, Product, User
+from app.rollups import group_by_month
+
+
+dashboard_cache = TTLCache(ttl=30)
+
+
+def _sum_if(condition, column):
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def compute_dashboard_stats():
+    """Compute the dashboard payload (JSON-ready)"""
+    today = datetime.utcnow().date()
+    month_ago = today - timedelta(days=30)
+    six_months_ago = today - timedelta(days=180)
+
+    month_users = case((User.created_at >= month_ago, User.id))
+    recent = DailySales.day >= month_ago
+    # Each scalar subquery returns exactly one value, so this is a single round trip
+    totals = db.session.execute(select(
+        select(func.count(User.id)).scalar_subquery().label('total'),
+        select(func.count(month_users)).scalar_subquery().label('recent'),
+        select(func.count(Product.id)).where(Product.is_active.is_(True)).scalar_subquery().label('active'),
+        select(func.coalesce(func.sum(DailySales.orders_count), 0)).scalar_subquery().label('orders'),
+        select(func.coalesce(func.sum(DailySales.revenue), 0)).scalar_subquery().label('revenue'),
+        select(_sum_if(recent, DailySales.orders_count)).scalar_subquery().label('recent_orders'),
+        select(_sum_if(recent, DailySales.revenue)).scalar_subquery().label('recent_revenue')
+    )).one()
+
+    status_distribution = db.session.execute(
+        select(
+            DailyOrderBreakdown.value,
+            func.sum(DailyOrderBreakdown.orders_count)
+        ).where(
+            DailyOrderBreakdown.dimension == 'status'
+        ).group_by(DailyOrderBreakdown.value)
+    ).all()
+
+    top_products = db.session.execute(
+        select(
+            Product.id,
+            Product.name,
+            func.sum(DailyProductSales.units_sold).label('total_sold')
+        ).select_from(DailyProductSales).join(
+            Product, Product.id == DailyProductSales.product_id
+        ).group_by(Product.id, Product.name).order_by(
+            func.sum(DailyProductSales.units_sold).desc()
+        ).limit(5)
+    ).all()
+
+    monthly_revenue = group_by_month(db.session.execute(
+        select(DailySales.day, DailySales.paid_revenue).where(DailySales.day >= six_months_ago)
+    ).all())
+
+    return {
+        'totals': {
+            'users': totals.total,
+            'products': totals.active,
+            'orders': int(totals.orders),
+            'revenue': float(totals.revenue)
+        },
+        'recent_stats': {
+            'new_users': totals.recent,
+            'new_orders': int(totals.recent_orders),
+            'recent_revenue': float(totals.recent_revenue)
+        },
+        'order_status_distribution': {status: int(count) for status, count in status_distribution if count},
+        'top_products': [
+            {
+                'product_id': product_id,
+                'product_name': name,
+                'total_sold': int(total_sold)
+            }
+            for product_id, name, total_sold in top_products
+        ],
+        'monthly_revenue': [
+            {
+                'month': month,
+                'revenue': float(revenue)
+            }
+            for month, revenue in monthly_revenue.items()
+        ]
+    }
+
+
+def cached_dashboard_stats():
+    """Return the cached dashboard, recomputing it at most once per TTL"""
+    return dashboard_cache.get_or_compute(
+        'dashboard', compute_dashboard_stats, ttl=current_app.config['DASHBOARD_CACHE_TTL']
+    )
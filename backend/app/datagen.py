@@ -0,0 +1,441 @@
+"""Deterministic bulk data for development, benchmarks and load tests.
+
+``flask data generate`` fills an empty database with the requested numbers
+of users, categories, products, cart rows and orders (with one to five items
+each). Given the same sizes, seed and end date it writes the same rows.
+
+The data is shaped like a shop's rather than uniform noise: product and
+category popularity and customer activity follow Zipf-like curves, order
+dates follow a seasonal curve (a November-December peak, busier weekends
+and evenings, growth over the year) and order statuses depend on the age of
+the order. Rows are generated as a stream and written in batches, with COPY
+on PostgreSQL (psycopg2) and executemany inserts elsewhere. The stock
+alerts, rollups, customer statistics and search index are then derived the
+way the maintenance commands do.
+
+User 1 is the DEMO_ADMIN account and user 2 the DEMO_CUSTOMER account, who
+owns DEMO_CUSTOMER_ORDERS orders and a few cart items. Every other
+customer shares DEMO_CUSTOMER's password.
+"""
+import csv
+import io
+import json
+import math
+import random
+import time
+from array import array
+from bisect import bisect
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+import bcrypt
+from flask import current_app
+from sqlalchemy import select, text
+from app import db
+from app import partitioning
+from app.customer_stats import refresh_all_customer_stats
+from app.inventory import sync_stock_alerts
+from app.models import Cart, Category, Order, OrderItem, Product, User
+from app.pricing import SHIPPING_AMOUNT, TAX_RATE, to_money
+from app.rollups import rebuild_rollups, rollup_date_bounds
+from app.search import create_trigram_indexes, rebuild_search_index, uses_pg_trgm
+
+
+BATCH_SIZE = 10_000
+HISTORY_DAYS = 365
+CART_DAYS = 30
+
+DEMO_ADMIN = ('admin@empowerfashion.com', 'admin123')
+DEMO_CUSTOMER = ('customer@example.com', 'customer123')
+DEMO_CUSTOMER_ORDERS = 20
+DEMO_CART_ITEMS = 3
+
+# Zipf exponents: a few products and categories sell most, customer activity is flatter
+PRODUCT_SKEW = 0.9
+CATEGORY_SKEW = 0.8
+CUSTOMER_SKEW = 0.5
+
+MONTH_WEIGHTS = (0.85, 0.8, 0.9, 0.95, 1.0, 0.95, 0.9, 0.95, 1.0, 1.05, 1.4, 1.7)
+WEEKDAY_WEIGHTS = (0.9, 0.9, 0.95, 1.0, 1.1, 1.3, 1.2)  # Monday first
+HOUR_WEIGHTS = (2, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 9, 10, 9, 8, 8, 9, 10, 12, 14, 14, 12, 8, 4)
+YEARLY_GROWTH = 0.2  # on top of new customers joining during the history
+
+BASKET_SIZES = (1, 2, 3, 4, 5)
+BASKET_WEIGHTS = (45, 28, 15, 8, 4)
+QUANTITIES = (1, 2, 3)
+QUANTITY_WEIGHTS = (82, 14, 4)
+
+# (maximum age in days, statuses, weights); the last bracket has no maximum
+STATUS_BY_AGE = (
+    (1, ('pending', 'confirmed', 'cancelled'), (55, 40, 5)),
+    (3, ('confirmed', 'processing', 'shipped', 'cancelled'), (15, 40, 40, 5)),
+    (10, ('processing', 'shipped', 'delivered', 'cancelled'), (5, 35, 55, 5)),
+    (None, ('delivered', 'cancelled'), (94, 6)),
+)
+
+CATEGORY_GARMENTS = {
+    'Dresses': ('Dress', 'Maxi Dress', 'Midi Dress', 'Shirt Dress', 'Wrap Dress'),
+    'Tops': ('Blouse', 'T-Shirt', 'Camisole', 'Tunic', 'Shirt'),
+    'Bottoms': ('Jeans', 'Trousers', 'Skirt', 'Shorts', 'Culottes'),
+    'Outerwear': ('Jacket', 'Coat', 'Blazer', 'Trench Coat', 'Gilet'),
+    'Accessories': ('Handbag', 'Scarf', 'Belt', 'Necklace', 'Hat'),
+    'Shoes': ('Sneakers', 'Sandals', 'Ankle Boots', 'Loafers', 'Pumps'),
+    'Activewear': ('Leggings', 'Sports Bra', 'Tank Top', 'Running Shorts', 'Track Jacket'),
+    'Knitwear': ('Sweater', 'Cardigan', 'Knit Vest', 'Turtleneck', 'Poncho'),
+    'Loungewear': ('Pyjama Set', 'Robe', 'Joggers', 'Hoodie', 'Lounge Shorts'),
+    'Traditional Wear': ('Kaftan', 'Kitenge Dress', 'Kikoi', 'Dashiki', 'Kanga Wrap'),
+}
+CATEGORY_NAMES = tuple(CATEGORY_GARMENTS)
+GARMENTS = tuple(garment for garments in CATEGORY_GARMENTS.values() for garment in garments)
+ADJECTIVES = ('Classic', 'Relaxed', 'Tailored', 'Everyday', 'Vintage', 'Modern', 'Essential', 'Cropped')
+MATERIALS = ('Cotton', 'Linen', 'Silk', 'Wool', 'Denim', 'Leather', 'Polyester', 'Cashmere')
+BRANDS = ('Empower', 'StyleCo', 'UrbanChic', 'ElegantWear', 'ModernStyle', 'Savanna', 'Kilima', 'Pwani')
+COLORS = ('Black', 'White', 'Navy', 'Red', 'Olive', 'Rust', 'Sand', 'Gray', 'Pink', 'Brown')
+SIZES = ('XS', 'S', 'M', 'L', 'XL', 'XXL')
+GENDERS = ('Women', 'Men', 'Unisex')
+GENDER_WEIGHTS = (60, 25, 15)
+
+FIRST_NAMES = ('Amina', 'Brian', 'Caroline', 'David', 'Esther', 'Faith', 'George', 'Grace', 'Hassan', 'Irene',
+               'James', 'Joyce', 'Kevin', 'Lucy', 'Mary', 'Michael', 'Njeri', 'Otieno', 'Peter', 'Wanjiru')
+LAST_NAMES = ('Achieng', 'Barasa', 'Chege', 'Kamau', 'Kariuki', 'Kiprop', 'Mutua', 'Mwangi', 'Njoroge', 'Ochieng',
+              'Odhiambo', 'Omondi', 'Onyango', 'Otieno', 'Wafula', 'Wambui')
+STREETS = ('Moi Avenue', 'Kenyatta Avenue', 'Ngong Road', 'Waiyaki Way', 'Mombasa Road', 'Oginga Odinga Street')
+CITIES = (
+    ('Nairobi', 'Nairobi', '00100', 40), ('Mombasa', 'Mombasa', '80100', 15), ('Kisumu', 'Kisumu', '40100', 10),
+    ('Nakuru', 'Nakuru', '20100', 10), ('Eldoret', 'Uasin Gishu', '30100', 8), ('Thika', 'Kiambu', '01000', 7),
+)
+
+
+class _Skewed:
+    """Draws ids with Zipf-like popularity; which ids are the popular ones is shuffled"""
+
+    def __init__(self, rng, ids, exponent):
+        self._ids = list(ids)
+        rng.shuffle(self._ids)
+        self._cum_weights = list(accumulate(rank ** -exponent for rank in range(1, len(self._ids) + 1)))
+
+    def draw(self, rng):
+        index = bisect(self._cum_weights, rng.random() * self._cum_weights[-1])
+        return self._ids[min(index, len(self._ids) - 1)]
+
+    def draw_distinct(self, rng, count):
+        picked = []
+        while len(picked) < min(count, len(self._ids)):
+            value = self.draw(rng)
+            if value not in picked:
+                picked.append(value)
+        return picked
+
+
+class _Calendar:
+    """Order timestamps over the history, weighted by season, weekday, hour and growth"""
+
+    def __init__(self, start, days):
+        self.start = start
+        self._cum_weights = list(accumulate(
+            MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()] * (1 + YEARLY_GROWTH * offset / days)
+            for offset, day in ((offset, start + timedelta(days=offset)) for offset in range(days))
+        ))
+        self._hour_cum_weights = list(accumulate(HOUR_WEIGHTS))
+
+    def draw(self, rng, first_day=0):
+        """A timestamp on day ``first_day`` of the history or later"""
+        low = self._cum_weights[first_day - 1] if first_day else 0.0
+        day = bisect(self._cum_weights, low + rng.random() * (self._cum_weights[-1] - low))
+        hour = bisect(self._hour_cum_weights, rng.random() * self._hour_cum_weights[-1])
+        return self.start + timedelta(days=min(day, len(self._cum_weights) - 1), hours=min(hour, 23),
+                                      seconds=rng.randrange(3600))
+
+
+class _Catalog:
+    """Per-product attributes the order items snapshot, packed to stay small at millions of rows"""
+
+    def __init__(self, count):
+        self.price_cents = array('l', [0]) * (count + 1)
+        self.adjective = bytearray(count + 1)
+        self.material = bytearray(count + 1)
+        self.garment = bytearray(count + 1)
+        self.color = bytearray(count + 1)
+        self.size = bytearray(count + 1)
+
+    def name(self, product_id):
+        return (f'{ADJECTIVES[self.adjective[product_id]]} {MATERIALS[self.material[product_id]]} '
+                f'{GARMENTS[self.garment[product_id]]}')
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _uses_copy():
+    bind = db.session.get_bind()
+    return bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2'
+
+
+def _copy_value(value):
+    # None becomes an empty unquoted field, which COPY reads as NULL
+    return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+
+def _write_batch(table, batch):
+    """Write one batch of row dicts in the current transaction"""
+    if not _uses_copy():
+        db.session.execute(table.insert(), batch)
+        return
+    columns = list(batch[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    with db.session.connection().connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _load(model, rows, batch_size):
+    """Write row dicts in batches, one transaction each. Returns the rows written."""
+    written = 0
+    for batch in _batches(rows, batch_size):
+        _write_batch(model.__table__, batch)
+        db.session.commit()
+        written += len(batch)
+    return written
+
+
+def _users(rng, count, end, names, signup_days):
+    """Yield user rows, recording each user's names and first possible order day"""
+    customer_hash = bcrypt.hashpw(DEMO_CUSTOMER[1].encode('utf-8'),
+                                  bcrypt.gensalt(current_app.config['BCRYPT_ROUNDS'])).decode('utf-8')
+    for user_id in range(1, count + 1):
+        if user_id <= 2:
+            first, last = (0, 0) if user_id == 1 else (5, 7)
+            signup = -HISTORY_DAYS
+        else:
+            first, last = rng.randrange(len(FIRST_NAMES)), rng.randrange(len(LAST_NAMES))
+            # Three in four customers joined before the history starts, the rest during it
+            signup = rng.randrange(-3 * HISTORY_DAYS, HISTORY_DAYS)
+        names.append(first * len(LAST_NAMES) + last)
+        signup_days.append(max(0, signup))
+        created_at = end - timedelta(days=HISTORY_DAYS - signup, seconds=rng.randrange(86400))
+        if user_id == 1:
+            email, password_hash = DEMO_ADMIN[0], bcrypt.hashpw(
+                DEMO_ADMIN[1].encode('utf-8'), bcrypt.gensalt(current_app.config['BCRYPT_ROUNDS'])
+            ).decode('utf-8')
+        elif user_id == 2:
+            email, password_hash = DEMO_CUSTOMER[0], customer_hash
+        else:
+            email = f'{FIRST_NAMES[first].lower()}.{LAST_NAMES[last].lower()}{user_id}@example.com'
+            password_hash = customer_hash
+        yield {
+            'id': user_id, 'email': email, 'password_hash': password_hash,
+            'first_name': 'Admin' if user_id == 1 else FIRST_NAMES[first],
+            'last_name': 'User' if user_id == 1 else LAST_NAMES[last],
+            'phone': f'+2547{user_id:08d}', 'is_admin': user_id == 1, 'is_active': True,
+            'created_at': created_at, 'updated_at': created_at,
+        }
+
+
+def _categories(count, end):
+    for category_id in range(1, count + 1):
+        base = CATEGORY_NAMES[(category_id - 1) % len(CATEGORY_NAMES)]
+        series = (category_id - 1) // len(CATEGORY_NAMES)
+        yield {
+            'id': category_id, 'name': f'{base} {series + 1}' if series else base,
+            'description': f'{base} for every occasion', 'image_url': f'/images/categories/{category_id}.jpg',
+            'is_active': True, 'created_at': end - timedelta(days=2 * HISTORY_DAYS),
+        }
+
+
+def _products(rng, count, category_count, end, catalog):
+    categories = _Skewed(rng, range(1, category_count + 1), CATEGORY_SKEW)
+    garments = {base: tuple(GARMENTS.index(garment) for garment in names) for base, names in CATEGORY_GARMENTS.items()}
+    for product_id in range(1, count + 1):
+        category_id = categories.draw(rng)
+        base = CATEGORY_NAMES[(category_id - 1) % len(CATEGORY_NAMES)]
+        garment = rng.choice(garments[base])
+        adjective, material = rng.randrange(len(ADJECTIVES)), rng.randrange(len(MATERIALS))
+        color, size = rng.randrange(len(COLORS)), rng.randrange(len(SIZES))
+        # Log-normal prices around 40 with a long tail, ending in .99
+        price_cents = int(min(600, max(5, rng.lognormvariate(math.log(40), 0.6)))) * 100 + 99
+        sale_cents = price_cents * rng.randrange(70, 86) // 100 if rng.random() < 0.15 else None
+        catalog.price_cents[product_id] = sale_cents or price_cents
+        catalog.adjective[product_id], catalog.material[product_id] = adjective, material
+        catalog.garment[product_id], catalog.color[product_id], catalog.size[product_id] = garment, color, size
+        name = catalog.name(product_id)
+        brand = rng.choice(BRANDS)
+        stock = rng.random()
+        created_at = end - timedelta(days=rng.randrange(2 * HISTORY_DAYS), seconds=rng.randrange(86400))
+        yield {
+            'id': product_id, 'name': name,
+            'description': f'{name} in {COLORS[color].lower()}, cut for a {SIZES[size]} fit.',
+            'price': Decimal(price_cents) / 100,
+            'sale_price': Decimal(sale_cents) / 100 if sale_cents else None,
+            'sku': f'EMP-{product_id:07d}', 'slug': f"{name.lower().replace(' ', '-')}-{product_id}",
+            # Mostly well stocked, with some products running low or sold out
+            'stock_quantity': 0 if stock < 0.04 else rng.randrange(1, 11) if stock < 0.12 else rng.randrange(20, 301),
+            'low_stock_threshold': 10, 'category_id': category_id,
+            'brand': brand, 'color': COLORS[color], 'size': SIZES[size],
+            'material': MATERIALS[material], 'gender': rng.choices(GENDERS, GENDER_WEIGHTS)[0],
+            'primary_image': f'/images/products/{product_id}.jpg',
+            'additional_images': [f'/images/products/{product_id}-2.jpg'],
+            'meta_description': f'{name} by {brand}'[:160],
+            'tags': [GARMENTS[garment].lower(), MATERIALS[material].lower(), base.lower()],
+            'is_active': True, 'is_featured': rng.random() < 0.02,
+            'created_at': created_at, 'updated_at': created_at,
+        }
+
+
+def _status(rng, age_days):
+    for max_age, statuses, weights in STATUS_BY_AGE:
+        if max_age is None or age_days < max_age:
+            return rng.choices(statuses, weights)[0]
+
+
+def _orders(rng, count, user_count, end, calendar, products, catalog, names, signup_days):
+    """Yield (order row, item rows) pairs"""
+    customers = _Skewed(rng, range(3, user_count + 1) if user_count > 2 else [2], CUSTOMER_SKEW)
+    cities = [city[:3] for city in CITIES]
+    city_weights = [city[3] for city in CITIES]
+    item_id = 0
+    for order_id in range(1, count + 1):
+        user_id = 2 if order_id <= DEMO_CUSTOMER_ORDERS else customers.draw(rng)
+        created_at = calendar.draw(rng, signup_days[user_id - 1])
+        status = _status(rng, (end - created_at).days)
+        items = []
+        for product_id in products.draw_distinct(rng, rng.choices(BASKET_SIZES, BASKET_WEIGHTS)[0]):
+            item_id += 1
+            quantity = rng.choices(QUANTITIES, QUANTITY_WEIGHTS)[0]
+            unit_price = Decimal(catalog.price_cents[product_id]) / 100
+            items.append({
+                'id': item_id, 'order_id': order_id, 'product_id': product_id, 'quantity': quantity,
+                'unit_price': unit_price, 'total_price': unit_price * quantity, 'order_created_at': created_at,
+                'product_name': catalog.name(product_id), 'product_sku': f'EMP-{product_id:07d}',
+                'product_image': f'/images/products/{product_id}.jpg',
+                'product_size': SIZES[catalog.size[product_id]], 'product_color': COLORS[catalog.color[product_id]],
+            })
+        subtotal = sum(item['total_price'] for item in items)
+        tax = to_money(subtotal * TAX_RATE)
+        first, last = divmod(names[user_id - 1], len(LAST_NAMES))
+        city, state, postal_code = rng.choices(cities, city_weights)[0]
+        order = {
+            'id': order_id, 'user_id': user_id, 'order_number': f'EMP{created_at:%Y%m%d}{order_id:09d}',
+            'status': status, 'subtotal': subtotal, 'tax_amount': tax, 'shipping_amount': SHIPPING_AMOUNT,
+            'discount_amount': 0, 'total_amount': subtotal + tax + SHIPPING_AMOUNT,
+            'shipping_first_name': FIRST_NAMES[first], 'shipping_last_name': LAST_NAMES[last],
+            'shipping_address_line1': f'{user_id % 400 + 1} {STREETS[user_id % len(STREETS)]}',
+            'shipping_city': city, 'shipping_state': state, 'shipping_postal_code': postal_code,
+            'shipping_country': 'KE', 'shipping_phone': f'+2547{user_id:08d}',
+            'payment_method': 'credit_card',
+            'payment_status': 'pending' if status in ('pending', 'cancelled') else 'completed',
+            'created_at': created_at, 'updated_at': created_at,
+        }
+        yield order, items
+
+
+def _cart_rows(rng, count, user_count, end, products):
+    customers = _Skewed(rng, range(2, user_count + 1), CUSTOMER_SKEW)
+    seen = set()
+    pending = [(2, product_id) for product_id in products.draw_distinct(rng, DEMO_CART_ITEMS)][:count]
+    attempts = 0
+    while len(seen) < count and attempts < 20 * count:
+        if not pending:
+            attempts += 1
+            user_id = customers.draw(rng)
+            pending = [(user_id, product_id) for product_id in products.draw_distinct(rng, rng.randrange(1, 5))]
+        pair = pending.pop()
+        if pair in seen:
+            continue
+        seen.add(pair)
+        created_at = end - timedelta(seconds=rng.randrange(CART_DAYS * 86400))
+        yield {'id': len(seen), 'user_id': pair[0], 'product_id': pair[1],
+               'quantity': rng.choices(QUANTITIES, QUANTITY_WEIGHTS)[0],
+               'created_at': created_at, 'updated_at': created_at}
+
+
+def _reset_sequences():
+    """Move PostgreSQL id sequences past the explicit ids inserted"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for model in (User, Category, Product, Order, OrderItem, Cart):
+        table = model.__tablename__
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+        ))
+    db.session.commit()
+
+
+def generate_data(users, categories, products, carts, orders, seed=42, end=None, batch_size=BATCH_SIZE,
+                  progress=None):
+    """Fill an empty database with generated rows.
+
+    ``end`` is the end of the order history (default: today at midnight).
+    ``progress(step, rows, seconds)`` is called after each table and
+    derived step. Returns the rows written per table.
+    """
+    if users < 2 or categories < 1 or products < 1:
+        raise ValueError('Need at least 2 users, 1 category and 1 product')
+    if any(db.session.execute(select(model.id).limit(1)).first() for model in (User, Category, Product, Order)):
+        raise ValueError('The database already has data; generate into an empty database')
+
+    rng = random.Random(seed)
+    end = end or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=HISTORY_DAYS)
+    report = progress or (lambda step, rows, seconds: None)
+    counts = {}
+
+    def timed(step, load):
+        started = time.perf_counter()
+        counts[step] = load()
+        report(step, counts[step], time.perf_counter() - started)
+
+    names, signup_days = array('l'), array('l')
+    catalog = _Catalog(products)
+    timed('users', lambda: _load(User, _users(rng, users, end, names, signup_days), batch_size))
+    timed('categories', lambda: _load(Category, _categories(categories, end), batch_size))
+    timed('products', lambda: _load(Product, _products(rng, products, categories, end, catalog), batch_size))
+
+    popular = _Skewed(rng, range(1, products + 1), PRODUCT_SKEW)
+    partitioning.ensure_partitions_between(start.date(), end.date())
+
+    item_count = [0]
+
+    def load_orders():
+        calendar = _Calendar(start, HISTORY_DAYS)
+        order_rows = _orders(rng, orders, users, end, calendar, popular, catalog, names, signup_days)
+        for batch in _batches(order_rows, batch_size):
+            _write_batch(Order.__table__, [order for order, _ in batch])
+            items = [item for _, order_items in batch for item in order_items]
+            for item_batch in _batches(items, batch_size):
+                _write_batch(OrderItem.__table__, item_batch)
+            db.session.commit()
+            item_count[0] += len(items)
+        return orders
+
+    timed('orders', load_orders)
+    counts['order_items'] = item_count[0]
+    timed('cart', lambda: _load(Cart, _cart_rows(rng, carts, users, end, popular), batch_size))
+    _reset_sequences()
+
+    def derive():
+        sync_stock_alerts()
+        db.session.commit()
+        first_day, last_day = rollup_date_bounds()
+        if first_day:
+            rebuild_rollups(first_day, last_day)
+            db.session.commit()
+        refresh_all_customer_stats()
+        if uses_pg_trgm():
+            create_trigram_indexes()
+        else:
+            rebuild_search_index(batch_size)
+
+    started = time.perf_counter()
+    derive()
+    report('derived data', None, time.perf_counter() - started)
+    return counts
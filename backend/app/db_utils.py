@@ -0,0 +1,14 @@
+"""Helpers for SQL that differs between the supported databases."""
+from app import db
+
+
+def dialect_insert():
+    """The database's INSERT construct with ON CONFLICT support, or None"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert
+    return None
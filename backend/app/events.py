@@ -0,0 +1,199 @@
+"""Transactional outbox for order lifecycle events.
+
+Routes call the ``record_*`` helpers inside the transaction that changes an
+order, so an event exists exactly when the change is committed. A separate
+dispatcher (``flask outbox dispatch``) claims pending events in batches and
+delivers them to in-process handlers and, if OUTBOX_HTTP_SINK_URL is set,
+to an HTTP endpoint.
+"""
+import json
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, or_, select, update
+from app import db
+from app.models import Order, OutboxEvent
+
+
+ORDER_CREATED = 'order.created'
+ORDER_CANCELLED = 'order.cancelled'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+
+_handlers = defaultdict(list)
+
+
+def register_handler(event_type, handler):
+    """Register ``handler(event)`` for an event type, or '*' for every event"""
+    _handlers[event_type].append(handler)
+    return handler
+
+
+def handles(event_type):
+    """Decorator form of register_handler"""
+    def decorator(handler):
+        return register_handler(event_type, handler)
+    return decorator
+
+
+def _order_payload(order_id, order_number, user_id, status, total_amount, **extra):
+    payload = {
+        'order_id': order_id,
+        'order_number': order_number,
+        'user_id': user_id,
+        'status': status,
+        'total_amount': float(total_amount) if total_amount is not None else None
+    }
+    payload.update(extra)
+    return payload
+
+
+def record_order_event(event_type, order, **extra):
+    """Add an event for ``order`` to the current session (the caller commits)"""
+    db.session.add(OutboxEvent(
+        event_type=event_type,
+        aggregate_id=order.id,
+        payload=_order_payload(
+            order.id, order.order_number, order.user_id, order.status, order.total_amount, **extra
+        )
+    ))
+
+
+def record_order_events(event_type, order_ids, **extra):
+    """Add one event per order id with a single SELECT and a batched INSERT"""
+    if not order_ids:
+        return
+    rows = db.session.execute(
+        select(Order.id, Order.order_number, Order.user_id, Order.status, Order.total_amount)
+        .where(Order.id.in_(order_ids))
+    ).all()
+    now = datetime.utcnow()
+    db.session.execute(insert(OutboxEvent), [
+        {
+            'event_type': event_type,
+            'aggregate_type': 'order',
+            'aggregate_id': row.id,
+            'payload': _order_payload(*row, **extra),
+            'status': 'pending',
+            'attempts': 0,
+            'available_at': now,
+            'created_at': now
+        }
+        for row in rows
+    ])
+
+
+def claim_events(batch_size):
+    """Atomically mark up to ``batch_size`` due events as processing and return their rows.
+
+    On PostgreSQL the inner SELECT uses FOR UPDATE SKIP LOCKED so several
+    dispatchers can claim disjoint batches concurrently. SQLite ignores the
+    locking clause, which is safe because it only allows one writer at a time.
+    Events left in processing by a crashed dispatcher are reclaimed once
+    OUTBOX_CLAIM_TIMEOUT seconds have passed.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['OUTBOX_CLAIM_TIMEOUT'])
+    due = select(OutboxEvent.id).where(
+        or_(
+            (OutboxEvent.status == 'pending') & (OutboxEvent.available_at <= now),
+            (OutboxEvent.status == 'processing') & (OutboxEvent.claimed_at < stale)
+        )
+    ).order_by(OutboxEvent.id).limit(batch_size).with_for_update(skip_locked=True)
+
+    events = db.session.execute(
+        update(OutboxEvent).where(
+            OutboxEvent.id.in_(due.scalar_subquery())
+        ).values(
+            status='processing',
+            claimed_at=now
+        ).returning(
+            OutboxEvent.id,
+            OutboxEvent.event_type,
+            OutboxEvent.aggregate_type,
+            OutboxEvent.aggregate_id,
+            OutboxEvent.payload,
+            OutboxEvent.attempts,
+            OutboxEvent.created_at
+        ),
+        execution_options={'synchronize_session': False}
+    ).all()
+    db.session.commit()
+    return sorted(events, key=lambda event: event.id)
+
+
+def event_message(event):
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'aggregate_type': event.aggregate_type,
+        'aggregate_id': event.aggregate_id,
+        'payload': event.payload,
+        'created_at': event.created_at.isoformat() if event.created_at else None
+    }
+
+
+def post_to_sink(url, message, timeout):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(message).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        if response.status >= 300:
+            raise RuntimeError(f'Sink responded with HTTP {response.status}')
+
+
+def deliver(event):
+    """Run every handler for ``event``; any exception fails the delivery"""
+    message = event_message(event)
+    for handler in _handlers[event.event_type] + _handlers['*']:
+        handler(message)
+    sink_url = current_app.config['OUTBOX_HTTP_SINK_URL']
+    if sink_url:
+        post_to_sink(sink_url, message, current_app.config['OUTBOX_HTTP_TIMEOUT'])
+
+
+def dispatch_batch(batch_size=None):
+    """Claim and deliver one batch of events. Returns the number claimed."""
+    config = current_app.config
+    events = claim_events(batch_size or config['OUTBOX_BATCH_SIZE'])
+
+    for event in events:
+        try:
+            deliver(event)
+        except Exception as e:
+            # Discard anything a handler wrote before failing
+            db.session.rollback()
+            attempts = event.attempts + 1
+            values = {'attempts': attempts, 'last_error': str(e)[:2000]}
+            if attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+                values['status'] = 'failed'
+            else:
+                # Exponential backoff: 2, 4, 8, ... seconds, capped at 5 minutes
+                values['status'] = 'pending'
+                values['available_at'] = datetime.utcnow() + timedelta(seconds=min(2 ** attempts, 300))
+        else:
+            values = {'status': 'delivered', 'delivered_at': datetime.utcnow(), 'last_error': None}
+
+        db.session.execute(
+            update(OutboxEvent).where(OutboxEvent.id == event.id).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+    return len(events)
+
+
+def run_dispatcher(poll_interval=1.0, once=False):
+    """Deliver events until interrupted, sleeping only when the outbox is empty"""
+    delivered = 0
+    while True:
+        claimed = dispatch_batch()
+        delivered += claimed
+        if once and not claimed:
+            return delivered
+        if not claimed:
+            time.sleep(poll_interval)
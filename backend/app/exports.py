@@ -0,0 +1,172 @@
+"""Streaming CSV and NDJSON exports for admins.
+
+Rows are read through a server-side cursor on a dedicated connection and
+written to the response as they arrive, in chunks of roughly
+EXPORT_CHUNK_SIZE bytes, optionally gzip-compressed on the fly. Only one
+chunk and one cursor batch are held in memory, whatever the export size.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import func, select
+from app.models import Order, OrderItem, Product, User
+
+
+EXPORT_FORMATS = ['csv', 'ndjson']
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_BATCH_SIZE = 1000
+
+ORDER_COLUMNS = [
+    Order.id.label('order_id'),
+    Order.order_number,
+    Order.created_at,
+    Order.status,
+    Order.payment_status,
+    Order.payment_method,
+    User.email.label('customer_email'),
+    User.first_name.label('customer_first_name'),
+    User.last_name.label('customer_last_name'),
+    Order.subtotal,
+    Order.discount_amount,
+    Order.tax_amount,
+    Order.shipping_amount,
+    Order.total_amount,
+    Order.shipping_city,
+    Order.shipping_country,
+]
+
+ITEM_COLUMNS = [
+    OrderItem.product_id.label('item_product_id'),
+    func.coalesce(OrderItem.product_sku, Product.sku).label('item_sku'),
+    func.coalesce(OrderItem.product_name, Product.name).label('item_name'),
+    OrderItem.quantity.label('item_quantity'),
+    OrderItem.unit_price.label('item_unit_price'),
+    OrderItem.total_price.label('item_total_price'),
+]
+
+USER_COLUMNS = [
+    User.id,
+    User.email,
+    User.first_name,
+    User.last_name,
+    User.phone,
+    User.is_admin,
+    User.is_active,
+    User.created_at,
+]
+
+
+def order_export_statement():
+    """One row per order item (orders without items get one row), newest orders first"""
+    return select(*ORDER_COLUMNS, *ITEM_COLUMNS).select_from(Order).join(
+        User, User.id == Order.user_id
+    ).outerjoin(
+        OrderItem, OrderItem.order_id == Order.id
+    ).outerjoin(
+        Product, Product.id == OrderItem.product_id
+    ).order_by(Order.created_at.desc(), Order.id.desc(), OrderItem.id)
+
+
+def user_export_statement():
+    return select(*USER_COLUMNS).order_by(User.created_at.desc(), User.id.desc())
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def stream_rows(engine, statement):
+    """Yield result rows as dicts through a server-side cursor"""
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True,
+            yield_per=EXPORT_BATCH_SIZE
+        ).execute(statement)
+        for row in result.mappings():
+            yield row
+
+
+def csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':'), default=_json_value) + '\n'
+
+
+def group_order_items(rows):
+    """Fold consecutive flattened rows of the same order into one nested record"""
+    order_keys = [column.key for column in ORDER_COLUMNS]
+    item_keys = [column.key for column in ITEM_COLUMNS]
+    current = None
+    for row in rows:
+        if current is None or current['order_id'] != row['order_id']:
+            if current is not None:
+                yield current
+            current = {key: _json_value(row[key]) for key in order_keys}
+            current['items'] = []
+        if row['item_product_id'] is not None:
+            current['items'].append({key[len('item_'):]: _json_value(row[key]) for key in item_keys})
+    if current is not None:
+        yield current
+
+
+def encode_chunks(chunks, compress=False):
+    """Encode text chunks as UTF-8, batching small ones and optionally gzipping"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending = []
+    size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size < EXPORT_CHUNK_SIZE:
+            continue
+        data = ''.join(pending).encode('utf-8')
+        pending, size = [], 0
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    data = ''.join(pending).encode('utf-8')
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export_orders(engine, statement, export_format, compress=False):
+    rows = stream_rows(engine, statement)
+    if export_format == 'csv':
+        columns = [column.key for column in ORDER_COLUMNS + ITEM_COLUMNS]
+        return encode_chunks(csv_lines(rows, columns), compress)
+    return encode_chunks(ndjson_lines(group_order_items(rows)), compress)
+
+
+def export_users(engine, statement, export_format, compress=False):
+    rows = stream_rows(engine, statement)
+    if export_format == 'csv':
+        return encode_chunks(csv_lines(rows, [column.key for column in USER_COLUMNS]), compress)
+    return encode_chunks(ndjson_lines(dict(row) for row in rows), compress)
@@ -0,0 +1,141 @@
+"""Stock levels: restoring stock and low stock alerts.
+
+Each product has an effective low_stock_threshold: its own
+reorder_threshold, else its category's, else DEFAULT_REORDER_THRESHOLD.
+Products at or below it are covered by the partial index
+ix_products_low_stock, so finding them never scans the catalog.
+
+sync_stock_alerts compares those products with the open stock alerts and
+records crossings in both directions. Checkout and cancellation call it for
+the products they touch; ``flask inventory scan-stock`` catches changes made
+any other way.
+"""
+from datetime import datetime
+from app import db
+from app.models import Category, OrderItem, Product, StockAlert
+from app.db_utils import dialect_insert
+from sqlalchemy import event, func, inspect, insert, select, update
+
+
+DEFAULT_REORDER_THRESHOLD = 10
+
+
+def restore_stock(order_ids):
+    """Put the quantities of the given orders' items back into stock.
+
+    Runs as a single UPDATE ... FROM over the aggregated order lines, so each
+    product is incremented once in the database with no read-modify-write in
+    Python. Product objects already loaded in the session are not refreshed.
+    """
+    if not order_ids:
+        return
+    quantities = select(
+        OrderItem.product_id,
+        func.sum(OrderItem.quantity).label('quantity')
+    ).where(
+        OrderItem.order_id.in_(order_ids)
+    ).group_by(OrderItem.product_id).subquery()
+
+    db.session.execute(
+        update(Product).where(
+            Product.id == quantities.c.product_id
+        ).values(
+            stock_quantity=Product.stock_quantity + quantities.c.quantity
+        ),
+        execution_options={'synchronize_session': False}
+    )
+
+
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def set_low_stock_threshold(mapper, connection, target):
+    """Recompute the effective threshold when the override or category changes"""
+    state = inspect(target)
+    if state.persistent and not (
+        state.attrs.reorder_threshold.history.has_changes() or state.attrs.category_id.history.has_changes()
+    ):
+        return
+    threshold = target.reorder_threshold
+    if threshold is None and target.category_id is not None:
+        threshold = connection.scalar(select(Category.reorder_threshold).where(Category.id == target.category_id))
+    target.low_stock_threshold = threshold if threshold is not None else DEFAULT_REORDER_THRESHOLD
+
+
+def set_category_reorder_threshold(category, threshold):
+    """Change a category's threshold and apply it to products without their own"""
+    category.reorder_threshold = threshold
+    db.session.execute(
+        update(Product).where(
+            Product.category_id == category.id,
+            Product.reorder_threshold.is_(None)
+        ).values(
+            low_stock_threshold=threshold if threshold is not None else DEFAULT_REORDER_THRESHOLD
+        ),
+        execution_options={'synchronize_session': 'fetch'}
+    )
+
+
+def low_stock_query():
+    """Active products at or below their threshold (served by the partial index)"""
+    return Product.query.filter(
+        Product.is_active.is_(True),
+        Product.stock_quantity <= Product.low_stock_threshold
+    )
+
+
+def sync_stock_alerts(product_ids=None):
+    """Open alerts for products that fell to their threshold and resolve recovered ones.
+
+    ``product_ids`` limits the check to some products (a list or a select of
+    ids); by default every product is checked. Both sides of the comparison
+    are small indexed reads. Returns (opened, resolved) counts; the caller
+    commits.
+    """
+    low = select(Product.id, Product.stock_quantity, Product.low_stock_threshold).where(
+        Product.is_active.is_(True),
+        Product.stock_quantity <= Product.low_stock_threshold
+    )
+    open_alerts = select(StockAlert.id, StockAlert.product_id).where(StockAlert.resolved_at.is_(None))
+    if product_ids is not None:
+        low = low.where(Product.id.in_(product_ids))
+        open_alerts = open_alerts.where(StockAlert.product_id.in_(product_ids))
+
+    low_products = {row.id: row for row in db.session.execute(low)}
+    alerted = {row.product_id: row.id for row in db.session.execute(open_alerts)}
+    now = datetime.utcnow()
+
+    crossed = [
+        {
+            'product_id': product_id,
+            'threshold': row.low_stock_threshold,
+            'stock_quantity': row.stock_quantity,
+            'created_at': now
+        }
+        for product_id, row in sorted(low_products.items())
+        if product_id not in alerted
+    ]
+    if crossed:
+        upsert = dialect_insert()
+        if upsert is not None:
+            # A concurrent checkout may have opened the same alert first
+            statement = upsert(StockAlert).on_conflict_do_nothing(
+                index_elements=['product_id'],
+                index_where=StockAlert.resolved_at.is_(None)
+            )
+        else:
+            statement = insert(StockAlert)
+        db.session.execute(statement, crossed)
+
+    recovered = [alert_id for product_id, alert_id in alerted.items() if product_id not in low_products]
+    if recovered:
+        stock = select(Product.stock_quantity).where(Product.id == StockAlert.product_id).scalar_subquery()
+        db.session.execute(
+            update(StockAlert).where(
+                StockAlert.id.in_(recovered)
+            ).values(
+                resolved_at=now,
+                resolved_stock_quantity=stock
+            ),
+            execution_options={'synchronize_session': False}
+        )
+    return len(crossed), len(recovered)
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+from app import db
+from app.models import InvoiceExport, Order
+from app.invoices import invoice_cache_path, invoice_document, render_invoice_pdf, write_atomic
+
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+
+
+def export_date_range(export):
+    """Datetime bounds covering the export's start and end dates, end inclusive"""
+    start = datetime.combine(export.start_date, time.min)
+    end = datetime.combine(export.end_date + timedelta(days=1), time.min)
+    return start, end
+
+
+def _set_progress(export_id, **values):
+    # Progress is written on its own connection so it is visible immediately
+    # and never disturbs the long-running read transaction streaming orders
+    with db.engine.begin() as connection:
+        connection.execute(update(InvoiceExport).where(InvoiceExport.id == export_id).values(**values))
+
+
+def _render_batch(pool, batch, cache_dir):
+    """Return (order_number, pdf path or bytes) for a batch of invoice documents.
+
+    Invoices already in the on-disk cache are reused; the rest are rendered in
+    the process pool and written back to the cache for later downloads.
+    """
+    results = [None] * len(batch)
+    to_render = []
+    for index, document in enumerate(batch):
+        path = invoice_cache_path(document['order_id'], document['order_number'], cache_dir)
+        if os.path.exists(path):
+            results[index] = path
+        else:
+            to_render.append(index)
+
+    rendered = pool.map(render_invoice_pdf, [batch[i] for i in to_render], chunksize=8)
+    for index, pdf in zip(to_render, rendered):
+        write_atomic(invoice_cache_path(batch[index]['order_id'], batch[index]['order_number'], cache_dir), pdf)
+        results[index] = pdf
+
+    return [(document['invoice_number'], result) for document, result in zip(batch, results)]
+
+
+def run_invoice_export(export_id):
+    """Build the ZIP archive for an export job. Requires an app context."""
+    config = current_app.config
+    export = InvoiceExport.query.get(export_id)
+    start, end = export_date_range(export)
+    batch_size = config['INVOICE_EXPORT_BATCH_SIZE']
+    cache_dir = config['INVOICE_CACHE_DIR']
+
+    os.makedirs(config['INVOICE_EXPORT_DIR'], exist_ok=True)
+    final_path = os.path.join(
+        config['INVOICE_EXPORT_DIR'],
+        f"invoices_{export.start_date:%Y%m%d}_{export.end_date:%Y%m%d}_{export.id}.zip"
+    )
+    partial_path = f'{final_path}.part'
+
+    total = Order.query.filter(
+        Order.created_at >= start,
+        Order.created_at < end
+    ).count()
+    _set_progress(export_id, status='running', started_at=datetime.utcnow(), total_orders=total, processed_orders=0)
+    db.session.commit()
+
+    # Orders are streamed through a server-side cursor in id order; only one
+    # batch of documents and rendered PDFs is held in memory at a time, and
+    # the session's weak identity map lets finished orders be collected
+    stream = db.session.execute(
+        select(Order).where(
+            Order.created_at >= start,
+            Order.created_at < end
+        ).options(
+            selectinload(Order.order_items)
+        ).order_by(Order.id).execution_options(stream_results=True, yield_per=batch_size)
+    ).scalars()
+
+    processed = 0
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=config['INVOICE_EXPORT_WORKERS'], mp_context=context) as pool, \
+                zipfile.ZipFile(partial_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            batch = []
+            for order in stream:
+                batch.append(invoice_document(order))
+                if len(batch) >= batch_size:
+                    processed += _write_batch(archive, _render_batch(pool, batch, cache_dir))
+                    _set_progress(export_id, processed_orders=processed)
+                    batch = []
+            if batch:
+                processed += _write_batch(archive, _render_batch(pool, batch, cache_dir))
+
+        os.replace(partial_path, final_path)
+        _set_progress(
+            export_id,
+            status='completed',
+            processed_orders=processed,
+            file_path=final_path,
+            file_size=os.path.getsize(final_path),
+            completed_at=datetime.utcnow()
+        )
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        _set_progress(export_id, status='failed', error=str(e), completed_at=datetime.utcnow())
+        raise
+    finally:
+        db.session.rollback()
+
+
+def _write_batch(archive, rendered):
+    for invoice_number, result in rendered:
+        name = f'{invoice_number}.pdf'
+        if isinstance(result, bytes):
+            archive.writestr(name, result)
+        else:
+            archive.write(result, name)
+    return len(rendered)
+
+
+def _run_in_background(app, export_id):
+    with app.app_context():
+        try:
+            run_invoice_export(export_id)
+        except Exception:
+            app.logger.exception('Invoice export %s failed', export_id)
+
+
+def schedule_invoice_export(export_id):
+    """Run an export job on the background job thread"""
+    global _job_executor
+
+    app = current_app._get_current_object()
+    with _job_executor_lock:
+        if _job_executor is None:
+            # One export at a time per process; each export fans out to its own process pool
+            _job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='invoice-export')
+    return _job_executor.submit(_run_in_background, app, export_id)
@@ -0,0 +1,321 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from flask import current_app
+
+
+# Bump whenever the invoice layout or content changes so cached files are re-rendered
+INVOICE_VERSION = 1
+
+COMPANY_INFO = {
+    'name': 'Empower Fashion',
+    'address': '123 Fashion Avenue',
+    'city': 'New York',
+    'state': 'NY',
+    'postal_code': '10001',
+    'phone': '(555) 123-4567',
+    'email': 'orders@empowerfashion.com'
+}
+
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+
+def invoice_document(order):
+    """Collect everything printed on an invoice as plain, picklable data"""
+    def address(prefix):
+        return {
+            'name': ' '.join(filter(None, [
+                getattr(order, f'{prefix}_first_name'),
+                getattr(order, f'{prefix}_last_name')
+            ])),
+            'line1': getattr(order, f'{prefix}_address_line1'),
+            'line2': getattr(order, f'{prefix}_address_line2'),
+            'city': getattr(order, f'{prefix}_city'),
+            'state': getattr(order, f'{prefix}_state'),
+            'postal_code': getattr(order, f'{prefix}_postal_code'),
+            'country': getattr(order, f'{prefix}_country')
+        }
+
+    return {
+        'order_id': order.id,
+        'invoice_number': f"INV-{order.order_number}",
+        'order_number': order.order_number,
+        'invoice_date': order.created_at.strftime('%Y-%m-%d'),
+        'payment_method': order.payment_method,
+        'transaction_id': order.transaction_id,
+        'billing': address('billing'),
+        'shipping': address('shipping'),
+        'items': [
+            {
+                'name': item.product_name or f'Product #{item.product_id}',
+                'sku': item.product_sku or '',
+                'details': ' / '.join(filter(None, [item.product_size, item.product_color])),
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'total_price': str(item.total_price)
+            }
+            for item in order.order_items
+        ],
+        'subtotal': str(order.subtotal),
+        'discount_amount': str(order.discount_amount or 0),
+        'tax_amount': str(order.tax_amount or 0),
+        'shipping_amount': str(order.shipping_amount or 0),
+        'total_amount': str(order.total_amount)
+    }
+
+
+# --- Minimal PDF writer -------------------------------------------------------
+
+PAGE_WIDTH = 595  # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 50
+ITEMS_PER_PAGE = 30
+
+# Helvetica advance widths (1/1000 em) for the characters used in amounts
+_AMOUNT_WIDTHS = {'.': 278, ',': 278, '-': 333, ' ': 278}
+
+
+def _escape(value):
+    text = str(value if value is not None else '')
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def _amount_width(text, size):
+    return sum(_AMOUNT_WIDTHS.get(char, 556) for char in text) * size / 1000.0
+
+
+def _money(value):
+    return f"${Decimal(value):,.2f}"
+
+
+class _Page:
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, y, value, size=10, bold=False):
+        font = 'F2' if bold else 'F1'
+        self.ops.append(f"BT /{font} {size} Tf {x:.2f} {y:.2f} Td ({_escape(value)}) Tj ET")
+
+    def text_right(self, x, y, value, size=10, bold=False):
+        self.text(x - _amount_width(value, size), y, value, size, bold)
+
+    def line(self, x1, y1, x2, y2):
+        self.ops.append(f"{x1} {y1} m {x2} {y2} l S")
+
+    def content(self):
+        return '\n'.join(self.ops).encode('latin-1')
+
+
+def _build_pdf(pages):
+    """Assemble page content streams into a PDF byte string"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for page in pages:
+        stream = page.content()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            "/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, content_ref)
+        ).encode('latin-1'))
+        page_refs.append(len(objects))
+    objects[1] = (
+        "<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (' '.join(f'{ref} 0 R' for ref in page_refs), len(page_refs))
+    ).encode('latin-1')
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(output)
+
+
+def _address_lines(address):
+    city_line = ', '.join(filter(None, [address['city'], address['state']]))
+    if address['postal_code']:
+        city_line = f"{city_line} {address['postal_code']}".strip()
+    return [line for line in [
+        address['name'], address['line1'], address['line2'], city_line, address['country']
+    ] if line]
+
+
+def render_invoice_pdf(document):
+    """Render an invoice document (see invoice_document) to PDF bytes.
+
+    Pure function of its input so it can run in worker threads or processes.
+    """
+    right = PAGE_WIDTH - MARGIN
+    columns = {'sku': 300, 'qty': 400, 'unit': 475, 'total': right}
+    item_chunks = [
+        document['items'][i:i + ITEMS_PER_PAGE]
+        for i in range(0, len(document['items']), ITEMS_PER_PAGE)
+    ] or [[]]
+
+    pages = []
+    for page_number, items in enumerate(item_chunks, start=1):
+        page = _Page()
+        y = PAGE_HEIGHT - MARGIN
+
+        page.text(MARGIN, y, COMPANY_INFO['name'], size=18, bold=True)
+        page.text_right(right, y, 'INVOICE', size=18, bold=True)
+        y -= 18
+        company_lines = [
+            COMPANY_INFO['address'],
+            f"{COMPANY_INFO['city']}, {COMPANY_INFO['state']} {COMPANY_INFO['postal_code']}",
+            f"{COMPANY_INFO['phone']}  {COMPANY_INFO['email']}"
+        ]
+        meta_lines = [
+            f"Invoice: {document['invoice_number']}",
+            f"Order: {document['order_number']}",
+            f"Date: {document['invoice_date']}",
+            f"Page {page_number} of {len(item_chunks)}"
+        ]
+        for i in range(max(len(company_lines), len(meta_lines))):
+            if i < len(company_lines):
+                page.text(MARGIN, y, company_lines[i], size=9)
+            if i < len(meta_lines):
+                page.text(380, y, meta_lines[i], size=9)
+            y -= 12
+
+        if page_number == 1:
+            y -= 14
+            page.text(MARGIN, y, 'Bill to', bold=True)
+            page.text(300, y, 'Ship to', bold=True)
+            billing = _address_lines(document['billing'])
+            shipping = _address_lines(document['shipping'])
+            for i in range(max(len(billing), len(shipping))):
+                y -= 12
+                if i < len(billing):
+                    page.text(MARGIN, y, billing[i], size=9)
+                if i < len(shipping):
+                    page.text(300, y, shipping[i], size=9)
+
+        y -= 28
+        page.text(MARGIN, y, 'Item', bold=True)
+        page.text(columns['sku'], y, 'SKU', bold=True)
+        page.text_right(columns['qty'], y, 'Qty', bold=True)
+        page.text_right(columns['unit'], y, 'Unit price', bold=True)
+        page.text_right(columns['total'], y, 'Total', bold=True)
+        y -= 6
+        page.line(MARGIN, y, right, y)
+
+        for item in items:
+            y -= 16
+            name = item['name'] if not item['details'] else f"{item['name']} ({item['details']})"
+            page.text(MARGIN, y, name[:45], size=9)
+            page.text(columns['sku'], y, item['sku'], size=9)
+            page.text_right(columns['qty'], y, str(item['quantity']), size=9)
+            page.text_right(columns['unit'], y, _money(item['unit_price']), size=9)
+            page.text_right(columns['total'], y, _money(item['total_price']), size=9)
+
+        if page_number == len(item_chunks):
+            y -= 10
+            page.line(MARGIN, y, right, y)
+            totals = [
+                ('Subtotal', _money(document['subtotal'])),
+                ('Discount', f"-{_money(document['discount_amount'])}"),
+                ('Tax', _money(document['tax_amount'])),
+                ('Shipping', _money(document['shipping_amount'])),
+            ]
+            for label, value in totals:
+                y -= 16
+                page.text(columns['unit'] - 60, y, label, size=9)
+                page.text_right(columns['total'], y, value, size=9)
+            y -= 18
+            page.text(columns['unit'] - 60, y, 'Total', bold=True)
+            page.text_right(columns['total'], y, _money(document['total_amount']), bold=True)
+
+            y -= 36
+            page.text(MARGIN, y, f"Paid by {document['payment_method'] or 'card'}", size=9)
+            if document['transaction_id']:
+                page.text(MARGIN, y - 12, f"Transaction {document['transaction_id']}", size=9)
+
+        pages.append(page)
+
+    return _build_pdf(pages)
+
+
+# --- On-disk cache ------------------------------------------------------------
+
+def invoice_cache_key(order_id, order_number, version=INVOICE_VERSION):
+    """Content address of an invoice: invoices are immutable per order and version.
+
+    The order number is part of the key so that a recreated database, whose
+    ids start over, never serves the invoices of a previous one.
+    """
+    return hashlib.sha256(f"invoice:{order_id}:{order_number}:v{version}".encode('utf-8')).hexdigest()
+
+
+def invoice_cache_path(order_id, order_number, cache_dir=None):
+    cache_dir = cache_dir or current_app.config['INVOICE_CACHE_DIR']
+    key = invoice_cache_key(order_id, order_number)
+    return os.path.join(cache_dir, key[:2], f'{key}.pdf')
+
+
+def write_atomic(path, data):
+    """Write ``data`` to ``path`` so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_invoice_pdf_path(order):
+    """Return the cached invoice path for ``order``, rendering it on a miss"""
+    path = invoice_cache_path(order.id, order.order_number)
+    if not os.path.exists(path):
+        write_atomic(path, render_invoice_pdf(invoice_document(order)))
+    return path
+
+
+def _render_in_background(app, order_id):
+    from app.models import Order
+
+    with app.app_context():
+        try:
+            order = Order.query.get(order_id)
+            if order:
+                get_invoice_pdf_path(order)
+        except Exception:
+            app.logger.exception('Failed to pre-render invoice for order %s', order_id)
+
+
+def schedule_invoice_render(order_id):
+    """Render an invoice on a background thread, e.g. right after checkout"""
+    global _render_executor
+
+    app = current_app._get_current_object()
+    if not app.config['INVOICE_PRERENDER']:
+        return None
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(
+                max_workers=app.config['INVOICE_RENDER_WORKERS'],
+                thread_name_prefix='invoice-render'
+            )
+    return _render_executor.submit(_render_in_background, app, order_id)
@@ -1,7 +1,8 @@
 from app import db, ma
 from datetime import datetime
-import bcrypt
-from sqlalchemy.orm import relationship
+from app.passwords import hash_password, needs_rehash, verify_password
+from sqlalchemy import event, select
+from sqlalchemy.orm import backref, relationship
 
 
 class User(db.Model):
@@ -24,12 +25,16 @@ class User(db.Model):
     cart_items = relationship('Cart', backref='user', lazy=True)
     
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash and set password (on the password hashing pool)"""
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        """Check if provided password matches hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """Check if provided password matches hash (on the password hashing pool)"""
+        return verify_password(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        """Whether the stored hash was made with a different cost than BCRYPT_ROUNDS"""
+        return needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.email}>'
@@ -43,6 +48,7 @@ class Category(db.Model):
     name = db.Column(db.String(80), unique=True, nullable=False)
     description = db.Column(db.Text)
     image_url = db.Column(db.String(200))
+    reorder_threshold = db.Column(db.Integer)  # default for its products
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -66,6 +72,11 @@ class Product(db.Model):
     stock_quantity = db.Column(db.Integer, default=0)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
     
+    # Low stock: reorder_threshold overrides the category's; low_stock_threshold is the
+    # effective value, kept in sync by app.inventory so the partial index can use it
+    reorder_threshold = db.Column(db.Integer)
+    low_stock_threshold = db.Column(db.Integer, nullable=False, default=10)
+    
     # Product details
     brand = db.Column(db.String(80))
     color = db.Column(db.String(50))
@@ -92,6 +103,14 @@ class Product(db.Model):
     order_items = relationship('OrderItem', backref='product', lazy=True)
     cart_items = relationship('Cart', backref='product', lazy=True)
     
+    __table_args__ = (
+        db.Index(
+            'ix_products_low_stock', 'stock_quantity',
+            postgresql_where=db.text('is_active AND stock_quantity <= low_stock_threshold'),
+            sqlite_where=db.text('is_active AND stock_quantity <= low_stock_threshold')
+        ),
+    )
+    
     @property
     def current_price(self):
         """Return sale price if available, otherwise regular price"""
@@ -111,7 +130,7 @@ class Order(db.Model):
     __tablename__ = 'orders'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
     
     # Order status
@@ -174,8 +193,35 @@ class OrderItem(db.Model):
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
     
+    # Copy of orders.created_at, the partition key of order_items on PostgreSQL
+    order_created_at = db.Column(db.DateTime)
+    
+    # Product snapshot taken when the order was placed
+    product_name = db.Column(db.String(120))
+    product_sku = db.Column(db.String(50))
+    product_image = db.Column(db.String(200))
+    product_size = db.Column(db.String(20))
+    product_color = db.Column(db.String(50))
+    
+    def snapshot_product(self, product):
+        """Copy the product details shown on orders and invoices"""
+        self.product_name = product.name
+        self.product_sku = product.sku
+        self.product_image = product.primary_image
+        self.product_size = product.size
+        self.product_color = product.color
+    
     def __repr__(self):
-        return f'<OrderItem {self.product.name} x {self.quantity}>'
+        return f'<OrderItem {self.product_name} x {self.quantity}>'
+
+
+@event.listens_for(OrderItem, 'before_insert')
+def set_order_created_at(mapper, connection, target):
+    """Fill the partition key for items added outside checkout"""
+    if target.order_created_at is None and target.order_id is not None:
+        target.order_created_at = connection.scalar(
+            select(Order.created_at).where(Order.id == target.order_id)
+        )
 
 
 class Cart(db.Model):
@@ -196,6 +242,243 @@ class Cart(db.Model):
         return f'<Cart {self.user.email} - {self.product.name}>'
 
 
+class OrderArchive(db.Model):
+    """Compressed copy of an order moved out of the hot orders tables"""
+    __tablename__ = 'order_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, unique=True, nullable=False)
+    order_number = db.Column(db.String(50), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False)  # kept for customer_stats
+    total_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON of the order and its items
+    
+    def __repr__(self):
+        return f'<OrderArchive {self.order_number}>'
+
+
+class OutboxEvent(db.Model):
+    """Domain event written in the same transaction as the change it describes"""
+    __tablename__ = 'outbox_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False, index=True)  # order.created, order.cancelled, order.status_changed
+    aggregate_type = db.Column(db.String(50), nullable=False, default='order')
+    aggregate_id = db.Column(db.Integer, nullable=False)  # no FK: orders may be partitioned or archived
+    payload = db.Column(db.JSON, nullable=False)
+    
+    # Delivery state
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, delivered, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    delivered_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_outbox_events_status_available_at', 'status', 'available_at'),)
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.event_type} {self.aggregate_id}>'
+
+
+class InvoiceExport(db.Model):
+    """Batch export of invoices for a date range (accounting)"""
+    __tablename__ = 'invoice_exports'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
+    total_orders = db.Column(db.Integer, default=0)
+    processed_orders = db.Column(db.Integer, default=0)
+    file_path = db.Column(db.String(500))
+    file_size = db.Column(db.BigInteger)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<InvoiceExport {self.start_date} - {self.end_date} {self.status}>'
+
+
+class Promotion(db.Model):
+    """Discount rule applied at checkout, optionally behind a coupon code"""
+    __tablename__ = 'promotions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    description = db.Column(db.Text)
+    
+    # Rule
+    kind = db.Column(db.String(20), nullable=False)  # percentage, fixed, bxgy
+    value = db.Column(db.Numeric(10, 2), default=0)  # percent off, or amount off per unit
+    buy_quantity = db.Column(db.Integer)  # bxgy: for every buy_quantity units...
+    get_quantity = db.Column(db.Integer)  # ...get_quantity more are free
+    
+    # Products the rule applies to
+    scope = db.Column(db.String(20), nullable=False, default='all')  # all, category, brand, tag, sku
+    scope_value = db.Column(db.String(120))  # category id, brand, tag or SKU
+    
+    coupon_code = db.Column(db.String(50), unique=True)  # only applied when the code is entered
+    starts_at = db.Column(db.DateTime)
+    ends_at = db.Column(db.DateTime)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Promotion {self.name}>'
+
+
+class StockAlert(db.Model):
+    """A product's stock falling to its low stock threshold; resolved when it recovers"""
+    __tablename__ = 'stock_alerts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    threshold = db.Column(db.Integer, nullable=False)
+    stock_quantity = db.Column(db.Integer, nullable=False)  # stock when the alert opened
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+    resolved_stock_quantity = db.Column(db.Integer)
+    
+    product = relationship('Product')
+    
+    # At most one open alert per product
+    __table_args__ = (
+        db.Index(
+            'ix_stock_alerts_open_product', 'product_id', unique=True,
+            postgresql_where=db.text('resolved_at IS NULL'),
+            sqlite_where=db.text('resolved_at IS NULL')
+        ),
+        db.Index('ix_stock_alerts_created_at', 'created_at'),
+    )
+    
+    def __repr__(self):
+        return f'<StockAlert {self.product_id} {self.stock_quantity}/{self.threshold}>'
+
+
+class SearchTrigram(db.Model):
+    """Trigram of an order's or user's search text (admin search index where pg_trgm is unavailable)"""
+    __tablename__ = 'search_trigrams'
+    
+    entity = db.Column(db.String(10), primary_key=True)  # order, user
+    trigram = db.Column(db.String(3), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)  # no FK: orders may be partitioned or archived
+    
+    __table_args__ = (db.Index('ix_search_trigrams_entity_id', 'entity', 'entity_id'),)
+    
+    def __repr__(self):
+        return f'<SearchTrigram {self.entity} {self.entity_id} {self.trigram!r}>'
+
+
+class DailySales(db.Model):
+    """Orders and revenue per day of order creation (analytics rollup)"""
+    __tablename__ = 'daily_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    paid_orders_count = db.Column(db.Integer, nullable=False, default=0)  # payment_status completed
+    paid_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailySales {self.day}>'
+
+
+class DailyProductSales(db.Model):
+    """Units and revenue per product per day, for paid orders (analytics rollup)"""
+    __tablename__ = 'daily_product_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    items_count = db.Column(db.Integer, nullable=False, default=0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyProductSales {self.day} {self.product_id}>'
+
+
+class DailyCategorySales(db.Model):
+    """Units and revenue per category per day, for paid orders (analytics rollup)"""
+    __tablename__ = 'daily_category_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)
+    items_count = db.Column(db.Integer, nullable=False, default=0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyCategorySales {self.day} {self.category_id}>'
+
+
+class DailyOrderBreakdown(db.Model):
+    """Orders per day by current status or payment method (analytics rollup)"""
+    __tablename__ = 'daily_order_breakdowns'
+    
+    day = db.Column(db.Date, primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)  # status, payment_method
+    value = db.Column(db.String(50), primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyOrderBreakdown {self.day} {self.dimension}={self.value}>'
+
+
+class CustomerStats(db.Model):
+    """Per-customer order totals and segment, maintained by app.customer_stats"""
+    __tablename__ = 'customer_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0, index=True)  # excluding cancelled orders
+    lifetime_value = db.Column(db.Numeric(12, 2), nullable=False, default=0, index=True)
+    first_order_at = db.Column(db.DateTime)
+    last_order_at = db.Column(db.DateTime, index=True)
+    segment = db.Column(db.String(20), nullable=False, default='prospect', index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = relationship('User', backref=backref('customer_stats', uselist=False, lazy=True))
+    
+    def __repr__(self):
+        return f'<CustomerStats {self.user_id} {self.segment}>'
+
+
+class RevokedToken(db.Model):
+    """A revoked access or refresh token, kept until the token expires"""
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(36), primary_key=True)
+    token_type = db.Column(db.String(10), nullable=False)  # access, refresh
+    user_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<RevokedToken {self.jti} {self.token_type}>'
+
+
+class OrderNumberNode(db.Model):
+    """An order number node id leased by one running process (see app.order_numbers)"""
+    __tablename__ = 'order_number_nodes'
+    
+    node_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    holder = db.Column(db.String(100), nullable=False)  # hostname:pid:nonce
+    renewed_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<OrderNumberNode {self.node_id} {self.holder}>'
+
+
 # Marshmallow schemas for serialization
 class UserSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
@@ -224,11 +507,25 @@ class ProductSchema(ma.SQLAlchemyAutoSchema):
         return obj.is_on_sale
 
 class OrderItemSchema(ma.SQLAlchemyAutoSchema):
-    product = ma.Nested(ProductSchema, only=['id', 'name', 'primary_image', 'current_price'])
+    product = ma.Method('get_product')
     
     class Meta:
         model = OrderItem
         load_instance = True
+    
+    def get_product(self, obj):
+        # Items created before snapshots existed fall back to the live product
+        if obj.product_name is None:
+            return ProductSchema(only=['id', 'name', 'primary_image', 'current_price']).dump(obj.product)
+        return {
+            'id': obj.product_id,
+            'name': obj.product_name,
+            'sku': obj.product_sku,
+            'primary_image': obj.product_image,
+            'size': obj.product_size,
+            'color': obj.product_color,
+            'current_price': float(obj.unit_price)
+        }
 
 class OrderSchema(ma.SQLAlchemyAutoSchema):
     user = ma.Nested(UserSchema, only=['id', 'email', 'first_name', 'last_name'])
@@ -245,6 +542,45 @@ class CartSchema(ma.SQLAlchemyAutoSchema):
         model = Cart
         load_instance = True
 
+class InvoiceExportSchema(ma.SQLAlchemyAutoSchema):
+    progress = ma.Method('get_progress')
+    
+    class Meta:
+        model = InvoiceExport
+        exclude = ('file_path',)
+    
+    def get_progress(self, obj):
+        if obj.status == 'completed':
+            return 100.0
+        if not obj.total_orders:
+            return 0.0
+        return round(100.0 * (obj.processed_orders or 0) / obj.total_orders, 1)
+
+class PromotionSchema(ma.SQLAlchemyAutoSchema):
+    value = ma.Method('get_value')
+    
+    class Meta:
+        model = Promotion
+    
+    def get_value(self, obj):
+        return float(obj.value) if obj.value is not None else None
+
+class CustomerStatsSchema(ma.SQLAlchemyAutoSchema):
+    lifetime_value = ma.Method('get_lifetime_value')
+    
+    class Meta:
+        model = CustomerStats
+        exclude = ('updated_at',)
+    
+    def get_lifetime_value(self, obj):
+        return float(obj.lifetime_value or 0)
+
+class StockAlertSchema(ma.SQLAlchemyAutoSchema):
+    product = ma.Nested(ProductSchema, only=['id', 'name', 'sku', 'stock_quantity'])
+    
+    class Meta:
+        model = StockAlert
+
 # Initialize schemas
 user_schema = UserSchema()
 users_schema = UserSchema(many=True)
@@ -256,3 +592,8 @@ order_schema = OrderSchema()
 orders_schema = OrderSchema(many=True)
 cart_schema = CartSchema()
 cart_items_schema = CartSchema(many=True)
+invoice_export_schema = InvoiceExportSchema()
+promotion_schema = PromotionSchema()
+promotions_schema = PromotionSchema(many=True)
+stock_alerts_schema = StockAlertSchema(many=True)
+customer_stats_schema = CustomerStatsSchema()
@@ -0,0 +1,105 @@
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import Numeric, delete, func, insert
+from sqlalchemy.orm import selectinload
+from app import db
+from app.models import Order, OrderArchive, OrderItem
+
+
+def _row_dict(obj):
+    row = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.key)
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            # Kept as text so amounts round-trip exactly
+            value = str(value)
+        row[column.key] = value
+    return row
+
+
+def _restore_decimals(row, model):
+    for column in model.__table__.columns:
+        value = row.get(column.key)
+        if isinstance(column.type, Numeric) and value is not None:
+            row[column.key] = Decimal(str(value))
+    return row
+
+
+def compress_order(order):
+    """Serialize an order and its items into a compressed JSON payload"""
+    document = _row_dict(order)
+    document['order_items'] = [_row_dict(item) for item in order.order_items]
+    return zlib.compress(json.dumps(document, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def decompress_order(payload):
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def archive_orders(cutoff, batch_size=1000):
+    """Move orders created before ``cutoff`` into order_archive.
+
+    Each batch is copied and deleted in one transaction, oldest first, so an
+    interrupted run can simply be restarted. Returns the number archived.
+    """
+    archived = 0
+    while True:
+        orders = Order.query.options(
+            selectinload(Order.order_items)
+        ).filter(
+            Order.created_at < cutoff
+        ).order_by(Order.created_at, Order.id).limit(batch_size).all()
+        if not orders:
+            break
+
+        db.session.execute(insert(OrderArchive), [
+            {
+                'order_id': order.id,
+                'order_number': order.order_number,
+                'user_id': order.user_id,
+                'status': order.status,
+                'total_amount': order.total_amount,
+                'created_at': order.created_at,
+                'archived_at': datetime.utcnow(),
+                'payload': compress_order(order)
+            }
+            for order in orders
+        ])
+
+        order_ids = [order.id for order in orders]
+        db.session.execute(
+            delete(OrderItem).where(OrderItem.order_id.in_(order_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.execute(
+            delete(Order).where(Order.id.in_(order_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        db.session.expunge_all()
+        archived += len(order_ids)
+    return archived
+
+
+def load_archived_order(order_id, user_id=None):
+    """Return an archived order as a dictionary, or None"""
+    query = OrderArchive.query.filter_by(order_id=order_id)
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    archive = query.first()
+    if not archive:
+        return None
+    document = _restore_decimals(decompress_order(archive.payload), Order)
+    for item in document['order_items']:
+        _restore_decimals(item, OrderItem)
+    return document
+
+
+def archived_through():
+    """Creation date of the newest archived order, or None if nothing is archived"""
+    newest = db.session.query(func.max(OrderArchive.created_at)).scalar()
+    return newest.date() if newest else None
@@ -0,0 +1,163 @@
+"""Order numbers that are unique across processes without a database round trip.
+
+Each process leases a node id from the order_number_nodes table the first
+time it issues a number (so forked workers each lease their own), renews
+the lease every NODE_RENEW_SECONDS while it issues numbers and leases a new
+id if it lost its lease. A lease that has not been renewed for
+NODE_LEASE_SECONDS is taken over by the next process that needs an id, so
+ids of exited processes are reused.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import OrderNumberNode
+
+
+ORDER_NUMBER_PREFIX = "EMP"
+
+# Bit layout of the numeric suffix (Snowflake style):
+#   milliseconds since UTC midnight (27 bits) | node id (10 bits) | sequence (12 bits)
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+SUFFIX_DIGITS = 15  # 49 bits always fit in 15 decimal digits
+MS_PER_DAY = 86400 * 1000
+
+NODE_LEASE_SECONDS = 600
+NODE_RENEW_SECONDS = 60
+LEASE_ATTEMPTS = 5
+
+
+def lease_node_id(holder):
+    """Lease a node id for ``holder``: an expired one if any, else the lowest unused one"""
+    for _ in range(LEASE_ATTEMPTS):
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            leases = connection.execute(
+                select(OrderNumberNode.node_id, OrderNumberNode.holder, OrderNumberNode.renewed_at)
+            ).all()
+            for node_id, previous_holder, renewed_at in leases:
+                if renewed_at < now - timedelta(seconds=NODE_LEASE_SECONDS):
+                    # Conditional on the old holder, so two processes cannot take over the same lease
+                    taken = connection.execute(update(OrderNumberNode).where(
+                        OrderNumberNode.node_id == node_id,
+                        OrderNumberNode.holder == previous_holder
+                    ).values(holder=holder, renewed_at=now)).rowcount
+                    if taken:
+                        return node_id
+        used = {node_id for node_id, _, _ in leases}
+        free = next((node_id for node_id in range(MAX_NODE_ID + 1) if node_id not in used), None)
+        if free is None:
+            break
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(OrderNumberNode).values(node_id=free, holder=holder, renewed_at=now))
+            return free
+        except IntegrityError:
+            continue  # another process leased it first
+    raise RuntimeError('No order number node id could be leased')
+
+
+def renew_node_lease(node_id, holder):
+    """Extend ``holder``'s lease of ``node_id``. Returns False if the lease was lost."""
+    with db.engine.begin() as connection:
+        return connection.execute(update(OrderNumberNode).where(
+            OrderNumberNode.node_id == node_id,
+            OrderNumberNode.holder == holder
+        ).values(renewed_at=datetime.utcnow())).rowcount == 1
+
+
+class OrderNumberGenerator:
+    """Monotonic, k-sortable order number generator.
+
+    Numbers look like ``EMP20240131`` followed by a 15 digit suffix. The
+    suffix packs the millisecond of the day, the node id of the generating
+    process and a per-millisecond sequence, so numbers sort by creation time
+    and never collide between processes with different node ids. Without an
+    explicit ``node_id`` the id is leased from the database. Up to 4096
+    numbers per millisecond per process can be issued; beyond that the
+    generator moves on to the next millisecond instead of repeating a value.
+    """
+
+    def __init__(self, node_id=None, prefix=ORDER_NUMBER_PREFIX, clock=time.time):
+        self._configured_node_id = node_id
+        self.prefix = prefix
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._holder = f'{socket.gethostname()[:60]}:{self._pid}:{uuid.uuid4().hex[:8]}'
+        self._renewed_at = None
+        if self._configured_node_id is not None:
+            self.node_id = self._configured_node_id & MAX_NODE_ID
+        else:
+            self.node_id = None
+        self._last_ms = -1
+        self._sequence = 0
+        self._day_index = None
+        self._day_prefix = None
+
+    def _ensure_lease(self):
+        now = time.monotonic()
+        if self.node_id is not None and now - self._renewed_at < NODE_RENEW_SECONDS:
+            return
+        if self.node_id is None or not renew_node_lease(self.node_id, self._holder):
+            self.node_id = lease_node_id(self._holder)
+        self._renewed_at = now
+
+    def _now_ms(self):
+        return int(self._clock() * 1000)
+
+    def next(self):
+        """Return the next order number"""
+        with self._lock:
+            # Forked workers inherit the parent's state; each leases its own node id
+            if os.getpid() != self._pid:
+                self._reset()
+            if self._configured_node_id is None:
+                self._ensure_lease()
+
+            now_ms = self._now_ms()
+            # Never step backwards if the system clock does
+            if now_ms < self._last_ms:
+                now_ms = self._last_ms
+
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond: borrow the next
+                    # one rather than blocking, the wall clock catches up
+                    now_ms = self._last_ms + 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+
+            day_index, ms_of_day = divmod(now_ms, MS_PER_DAY)
+            if day_index != self._day_index:
+                day = datetime.fromtimestamp(day_index * 86400, tz=timezone.utc)
+                self._day_prefix = f"{self.prefix}{day.strftime('%Y%m%d')}"
+                self._day_index = day_index
+
+            value = (
+                (ms_of_day << (NODE_BITS + SEQUENCE_BITS))
+                | (self.node_id << SEQUENCE_BITS)
+                | self._sequence
+            )
+            return f"{self._day_prefix}{value:015d}"
+
+
+_generator = OrderNumberGenerator()
+
+
+def generate_order_number():
+    """Generate unique order number"""
+    return _generator.next()
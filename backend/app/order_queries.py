@@ -0,0 +1,88 @@
+from app.models import Order, OrderItem
+from app.search import search_orders
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+
+
+def filter_admin_orders(query, status=None, search=None, ranked=False):
+    """Apply the admin order list filters to an ORM query or a select().
+
+    The search (see app.search) is index-backed and only filters on order
+    columns and a users subquery, so it composes with statements that
+    already join users. With ``ranked``, best matches are ordered first.
+    """
+    if status:
+        query = query.filter(Order.status == status)
+    if search:
+        condition, rank = search_orders(search)
+        query = query.filter(condition)
+        if ranked:
+            query = query.order_by(rank.desc())
+    return query
+
+
+def with_order_details(query):
+    """Eager-load everything OrderSchema serializes.
+
+    Items and the order's user are each fetched with one extra
+    SELECT ... IN query per page instead of one lazy load per row. Items
+    carry a product snapshot, so products are not loaded at all.
+    """
+    return query.options(
+        selectinload(Order.user),
+        selectinload(Order.order_items)
+    )
+
+
+def order_summary_query(query):
+    """Project an Order query onto the columns of the summary view.
+
+    Item counts and the thumbnail are correlated subqueries, so a page of
+    summaries is a single SELECT regardless of how many items orders have.
+    Filters, joins and ordering already applied to ``query`` are kept.
+    """
+    item_count = select(
+        func.coalesce(func.sum(OrderItem.quantity), 0)
+    ).where(
+        OrderItem.order_id == Order.id
+    ).correlate(Order).scalar_subquery()
+
+    thumbnail = select(OrderItem.product_image).where(
+        OrderItem.order_id == Order.id
+    ).order_by(OrderItem.id).limit(1).correlate(Order).scalar_subquery()
+
+    return query.with_entities(
+        Order.id,
+        Order.order_number,
+        Order.status,
+        Order.payment_status,
+        Order.subtotal,
+        Order.tax_amount,
+        Order.shipping_amount,
+        Order.discount_amount,
+        Order.total_amount,
+        Order.created_at,
+        item_count.label('item_count'),
+        thumbnail.label('thumbnail')
+    )
+
+
+def serialize_order_summaries(rows):
+    """Convert summary rows into JSON-ready dictionaries"""
+    return [
+        {
+            'id': row.id,
+            'order_number': row.order_number,
+            'status': row.status,
+            'payment_status': row.payment_status,
+            'subtotal': float(row.subtotal or 0),
+            'tax_amount': float(row.tax_amount or 0),
+            'shipping_amount': float(row.shipping_amount or 0),
+            'discount_amount': float(row.discount_amount or 0),
+            'total_amount': float(row.total_amount or 0),
+            'item_count': int(row.item_count or 0),
+            'thumbnail': row.thumbnail,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        }
+        for row in rows
+    ]
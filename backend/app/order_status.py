@@ -0,0 +1,106 @@
+from app import db
+from app.models import Order, OrderItem
+from app.inventory import restore_stock, sync_stock_alerts
+from app.events import ORDER_CANCELLED, ORDER_STATUS_CHANGED, record_order_events
+from app.rollups import record_status_changes
+from datetime import datetime
+from sqlalchemy import func, select, update
+
+
+VALID_STATUSES = ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled']
+CANCELLABLE_STATUSES = ['pending', 'confirmed']
+
+# Status -> statuses an order may move to with transition_orders.
+# Cancellation goes through cancel_orders, which also restores stock.
+ALLOWED_TRANSITIONS = {
+    'pending': ['confirmed', 'processing'],
+    'confirmed': ['processing', 'shipped'],
+    'processing': ['shipped'],
+    'shipped': ['delivered'],
+    'delivered': [],
+    'cancelled': [],
+}
+
+# Timestamp columns set the first time an order reaches a status
+STATUS_TIMESTAMPS = {'shipped': 'shipped_at', 'delivered': 'delivered_at'}
+
+
+def cancel_orders(order_ids, user_id=None):
+    """Cancel every cancellable order in ``order_ids`` and restore its stock.
+
+    The status change is a conditional UPDATE ... RETURNING, so an order that
+    is cancelled concurrently (or is no longer cancellable) is skipped rather
+    than having its stock restored twice. Stock restoration, stock alerts,
+    the rollup update and the order.cancelled events run in the same transaction; the
+    caller commits.
+    Returns the ids that were cancelled.
+    """
+    if not order_ids:
+        return []
+
+    # One UPDATE per previous status, so the rollups know which status
+    # bucket each cancelled order leaves
+    cancelled = []
+    changes = []
+    for previous_status in CANCELLABLE_STATUSES:
+        statement = update(Order).where(
+            Order.id.in_(order_ids),
+            Order.status == previous_status
+        )
+        if user_id is not None:
+            statement = statement.where(Order.user_id == user_id)
+
+        rows = db.session.execute(
+            statement.values(status='cancelled').returning(Order.id, Order.created_at, Order.total_amount),
+            execution_options={'synchronize_session': 'fetch'}
+        ).all()
+        cancelled.extend(row.id for row in rows)
+        changes.extend((row.created_at, row.total_amount, previous_status, 'cancelled') for row in rows)
+
+    cancelled_ids = sorted(cancelled)
+    restore_stock(cancelled_ids)
+    if cancelled_ids:
+        sync_stock_alerts(select(OrderItem.product_id).where(OrderItem.order_id.in_(cancelled_ids)))
+    record_status_changes(changes)
+    record_order_events(ORDER_CANCELLED, cancelled_ids)
+    return cancelled_ids
+
+
+def transition_orders(order_ids, new_status):
+    """Move every order in ``order_ids`` whose current status allows it to ``new_status``.
+
+    Like cancel_orders, each allowed previous status is one conditional
+    UPDATE ... RETURNING over all the orders, which also sets shipped_at or
+    delivered_at if it is still empty. Orders changed concurrently are
+    skipped, not moved twice. Rollups and order.status_changed events are
+    written in the same transaction; the caller commits.
+    Returns {order_id: previous_status} for the orders that moved.
+    """
+    if not order_ids:
+        return {}
+
+    values = {'status': new_status}
+    timestamp = STATUS_TIMESTAMPS.get(new_status)
+    if timestamp:
+        values[timestamp] = func.coalesce(getattr(Order, timestamp), datetime.utcnow())
+
+    moved = {}
+    changes = []
+    for previous_status, targets in ALLOWED_TRANSITIONS.items():
+        if new_status not in targets:
+            continue
+        rows = db.session.execute(
+            update(Order).where(
+                Order.id.in_(order_ids),
+                Order.status == previous_status
+            ).values(**values).returning(Order.id, Order.created_at, Order.total_amount),
+            execution_options={'synchronize_session': 'fetch'}
+        ).all()
+        if not rows:
+            continue
+        moved.update((row.id, previous_status) for row in rows)
+        changes.extend((row.created_at, row.total_amount, previous_status, new_status) for row in rows)
+        record_order_events(ORDER_STATUS_CHANGED, sorted(row.id for row in rows), previous_status=previous_status)
+
+    record_status_changes(changes)
+    return moved
@@ -0,0 +1,227 @@
+"""Monthly range partitioning of orders and order_items on PostgreSQL.
+
+The ORM models are unchanged: queries go through the partitioned parent
+tables and PostgreSQL prunes partitions from the created_at predicates the
+routes already use. On other databases (SQLite in development and tests)
+orders and order_items stay plain tables and these helpers do nothing.
+
+Tables that need to reference orders must not declare a database foreign
+key to orders.id, since the partitioned primary key is (id, created_at).
+"""
+from datetime import date
+from sqlalchemy import text
+from app import db
+from app.models import Order, OrderItem
+
+
+PARTITIONED_TABLES = [
+    {
+        'table': Order.__table__,
+        'key': 'created_at',
+        'constraints': [
+            'CONSTRAINT orders_part_pkey PRIMARY KEY (id, created_at)',
+            'CONSTRAINT orders_part_order_number_key UNIQUE (order_number, created_at)',
+            'CONSTRAINT orders_part_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)',
+        ],
+        'indexes': {
+            'ix_orders_part_user_id_created_at': 'user_id, created_at',
+            'ix_orders_part_created_at': 'created_at',
+            'ix_orders_part_status': 'status',
+            'ix_orders_part_order_number': 'order_number',
+        },
+    },
+    {
+        'table': OrderItem.__table__,
+        'key': 'order_created_at',
+        'constraints': [
+            'CONSTRAINT order_items_part_pkey PRIMARY KEY (id, order_created_at)',
+            'CONSTRAINT order_items_part_order_fkey FOREIGN KEY (order_id, order_created_at) '
+            'REFERENCES orders (id, created_at) ON DELETE CASCADE',
+            'CONSTRAINT order_items_part_product_id_fkey FOREIGN KEY (product_id) REFERENCES products (id)',
+        ],
+        'indexes': {
+            'ix_order_items_part_order_id': 'order_id',
+            'ix_order_items_part_product_id': 'product_id',
+        },
+    },
+]
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(table_name, month):
+    return f'{table_name}_y{month.year}m{month.month:02d}'
+
+
+def _column_ddl(column, key):
+    if column.primary_key:
+        return f'{column.name} SERIAL'
+    ddl = f'{column.name} {column.type.compile(dialect=db.engine.dialect)}'
+    if not column.nullable or column.name == key:
+        ddl += ' NOT NULL'
+    return ddl
+
+
+def create_partitioned_tables(connection):
+    """Create orders and order_items as partitioned parents with a default partition"""
+    for spec in PARTITIONED_TABLES:
+        table = spec['table']
+        columns = [_column_ddl(column, spec['key']) for column in table.columns]
+        connection.execute(text(
+            f"CREATE TABLE {table.name} ({', '.join(columns + spec['constraints'])}) "
+            f"PARTITION BY RANGE ({spec['key']})"
+        ))
+        # Catches rows outside the pre-created monthly ranges
+        connection.execute(text(f'CREATE TABLE {table.name}_default PARTITION OF {table.name} DEFAULT'))
+        for index_name, index_columns in spec['indexes'].items():
+            connection.execute(text(f'CREATE INDEX {index_name} ON {table.name} ({index_columns})'))
+
+
+def ensure_monthly_partitions(connection, first_month, last_month):
+    """Create monthly partitions for every month in [first_month, last_month]"""
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        next_month = add_months(month, 1)
+        for spec in PARTITIONED_TABLES:
+            name = partition_name(spec['table'].name, month)
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {spec['table'].name} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+            ))
+            created.append(name)
+        month = next_month
+    return created
+
+
+def _table_exists(connection, name):
+    return connection.execute(text('SELECT to_regclass(:name)'), {'name': name}).scalar() is not None
+
+
+def _is_partitioned(connection, name):
+    return connection.execute(text(
+        'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table '
+        'JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid WHERE pg_class.relname = :name)'
+    ), {'name': name}).scalar()
+
+
+def init_partitions(months_ahead=3):
+    """Create the partitioned order tables, converting existing plain tables.
+
+    Existing orders and order_items are renamed to *_unpartitioned, copied
+    into the new partitions and left in place for the operator to drop once
+    the copy has been checked. Returns False on databases without partitioning.
+    """
+    if not is_postgres():
+        return False
+
+    partitioned = {spec['table'].name for spec in PARTITIONED_TABLES}
+    with db.engine.begin() as connection:
+        # Tables the partitioned ones reference must exist first
+        db.metadata.create_all(
+            connection,
+            tables=[table for table in db.metadata.sorted_tables if table.name not in partitioned]
+        )
+        if _is_partitioned(connection, 'orders'):
+            ensure_monthly_partitions(connection, date.today(), add_months(month_start(date.today()), months_ahead))
+            return True
+
+        migrate_existing = _table_exists(connection, 'orders')
+        first_month = month_start(date.today())
+
+        if migrate_existing:
+            oldest = connection.execute(text('SELECT min(created_at) FROM orders')).scalar()
+            if oldest:
+                first_month = month_start(oldest)
+            connection.execute(text('ALTER TABLE order_items RENAME TO order_items_unpartitioned'))
+            connection.execute(text('ALTER TABLE orders RENAME TO orders_unpartitioned'))
+
+        create_partitioned_tables(connection)
+        ensure_monthly_partitions(connection, first_month, add_months(month_start(date.today()), months_ahead))
+
+        if migrate_existing:
+            order_columns = ', '.join(column.name for column in Order.__table__.columns)
+            connection.execute(text(
+                f'INSERT INTO orders ({order_columns}) SELECT {order_columns} FROM orders_unpartitioned'
+            ))
+            item_columns = [column.name for column in OrderItem.__table__.columns if column.name != 'order_created_at']
+            connection.execute(text(
+                f"INSERT INTO order_items ({', '.join(item_columns)}, order_created_at) "
+                f"SELECT {', '.join('i.' + name for name in item_columns)}, o.created_at "
+                f"FROM order_items_unpartitioned i JOIN orders_unpartitioned o ON o.id = i.order_id"
+            ))
+            for table_name in ('orders', 'order_items'):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                    f"COALESCE((SELECT max(id) FROM {table_name}), 0) + 1, false)"
+                ))
+    return True
+
+
+def create_upcoming_partitions(months_ahead=3):
+    """Make sure partitions exist for the current month and the next few"""
+    if not is_postgres():
+        return []
+    this_month = month_start(date.today())
+    with db.engine.begin() as connection:
+        return ensure_monthly_partitions(connection, this_month, add_months(this_month, months_ahead))
+
+
+def ensure_partitions_between(first_day, last_day):
+    """Make sure monthly partitions cover [first_day, last_day] before a bulk load.
+
+    Rows outside every monthly partition land in the default partition, which
+    would then block creating the partition for their month.
+    """
+    if not is_postgres():
+        return []
+    with db.engine.begin() as connection:
+        if not _is_partitioned(connection, 'orders'):
+            return []
+        return ensure_monthly_partitions(connection, month_start(first_day), month_start(last_day))
+
+
+def drop_archived_partitions(cutoff):
+    """Drop monthly partitions that lie entirely before the ``cutoff`` date and are empty.
+
+    Called after archival so the hot tables only span the retention window.
+    """
+    if not is_postgres():
+        return []
+
+    dropped = []
+    with db.engine.begin() as connection:
+        partitions = connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'orders' AND child.relname LIKE 'orders\\_y%'"
+        )).scalars().all()
+
+        for name in sorted(partitions):
+            year, month = name[len('orders_y'):].split('m')
+            month = date(int(year), int(month), 1)
+            if add_months(month, 1) > cutoff:
+                continue
+            if connection.execute(text(f'SELECT EXISTS (SELECT 1 FROM {name})')).scalar():
+                continue
+            # Items reference orders, so their partition goes first
+            items_name = partition_name('order_items', month)
+            if _table_exists(connection, items_name):
+                connection.execute(text(f'ALTER TABLE order_items DETACH PARTITION {items_name}'))
+                connection.execute(text(f'DROP TABLE {items_name}'))
+            connection.execute(text(f'ALTER TABLE orders DETACH PARTITION {name}'))
+            connection.execute(text(f'DROP TABLE {name}'))
+            dropped.extend([items_name, name])
+    return dropped
@@ -0,0 +1,86 @@
+"""Password hashing on a bounded worker pool.
+
+bcrypt is deliberately slow (about 250 ms at cost 12), so hashes run on a
+small per-process thread pool of PASSWORD_HASH_WORKERS threads. The pool
+does not free the calling request thread, which waits for its result; it
+caps how many hashes run at once, so a burst of logins cannot take every
+CPU from other requests (bcrypt releases the GIL while it works). At most
+PASSWORD_HASH_QUEUE further hashes may wait for a worker. Beyond that
+PasswordHashingBusy is raised at once, and the auth routes answer 503 with
+a Retry-After header, which is the backpressure, instead of piling up
+request threads behind the pool.
+
+New hashes use BCRYPT_ROUNDS; needs_rehash tells login when a stored hash
+was made with a different cost.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app, jsonify
+
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when every hashing worker and queue slot is taken"""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing is saturated')
+        self.retry_after = retry_after
+
+
+def _submit(fn, *args):
+    global _executor, _slots
+
+    config = current_app.config
+    with _executor_lock:
+        if _executor is None:
+            workers = config['PASSWORD_HASH_WORKERS']
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(workers + config['PASSWORD_HASH_QUEUE'])
+    if not _slots.acquire(blocking=False):
+        raise PasswordHashingBusy(config['PASSWORD_HASH_RETRY_AFTER'])
+    try:
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    """bcrypt hash of ``password`` at the configured cost"""
+    rounds = current_app.config['BCRYPT_ROUNDS']
+    hashed = _submit(lambda value: bcrypt.hashpw(value, bcrypt.gensalt(rounds)), password.encode('utf-8'))
+    return hashed.decode('utf-8')
+
+
+def verify_password(password, password_hash):
+    try:
+        return _submit(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        # A malformed stored hash matches no password
+        return False
+
+
+def hash_cost(password_hash):
+    """Cost factor stored in a bcrypt hash ($2b$<cost>$...), or None if it is malformed"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != current_app.config['BCRYPT_ROUNDS']
+
+
+def busy_response(error):
+    response = jsonify({'error': 'Too many sign-in requests, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
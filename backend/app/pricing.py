@@ -0,0 +1,105 @@
+"""Cart and order pricing.
+
+Every endpoint that shows or charges a total goes through price_lines, so
+the cart page, checkout validation and the created order always agree.
+Amounts are Decimal end to end and rounded to cents once per line and once
+per total.
+"""
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from app import db
+from app.cache import LRUCache
+from app.models import Cart, Product
+from app.promotions import get_promotion_index
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+
+TAX_RATE = Decimal('0.08')  # 8% tax
+SHIPPING_AMOUNT = Decimal('0.00')  # Free shipping for MVP
+CENT = Decimal('0.01')
+
+# Serialized cart views keyed by (user id, cart version, promotion index version)
+cart_view_cache = LRUCache(maxsize=10000)
+
+
+def to_money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def load_cart_lines(user_id):
+    """Load a user's cart items together with their products in one query"""
+    return Cart.query.options(
+        joinedload(Cart.product)
+    ).filter_by(user_id=user_id).order_by(Cart.id).all()
+
+
+def cart_version(user_id):
+    """Cheap fingerprint that changes whenever the priced view of a cart would.
+
+    Covers cart rows being added, removed or updated and any change to the
+    products in the cart (price, stock, activation), via updated_at columns.
+    """
+    row = db.session.execute(
+        select(
+            func.count(Cart.id),
+            func.sum(Cart.id),
+            func.sum(Cart.quantity),
+            func.max(Cart.updated_at),
+            func.max(Product.updated_at)
+        ).join(Product, Product.id == Cart.product_id).where(Cart.user_id == user_id)
+    ).one()
+    return tuple(row)
+
+
+def price_lines(lines, coupon_code=None):
+    """Price cart lines in a single pass.
+
+    ``lines`` are Cart items with their product loaded; lines whose product
+    is missing or inactive are ignored. Each line gets the best applicable
+    promotion from the promotion index, including coupon-only promotions
+    for ``coupon_code``. Returns a dict with the priced lines and Decimal
+    totals.
+    """
+    promotions = get_promotion_index()
+    now = datetime.utcnow()
+    priced = []
+    subtotal = Decimal('0')
+    discount = Decimal('0')
+    total_items = 0
+
+    for item in lines:
+        product = item.product
+        if not product or not product.is_active:
+            continue
+        unit_price = to_money(product.current_price)
+        line_total = to_money(unit_price * item.quantity)
+        line_discount, promotion = promotions.best_discount(product, unit_price, item.quantity, coupon_code, now)
+        line_discount = to_money(line_discount)
+        priced.append({
+            'item': item,
+            'product': product,
+            'quantity': item.quantity,
+            'unit_price': unit_price,
+            'line_total': line_total,
+            'discount': line_discount,
+            'promotion_id': promotion.id if promotion else None
+        })
+        subtotal += line_total
+        discount += line_discount
+        total_items += item.quantity
+
+    taxable = subtotal - discount
+    tax = to_money(taxable * TAX_RATE)
+    shipping = SHIPPING_AMOUNT if priced else Decimal('0.00')
+
+    return {
+        'lines': priced,
+        'total_items': total_items,
+        'subtotal': to_money(subtotal),
+        'discount': to_money(discount),
+        'tax': tax,
+        'shipping': shipping,
+        'total': to_money(taxable + tax + shipping),
+        'promotion_ids': sorted({line['promotion_id'] for line in priced if line['promotion_id']})
+    }
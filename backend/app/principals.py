@@ -0,0 +1,75 @@
+"""Admin authorization without a database query per request.
+
+Access tokens carry the user's role as an ``is_admin`` claim, so requests
+with a customer token are turned away from admin routes straight from the
+token. An access token outlives a change of role by up to
+JWT_ACCESS_TOKEN_EXPIRES, so an admin claim is confirmed against the user's
+current is_admin and is_active flags. Those flags are cached per process
+for PRINCIPAL_CACHE_TTL seconds and dropped as soon as an admin changes
+them. A customer promoted to admin gets the new claim with their next
+token refresh.
+"""
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import select
+from app import db
+from app.cache import TTLCache
+from app.models import User
+
+
+Principal = namedtuple('Principal', ['id', 'is_admin', 'is_active'])
+
+principal_cache = TTLCache(ttl=30)
+
+_UNKNOWN = object()
+
+
+def role_claims(user):
+    return {'is_admin': bool(user.is_admin)}
+
+
+def create_user_token(user):
+    """Access token for ``user`` with its role claims"""
+    return create_access_token(identity=user.id, additional_claims=role_claims(user))
+
+
+def create_user_refresh_token(user):
+    return create_refresh_token(identity=user.id)
+
+
+def load_principal(user_id):
+    """The user's current role flags, or None for an unknown user (cached)"""
+    principal = principal_cache.get(user_id, _UNKNOWN)
+    if principal is _UNKNOWN:
+        row = db.session.execute(
+            select(User.id, User.is_admin, User.is_active).where(User.id == user_id)
+        ).first()
+        principal = Principal(*row) if row else None
+        principal_cache.set(user_id, principal, ttl=current_app.config['PRINCIPAL_CACHE_TTL'])
+    return principal
+
+
+def invalidate_principal(user_id):
+    """Forget a user's cached flags after changing is_admin or is_active"""
+    principal_cache.pop(user_id)
+
+
+def current_user_is_admin():
+    # Tokens issued before role claims existed fall through to the cache
+    if get_jwt().get('is_admin') is False:
+        return False
+    principal = load_principal(get_jwt_identity())
+    return bool(principal and principal.is_admin and principal.is_active)
+
+
+def admin_required(fn):
+    """Require a valid access token belonging to an active admin"""
+    @wraps(fn)
+    def decorated_function(*args, **kwargs):
+        verify_jwt_in_request()
+        if not current_user_is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        return fn(*args, **kwargs)
+    return decorated_function
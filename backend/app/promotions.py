@@ -0,0 +1,267 @@
+"""Promotions and coupon codes.
+
+Active promotions are compiled into an in-memory index keyed by the product
+attribute each one is scoped to, so pricing a cart only looks at the rules
+that can match a line (the 'all' rules plus one dictionary lookup per
+category, brand, SKU and tag) instead of at every promotion.
+
+The index is rebuilt lazily: after any promotion change is committed in this
+process, when a promotion starts or ends, and at most PROMOTION_INDEX_TTL
+seconds after a change made by another process.
+"""
+import itertools
+import threading
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from flask import current_app
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, object_session
+from app.models import Promotion
+
+
+PROMOTION_KINDS = ['percentage', 'fixed', 'bxgy']
+PROMOTION_SCOPES = ['all', 'category', 'brand', 'tag', 'sku']
+
+CompiledPromotion = namedtuple('CompiledPromotion', [
+    'id', 'name', 'kind', 'value', 'buy_quantity', 'get_quantity', 'coupon_code', 'starts_at', 'ends_at'
+])
+
+_versions = itertools.count(1)
+_index = None
+_index_lock = threading.Lock()
+
+
+def normalize_key(value):
+    return str(value).strip().lower()
+
+
+def normalize_coupon(code):
+    if code and not isinstance(code, str):
+        raise ValueError('coupon_code must be a string')
+    return code.strip().upper() if code else None
+
+
+def _compile(promotion):
+    return CompiledPromotion(
+        id=promotion.id,
+        name=promotion.name,
+        kind=promotion.kind,
+        value=Decimal(promotion.value or 0),
+        buy_quantity=promotion.buy_quantity or 0,
+        get_quantity=promotion.get_quantity or 0,
+        coupon_code=normalize_coupon(promotion.coupon_code),
+        starts_at=promotion.starts_at,
+        ends_at=promotion.ends_at
+    )
+
+
+def promotion_discount(rule, unit_price, quantity):
+    """Unrounded discount a rule gives on ``quantity`` units at ``unit_price``"""
+    if rule.kind == 'percentage':
+        return unit_price * quantity * rule.value / 100
+    if rule.kind == 'fixed':
+        return min(rule.value, unit_price) * quantity
+    if rule.kind == 'bxgy':
+        group = rule.buy_quantity + rule.get_quantity
+        return unit_price * (quantity // group) * rule.get_quantity
+    return Decimal('0')
+
+
+class PromotionIndex:
+    """Active promotions bucketed by the product attribute they target"""
+
+    def __init__(self, promotions, now, ttl):
+        self.version = next(_versions)
+        self._all = []
+        self._by_key = defaultdict(list)  # (scope, normalized value) -> rules
+        self._coupons = {}
+
+        # Rebuild when the TTL passes or a loaded promotion starts or ends
+        self.expires_at = now + timedelta(seconds=ttl)
+        for promotion in promotions:
+            rule = _compile(promotion)
+            if promotion.scope == 'all':
+                self._all.append(rule)
+            else:
+                self._by_key[(promotion.scope, normalize_key(promotion.scope_value))].append(rule)
+            if rule.coupon_code:
+                self._coupons[rule.coupon_code] = rule
+            for boundary in (rule.starts_at, rule.ends_at):
+                if boundary and now < boundary < self.expires_at:
+                    self.expires_at = boundary
+
+    def __len__(self):
+        return len(self._all) + sum(len(rules) for rules in self._by_key.values())
+
+    def candidates(self, product):
+        """Rules that may apply to ``product``, without time or coupon checks"""
+        rules = list(self._all)
+        by_key = self._by_key
+        if not by_key:
+            return rules
+        rules.extend(by_key.get(('category', normalize_key(product.category_id)), ()))
+        if product.brand:
+            rules.extend(by_key.get(('brand', normalize_key(product.brand)), ()))
+        rules.extend(by_key.get(('sku', normalize_key(product.sku)), ()))
+        for tag in product.tags or ():
+            rules.extend(by_key.get(('tag', normalize_key(tag)), ()))
+        return rules
+
+    def is_valid_coupon(self, code, now=None):
+        rule = self._coupons.get(normalize_coupon(code))
+        return rule is not None and _in_window(rule, now or datetime.utcnow())
+
+    def best_discount(self, product, unit_price, quantity, coupon_code=None, now=None):
+        """Return (discount, rule) for the best single promotion on a cart line.
+
+        Promotions do not stack: each line gets whichever applicable rule
+        saves the most, capped at the line total.
+        """
+        now = now or datetime.utcnow()
+        coupon_code = normalize_coupon(coupon_code)
+        best, best_rule = Decimal('0'), None
+        for rule in self.candidates(product):
+            if rule.coupon_code and rule.coupon_code != coupon_code:
+                continue
+            if not _in_window(rule, now):
+                continue
+            discount = promotion_discount(rule, unit_price, quantity)
+            if discount > best:
+                best, best_rule = discount, rule
+        return min(best, unit_price * quantity), best_rule
+
+
+def _in_window(rule, now):
+    return (rule.starts_at is None or rule.starts_at <= now) and (rule.ends_at is None or now < rule.ends_at)
+
+
+def build_promotion_index():
+    now = datetime.utcnow()
+    promotions = Promotion.query.filter(
+        Promotion.is_active.is_(True),
+        or_(Promotion.ends_at.is_(None), Promotion.ends_at > now)
+    ).all()
+    return PromotionIndex(promotions, now, current_app.config['PROMOTION_INDEX_TTL'])
+
+
+def get_promotion_index():
+    """Return the current promotion index, rebuilding it if it is stale"""
+    global _index
+    index = _index
+    if index is None or datetime.utcnow() >= index.expires_at:
+        with _index_lock:
+            if _index is None or datetime.utcnow() >= _index.expires_at:
+                _index = build_promotion_index()
+            index = _index
+    return index
+
+
+def invalidate_promotion_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+@event.listens_for(Promotion, 'after_insert')
+@event.listens_for(Promotion, 'after_update')
+@event.listens_for(Promotion, 'after_delete')
+def _promotion_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['promotions_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    # Only drop the index once the change is visible to the rebuild query
+    if session.info.pop('promotions_changed', False):
+        invalidate_promotion_index()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('promotions_changed', None)
+
+
+def _parse_datetime(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be an ISO 8601 date or datetime')
+
+
+def _parse_positive_int(value, field):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be an integer')
+    if value < 1:
+        raise ValueError(f'{field} must be at least 1')
+    return value
+
+
+def apply_promotion_changes(promotion, data):
+    """Validate admin input and copy it onto ``promotion``. Raises ValueError."""
+    if 'name' in data:
+        if not isinstance(data['name'], str) or len(data['name']) > 120:
+            raise ValueError('name must be a string of at most 120 characters')
+        promotion.name = data['name']
+    if 'description' in data:
+        if data['description'] is not None and not isinstance(data['description'], str):
+            raise ValueError('description must be a string')
+        promotion.description = data['description']
+    if 'is_active' in data:
+        if not isinstance(data['is_active'], bool):
+            raise ValueError('is_active must be true or false')
+        promotion.is_active = data['is_active']
+
+    if 'kind' in data:
+        if data['kind'] not in PROMOTION_KINDS:
+            raise ValueError(f"kind must be one of {', '.join(PROMOTION_KINDS)}")
+        promotion.kind = data['kind']
+    if 'value' in data:
+        try:
+            value = Decimal(str(data['value']))
+        except InvalidOperation:
+            raise ValueError('value must be a number')
+        if not value.is_finite():
+            raise ValueError('value must be a finite number')
+        promotion.value = value
+    if 'buy_quantity' in data:
+        promotion.buy_quantity = _parse_positive_int(data['buy_quantity'], 'buy_quantity')
+    if 'get_quantity' in data:
+        promotion.get_quantity = _parse_positive_int(data['get_quantity'], 'get_quantity')
+
+    if 'scope' in data:
+        if data['scope'] not in PROMOTION_SCOPES:
+            raise ValueError(f"scope must be one of {', '.join(PROMOTION_SCOPES)}")
+        promotion.scope = data['scope']
+    if 'scope_value' in data:
+        promotion.scope_value = str(data['scope_value']) if data['scope_value'] is not None else None
+    if 'coupon_code' in data:
+        if data['coupon_code'] is not None and not isinstance(data['coupon_code'], str):
+            raise ValueError('coupon_code must be a string')
+        promotion.coupon_code = normalize_coupon(data['coupon_code'])
+    if 'starts_at' in data:
+        promotion.starts_at = _parse_datetime(data['starts_at'], 'starts_at')
+    if 'ends_at' in data:
+        promotion.ends_at = _parse_datetime(data['ends_at'], 'ends_at')
+
+    if not promotion.name:
+        raise ValueError('name is required')
+    if promotion.kind not in PROMOTION_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(PROMOTION_KINDS)}")
+    if promotion.kind == 'percentage' and not (0 < (promotion.value or 0) <= 100):
+        raise ValueError('Percentage promotions need a value between 0 and 100')
+    if promotion.kind == 'fixed' and not (promotion.value or 0) > 0:
+        raise ValueError('Fixed promotions need a positive value')
+    if promotion.kind == 'bxgy' and not (promotion.buy_quantity and promotion.get_quantity):
+        raise ValueError('Buy-X-get-Y promotions need buy_quantity and get_quantity')
+    if (promotion.scope or 'all') != 'all' and not promotion.scope_value:
+        raise ValueError('scope_value is required unless scope is all')
+    if promotion.starts_at and promotion.ends_at and promotion.ends_at <= promotion.starts_at:
+        raise ValueError('ends_at must be after starts_at')
+    return promotion
@@ -0,0 +1,230 @@
+"""Token bucket rate limiting for auth and write endpoints.
+
+RATELIMITS maps an endpoint (``'auth.login'``) or a whole blueprint
+(``'cart'``) to rules such as ``'ip:10/minute'`` or
+``'user:60/minute;burst=20'``. A rule allows ``count`` requests per period
+on average and up to ``burst`` (default ``count``) at once, per client IP
+or per authenticated user; user rules fall back to the IP for anonymous
+requests. Endpoint rules replace the rules of their blueprint. Only unsafe
+methods are limited, so browsing is never throttled.
+
+IP rules key on request.remote_addr. Behind reverse proxies set
+TRUSTED_PROXY_COUNT to the number of proxy hops, so the client address is
+read from X-Forwarded-For; otherwise every client shares the proxy's bucket.
+Do not set it when clients connect directly, since they could then pick
+their own address.
+
+Buckets live in process memory by default. Set RATELIMIT_STORAGE to the
+path of a local SQLite file to share them between the worker processes of
+one host. Limited responses are 429 with Retry-After, and every limited
+endpoint reports X-RateLimit-Limit and X-RateLimit-Remaining.
+"""
+import math
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+DEFAULT_RATELIMITS = {
+    'auth.login': ['ip:10/minute'],
+    'auth.register': ['ip:5/minute'],
+    'auth.change_password': ['user:5/minute'],
+    'orders.simulate_payment': ['ip:30/minute'],
+    'orders.create_order': ['user:10/minute'],
+    'cart': ['user:60/minute;burst=20'],
+}
+
+Rule = namedtuple('Rule', ['scope', 'capacity', 'rate', 'label'])
+
+
+def parse_rule(text):
+    """Parse ``'<ip|user>:<count>/<period>[;burst=<n>]'`` into a Rule"""
+    spec, _, options = text.partition(';')
+    scope, _, limit = spec.partition(':')
+    count, _, period = limit.partition('/')
+    if scope not in ('ip', 'user') or period not in PERIODS:
+        raise ValueError(f'Invalid rate limit rule: {text!r}')
+    count = int(count)
+    burst = count
+    if options:
+        name, _, value = options.partition('=')
+        if name != 'burst':
+            raise ValueError(f'Invalid rate limit rule: {text!r}')
+        burst = int(value)
+    return Rule(scope, burst, count / PERIODS[period], text)
+
+
+class MemoryBackend:
+    """Buckets in a dict of key -> (tokens, updated, full_at), behind one lock.
+
+    Buckets that have refilled completely carry no state and are pruned
+    once there are more than ``max_keys``.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """Take one token; returns (allowed, tokens left)"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, tokens
+
+    def _prune(self, now):
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        # Still too many active clients: forget the oldest
+        excess = len(self._buckets) - int(self.max_keys * 0.9)
+        for key in list(self._buckets)[:max(excess, 0)]:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Buckets in a local SQLite file shared by the worker processes of one host.
+
+    Each take is a single atomic upsert, so processes never lose updates.
+    """
+
+    clock = staticmethod(time.time)
+    PRUNE_EVERY = 10000
+
+    TAKE = """
+        INSERT INTO rate_buckets (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:capacity, tokens + (:now - updated) * :rate)
+                - (min(:capacity, tokens + (:now - updated) * :rate) >= 1),
+            allowed = min(:capacity, tokens + (:now - updated) * :rate) >= 1,
+            updated = :now
+        RETURNING allowed, tokens
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS rate_buckets '
+            '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL)'
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=1)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, rate, now):
+        connection = self._connect()
+        allowed, tokens = connection.execute(
+            self.TAKE, {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}
+        ).fetchone()
+        self._takes += 1
+        if self._takes % self.PRUNE_EVERY == 0:
+            connection.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - PERIODS['day'],))
+        return bool(allowed), tokens
+
+    def clear(self):
+        self._connect().execute('DELETE FROM rate_buckets')
+
+
+class RateLimiter:
+    """Applies the configured rules to requests"""
+
+    def __init__(self, limits, backend):
+        self.backend = backend
+        self.rules = {target: [parse_rule(rule) for rule in rules] for target, rules in limits.items()}
+
+    def rules_for(self, endpoint, blueprint):
+        rules = self.rules.get(endpoint)
+        if rules is None:
+            rules = self.rules.get(blueprint, [])
+        return rules
+
+    def hit(self, rules, endpoint, ip, user_id=None):
+        """Take a token from every rule's bucket.
+
+        Returns (allowed, limit, remaining, retry_after) for the tightest rule.
+        """
+        now = self.backend.clock()
+        result = (True, None, None, 0)
+        for rule in rules:
+            client = f'u{user_id}' if rule.scope == 'user' and user_id is not None else ip
+            allowed, tokens = self.backend.take(f'{endpoint}|{rule.label}|{client}', rule.capacity, rule.rate, now)
+            if not allowed:
+                return False, rule.capacity, 0, math.ceil((1 - tokens) / rule.rate)
+            if result[2] is None or tokens < result[2]:
+                result = (True, rule.capacity, int(tokens), 0)
+        return result
+
+
+def _request_user_id():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        # Invalid tokens are rejected by the route itself; limit them by IP
+        return None
+
+
+def _limit_request():
+    if request.method in SAFE_METHODS:
+        return None
+    limiter = current_app.extensions['rate_limiter']
+    rules = limiter.rules_for(request.endpoint, request.blueprint)
+    if not rules:
+        return None
+
+    user_id = _request_user_id() if any(rule.scope == 'user' for rule in rules) else None
+    target = request.endpoint if request.endpoint in limiter.rules else request.blueprint
+    allowed, limit, remaining, retry_after = limiter.hit(rules, target, request.remote_addr, user_id)
+    g.rate_limit = (limit, remaining)
+    if allowed:
+        return None
+
+    response = jsonify({'error': 'Too many requests, please retry later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _add_headers(response):
+    rate_limit = g.pop('rate_limit', None)
+    if rate_limit is not None:
+        limit, remaining = rate_limit
+        response.headers['X-RateLimit-Limit'] = str(limit)
+        response.headers['X-RateLimit-Remaining'] = str(remaining)
+    return response
+
+
+def init_rate_limiting(app):
+    """Create the app's limiter from its config and install the request hooks"""
+    if not app.config['RATELIMIT_ENABLED']:
+        return
+    storage = app.config['RATELIMIT_STORAGE']
+    backend = MemoryBackend() if storage == 'memory' else SQLiteBackend(storage)
+    app.extensions['rate_limiter'] = RateLimiter(app.config['RATELIMITS'], backend)
+    app.before_request(_limit_request)
+    app.after_request(_add_headers)
@@ -0,0 +1,160 @@
+"""Token revocation checked through an in-memory Bloom filter.
+
+Access tokens are short-lived (JWT_ACCESS_TOKEN_EXPIRES) and refresh tokens
+rotate: /api/auth/refresh revokes the refresh token it was called with, so
+each one can be used once. Logging out revokes the presented tokens.
+
+Revoked token ids are stored in revoked_tokens until the token would have
+expired anyway. Every authenticated request checks its token id against a
+per-process Bloom filter of that table first; only the rare filter hits
+(revoked tokens and about 1% false positives) look the id up by primary key.
+The filter picks up revocations made by other processes every
+REVOCATION_FILTER_REFRESH seconds and is rebuilt from scratch every
+REVOCATION_FILTER_REBUILD seconds, which also sheds the ids of purged rows.
+``flask tokens purge`` deletes the rows of expired tokens.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select
+from app import db, jwt
+from app.models import RevokedToken
+from app.db_utils import dialect_insert
+
+
+# Revocations committed this long before the last refresh are picked up again
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: positions h1 + i * h2 from one 128-bit digest
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationFilter:
+    """The process's Bloom filter of revoked token ids, refreshed from revoked_tokens"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._filter = None
+            self._count = 0
+            self._capacity = 0
+            self._built_at = 0
+            self._refreshed_at = 0
+            self._loaded_until = None
+
+    def _rebuild(self, now):
+        config = current_app.config
+        jtis = db.session.execute(
+            select(RevokedToken.jti).where(RevokedToken.expires_at > datetime.utcnow())
+        ).scalars().all()
+        self._capacity = max(config['REVOCATION_FILTER_CAPACITY'], 2 * len(jtis))
+        self._filter = BloomFilter(self._capacity)
+        self._count = 0
+        self._add_all(jtis)
+        self._built_at = now
+
+    def _add_all(self, jtis):
+        for jti in jtis:
+            self._filter.add(jti)
+        self._count += len(jtis)
+
+    def _refresh(self):
+        config = current_app.config
+        now = time.monotonic()
+        if self._filter is not None and now - self._refreshed_at < config['REVOCATION_FILTER_REFRESH']:
+            return
+        with self._lock:
+            if self._filter is not None and now - self._refreshed_at < config['REVOCATION_FILTER_REFRESH']:
+                return
+            loaded_until = datetime.utcnow()
+            if (self._filter is None or self._count > self._capacity
+                    or now - self._built_at >= config['REVOCATION_FILTER_REBUILD']):
+                self._rebuild(now)
+            else:
+                self._add_all(db.session.execute(
+                    select(RevokedToken.jti).where(RevokedToken.revoked_at >= self._loaded_until - REFRESH_OVERLAP)
+                ).scalars().all())
+            self._loaded_until = loaded_until
+            self._refreshed_at = now
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._add_all([jti])
+
+    def might_contain(self, jti):
+        self._refresh()
+        return jti in self._filter
+
+
+revocation_filter = RevocationFilter()
+
+
+def is_token_revoked(jti):
+    if not revocation_filter.might_contain(jti):
+        return False
+    return db.session.get(RevokedToken, jti) is not None
+
+
+def revoke_token(token):
+    """Revoke a decoded token (the caller commits).
+
+    Returns False when it was already revoked, so a refresh token can only
+    be redeemed once even by concurrent requests.
+    """
+    values = {
+        'jti': token['jti'],
+        'token_type': token['type'],
+        'user_id': token['sub'],
+        'expires_at': datetime.utcfromtimestamp(token['exp']),
+        'revoked_at': datetime.utcnow(),
+    }
+    upsert = dialect_insert()
+    if upsert is not None:
+        revoked = db.session.execute(upsert(RevokedToken).values(**values).on_conflict_do_nothing()).rowcount == 1
+    elif db.session.get(RevokedToken, token['jti']) is None:
+        db.session.add(RevokedToken(**values))
+        db.session.flush()
+        revoked = True
+    else:
+        revoked = False
+    revocation_filter.add(token['jti'])
+    return revoked
+
+
+def purge_expired_tokens():
+    """Delete the revocations of tokens that have expired. Returns the rows deleted."""
+    result = db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    # Tokens issued while tokens never expired are retired as well
+    return 'exp' not in jwt_payload or is_token_revoked(jwt_payload['jti'])
@@ -0,0 +1,206 @@
+"""Daily sales rollups read by the admin analytics endpoints.
+
+Rollup rows are keyed by the day an order was created. Checkout and status
+changes add their deltas in the same transaction as the order change, so
+the rollups stay exact without rescanning order history; rebuild_rollups
+recomputes a range of days from the orders tables for backfills and as a
+catch-up job. Archived orders are no longer in those tables, so days up to
+the newest archived order are never rebuilt.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import delete, func, insert, literal, select, update
+from app import db
+from app.db_utils import dialect_insert
+from app.models import (
+    DailyCategorySales, DailyOrderBreakdown, DailyProductSales, DailySales, Order, OrderItem, Product
+)
+from app.order_archive import archived_through
+
+
+ROLLUP_MODELS = [DailySales, DailyProductSales, DailyCategorySales, DailyOrderBreakdown]
+BREAKDOWN_DIMENSIONS = ['status', 'payment_method']
+
+
+def increment_rollup(model, rows):
+    """Add each row's counters onto the rollup row with the same key, creating it if missing.
+
+    Rows sharing a key are merged first, and rows are written in key order so
+    concurrent checkouts lock rollup rows in the same order.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    keys = [column.name for column in table.primary_key.columns]
+
+    merged = {}
+    for row in rows:
+        key = tuple(row[name] for name in keys)
+        if key in merged:
+            for name, value in row.items():
+                if name not in keys:
+                    merged[key][name] += value
+        else:
+            merged[key] = dict(row)
+    rows = [merged[key] for key in sorted(merged)]
+    counters = [name for name in rows[0] if name not in keys]
+
+    upsert = dialect_insert()
+    if upsert is not None:
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + statement.excluded[name] for name in counters}
+        )
+        db.session.execute(statement, rows)
+        return
+
+    for row in rows:
+        result = db.session.execute(
+            update(table).where(
+                *[table.c[name] == row[name] for name in keys]
+            ).values(**{name: table.c[name] + row[name] for name in counters})
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(**row))
+
+
+def record_order_created(order, order_items):
+    """Add a new order and its items to the rollups (the caller commits)"""
+    day = order.created_at.date()
+    paid = order.payment_status == 'completed'
+    total = Decimal(order.total_amount)
+
+    increment_rollup(DailySales, [{
+        'day': day,
+        'orders_count': 1,
+        'revenue': total,
+        'paid_orders_count': 1 if paid else 0,
+        'paid_revenue': total if paid else Decimal('0'),
+        'units_sold': sum(item.quantity for item in order_items)
+    }])
+    increment_rollup(DailyOrderBreakdown, [
+        {'day': day, 'dimension': 'status', 'value': order.status or 'pending', 'orders_count': 1, 'revenue': total},
+        {'day': day, 'dimension': 'payment_method', 'value': order.payment_method or 'unknown',
+         'orders_count': 1, 'revenue': total},
+    ])
+
+    if not paid:
+        return
+    products, categories = [], []
+    for item in order_items:
+        line = {'day': day, 'items_count': 1, 'units_sold': item.quantity, 'revenue': Decimal(item.total_price)}
+        products.append(dict(line, product_id=item.product_id))
+        categories.append(dict(line, category_id=item.product.category_id))
+    increment_rollup(DailyProductSales, products)
+    increment_rollup(DailyCategorySales, categories)
+
+
+def record_status_changes(changes):
+    """Move orders between status buckets.
+
+    ``changes`` are (created_at, total_amount, previous_status, new_status)
+    tuples; unchanged statuses are ignored. Buckets that drop to zero orders
+    are kept, and readers skip them.
+    """
+    rows = []
+    for created_at, total_amount, previous_status, new_status in changes:
+        if previous_status == new_status:
+            continue
+        total = Decimal(total_amount)
+        day = created_at.date()
+        rows.append({'day': day, 'dimension': 'status', 'value': previous_status or 'pending',
+                     'orders_count': -1, 'revenue': -total})
+        rows.append({'day': day, 'dimension': 'status', 'value': new_status, 'orders_count': 1, 'revenue': total})
+    increment_rollup(DailyOrderBreakdown, rows)
+
+
+def rebuild_rollups(start_day, end_day):
+    """Recompute the rollups for days in [start_day, end_day] from the orders tables.
+
+    Days up to and including the newest archived order's are skipped, since
+    rebuilding them would drop the archived orders. Returns the first day
+    rebuilt, or None if the whole range was skipped. The caller commits.
+    Orders placed on those days while the rebuild runs may be counted twice
+    or not at all, so catch up on closed days or during quiet hours.
+    """
+    archived_day = archived_through()
+    if archived_day is not None and start_day <= archived_day:
+        start_day = archived_day + timedelta(days=1)
+    if start_day > end_day:
+        return None
+
+    start, end = start_day, end_day + timedelta(days=1)
+    day = func.date(Order.created_at)
+    in_range = (Order.created_at >= start, Order.created_at < end)
+    paid = Order.payment_status == 'completed'
+
+    for model in ROLLUP_MODELS:
+        db.session.execute(
+            delete(model).where(model.day >= start_day, model.day <= end_day),
+            execution_options={'synchronize_session': False}
+        )
+
+    units = select(
+        OrderItem.order_id,
+        func.sum(OrderItem.quantity).label('units')
+    ).join(Order, Order.id == OrderItem.order_id).where(*in_range).group_by(OrderItem.order_id).subquery()
+
+    db.session.execute(insert(DailySales).from_select(
+        ['day', 'orders_count', 'revenue', 'paid_orders_count', 'paid_revenue', 'units_sold'],
+        select(
+            day,
+            func.count(Order.id),
+            func.coalesce(func.sum(Order.total_amount), 0),
+            func.count(Order.id).filter(paid),
+            func.coalesce(func.sum(Order.total_amount).filter(paid), 0),
+            func.coalesce(func.sum(units.c.units), 0)
+        ).outerjoin(units, units.c.order_id == Order.id).where(*in_range).group_by(day)
+    ))
+
+    for dimension in BREAKDOWN_DIMENSIONS:
+        value = func.coalesce(getattr(Order, dimension), 'pending' if dimension == 'status' else 'unknown')
+        db.session.execute(insert(DailyOrderBreakdown).from_select(
+            ['day', 'dimension', 'value', 'orders_count', 'revenue'],
+            select(
+                day, literal(dimension), value, func.count(Order.id), func.sum(Order.total_amount)
+            ).where(*in_range).group_by(day, value)
+        ))
+
+    item_totals = (
+        func.count(OrderItem.id),
+        func.sum(OrderItem.quantity),
+        func.sum(OrderItem.total_price)
+    )
+    db.session.execute(insert(DailyProductSales).from_select(
+        ['day', 'product_id', 'items_count', 'units_sold', 'revenue'],
+        select(day, OrderItem.product_id, *item_totals).join(
+            Order, Order.id == OrderItem.order_id
+        ).where(*in_range, paid).group_by(day, OrderItem.product_id)
+    ))
+    db.session.execute(insert(DailyCategorySales).from_select(
+        ['day', 'category_id', 'items_count', 'units_sold', 'revenue'],
+        select(day, Product.category_id, *item_totals).join(
+            Order, Order.id == OrderItem.order_id
+        ).join(
+            Product, Product.id == OrderItem.product_id
+        ).where(*in_range, paid).group_by(day, Product.category_id)
+    ))
+    return start_day
+
+
+def rollup_date_bounds():
+    """First and last order creation dates, or (None, None) without orders"""
+    first, last = db.session.execute(select(func.min(Order.created_at), func.max(Order.created_at))).one()
+    if first is None:
+        return None, None
+    return first.date(), last.date()
+
+
+def group_by_month(rows):
+    """Sum (day, amount) pairs into {'YYYY-MM': amount}, in month order"""
+    months = defaultdict(Decimal)
+    for day, amount in rows:
+        months[f'{day.year}-{day.month:02d}'] += Decimal(amount or 0)
+    return dict(sorted(months.items()))
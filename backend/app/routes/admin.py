@@ -1,158 +1,75 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, request, jsonify, send_file
+from flask_jwt_extended import get_jwt_identity
 from app import db
-from app.models import User, Product, Order, OrderItem, Category, user_schema, users_schema, order_schema, orders_schema
-from sqlalchemy import func, and_, extract
+from app.models import User, Product, Order, Category, InvoiceExport, Promotion, DailySales, DailyProductSales, DailyCategorySales, DailyOrderBreakdown, user_schema, order_schema, orders_schema, invoice_export_schema, promotion_schema, promotions_schema, StockAlert, stock_alerts_schema, category_schema, customer_stats_schema
+from app.order_queries import filter_admin_orders, with_order_details, order_summary_query, serialize_order_summaries
+from app.user_queries import filter_admin_users
+from app.customer_stats import CUSTOMER_SORTS, SEGMENTS, default_customer_stats, filter_customers
+from app.columnar_analytics import basket_metrics, cohort_retention, load_current_snapshot, rfm_segments
+from app.exports import EXPORT_FORMATS, export_orders, export_users, order_export_statement, user_export_statement
+from app.invoice_exports import schedule_invoice_export
+from app.order_status import VALID_STATUSES, cancel_orders, transition_orders
+from app.promotions import apply_promotion_changes
+from app.dashboard import cached_dashboard_stats
+from app.principals import admin_required, invalidate_principal
+from app.inventory import low_stock_query, set_category_reorder_threshold, sync_stock_alerts
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import contains_eager
 from datetime import datetime, timedelta
+import os
 
 admin_bp = Blueprint('admin', __name__)
 
 
-def is_admin(user_id):
-    """Check if user is admin"""
-    user = User.query.get(user_id)
-    return user and user.is_admin
-
-
-def require_admin(f):
-    """Decorator to require admin access"""
-    from functools import wraps
-    
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        return f(*args, **kwargs)
-    return decorated_function
-
-
 @admin_bp.route('/dashboard', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_dashboard_stats():
     """Get dashboard statistics"""
     try:
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        # Get date ranges
-        today = datetime.utcnow().date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-        year_ago = today - timedelta(days=365)
-        
-        # Total counts
-        total_users = User.query.count()
-        total_products = Product.query.filter_by(is_active=True).count()
-        total_orders = Order.query.count()
-        total_revenue = db.session.query(func.sum(Order.total_amount)).scalar() or 0
-        
-        # Recent stats (last 30 days)
-        recent_users = User.query.filter(User.created_at >= month_ago).count()
-        recent_orders = Order.query.filter(Order.created_at >= month_ago).count()
-        recent_revenue = db.session.query(func.sum(Order.total_amount)).filter(
-            Order.created_at >= month_ago
-        ).scalar() or 0
-        
-        # Order status distribution
-        order_status_stats = db.session.query(
-            Order.status,
-            func.count(Order.id).label('count')
-        ).group_by(Order.status).all()
-        
-        order_status_data = {status: count for status, count in order_status_stats}
-        
-        # Top selling products (by quantity)
-        top_products = db.session.query(
-            Product.name,
-            Product.id,
-            func.sum(OrderItem.quantity).label('total_sold')
-        ).join(OrderItem).group_by(Product.id, Product.name).order_by(
-            func.sum(OrderItem.quantity).desc()
-        ).limit(5).all()
-        
-        top_products_data = [
-            {
-                'product_id': product_id,
-                'product_name': name,
-                'total_sold': int(total_sold)
-            }
-            for name, product_id, total_sold in top_products
-        ]
-        
-        # Revenue by month (last 6 months)
-        six_months_ago = today - timedelta(days=180)
-        monthly_revenue = db.session.query(
-            extract('year', Order.created_at).label('year'),
-            extract('month', Order.created_at).label('month'),
-            func.sum(Order.total_amount).label('revenue')
-        ).filter(
-            Order.created_at >= six_months_ago,
-            Order.payment_status == 'completed'
-        ).group_by('year', 'month').order_by('year', 'month').all()
-        
-        monthly_revenue_data = [
-            {
-                'month': f"{int(year)}-{int(month):02d}",
-                'revenue': float(revenue)
-            }
-            for year, month, revenue in monthly_revenue
-        ]
-        
-        return jsonify({
-            'totals': {
-                'users': total_users,
-                'products': total_products,
-                'orders': total_orders,
-                'revenue': float(total_revenue)
-            },
-            'recent_stats': {
-                'new_users': recent_users,
-                'new_orders': recent_orders,
-                'recent_revenue': float(recent_revenue)
-            },
-            'order_status_distribution': order_status_data,
-            'top_products': top_products_data,
-            'monthly_revenue': monthly_revenue_data
-        }), 200
+        return jsonify(cached_dashboard_stats()), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to get dashboard stats'}), 500
 
 
 @admin_bp.route('/users', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_users():
     """Get all users with pagination"""
     try:
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
         search = request.args.get('search', '').strip()
         role_filter = request.args.get('role', '').strip()  # admin, customer
+        sort = request.args.get('sort', 'created_at').strip()
+        direction = request.args.get('order', 'desc').strip()
+        segment = request.args.get('segment', '').strip()
+        min_lifetime_value = request.args.get('min_lifetime_value', type=float)
+        min_orders = request.args.get('min_orders', type=int)
+        
+        if sort not in CUSTOMER_SORTS or direction not in ('asc', 'desc'):
+            return jsonify({'error': 'Invalid sort'}), 400
+        if segment and segment not in SEGMENTS:
+            return jsonify({'error': 'Invalid segment'}), 400
+        
+        try:
+            last_order_after, last_order_before = [
+                datetime.strptime(request.args[name], '%Y-%m-%d') if request.args.get(name) else None
+                for name in ('last_order_after', 'last_order_before')
+            ]
+        except ValueError:
+            return jsonify({'error': 'Dates must use the YYYY-MM-DD format'}), 400
         
         # Build query
-        query = User.query
-        
-        if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    User.email.ilike(search_term),
-                    User.first_name.ilike(search_term),
-                    User.last_name.ilike(search_term)
-                )
-            )
-        
-        if role_filter == 'admin':
-            query = query.filter(User.is_admin == True)
-        elif role_filter == 'customer':
-            query = query.filter(User.is_admin == False)
-        
-        # Order by creation date
-        query = query.order_by(User.created_at.desc())
+        query = filter_admin_users(User.query, search, role_filter, ranked=True)
+        query = filter_customers(
+            query, segment, min_lifetime_value, min_orders, last_order_after, last_order_before
+        ).options(contains_eager(User.customer_stats))
+        
+        # Best search matches first, then the requested sort
+        sort_column = CUSTOMER_SORTS[sort]
+        ordering = sort_column.asc() if direction == 'asc' else sort_column.desc()
+        query = query.order_by(ordering.nulls_last(), User.id.desc())
         
         # Paginate
         pagination = query.paginate(
@@ -164,7 +81,12 @@ def get_users():
         users = pagination.items
         
         return jsonify({
-            'users': users_schema.dump(users),
+            'users': [
+                dict(user_schema.dump(user), stats=customer_stats_schema.dump(
+                    user.customer_stats or default_customer_stats(user)
+                ))
+                for user in users
+            ],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -180,13 +102,10 @@ def get_users():
 
 
 @admin_bp.route('/users/<int:user_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_user(user_id):
     """Update user information (admin only)"""
     try:
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
         user = User.query.get(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -207,6 +126,9 @@ def update_user(user_id):
         
         db.session.commit()
         
+        if 'is_admin' in data or 'is_active' in data:
+            invalidate_principal(user.id)
+        
         return jsonify({
             'message': 'User updated successfully',
             'user': user_schema.dump(user)
@@ -218,38 +140,30 @@ def update_user(user_id):
 
 
 @admin_bp.route('/orders', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_all_orders():
     """Get all orders for admin management"""
     try:
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
         status_filter = request.args.get('status', '').strip()
         search = request.args.get('search', '').strip()
+        view = request.args.get('view', 'full').strip()
+        
+        if view not in ('full', 'summary'):
+            return jsonify({'error': 'Invalid view'}), 400
         
         # Build query
-        query = Order.query
-        
-        if status_filter:
-            query = query.filter(Order.status == status_filter)
-        
-        if search:
-            search_term = f'%{search}%'
-            query = query.join(User).filter(
-                db.or_(
-                    Order.order_number.ilike(search_term),
-                    User.email.ilike(search_term),
-                    User.first_name.ilike(search_term),
-                    User.last_name.ilike(search_term)
-                )
-            )
-        
-        # Order by creation date
+        query = filter_admin_orders(Order.query, status_filter, search, ranked=True)
+        
+        # Best search matches first, then newest
         query = query.order_by(Order.created_at.desc())
         
+        if view == 'summary':
+            query = order_summary_query(query)
+        else:
+            query = with_order_details(query)
+        
         # Paginate
         pagination = query.paginate(
             page=page,
@@ -257,10 +171,13 @@ def get_all_orders():
             error_out=False
         )
         
-        orders = pagination.items
+        if view == 'summary':
+            orders = serialize_order_summaries(pagination.items)
+        else:
+            orders = orders_schema.dump(pagination.items)
         
         return jsonify({
-            'orders': orders_schema.dump(orders),
+            'orders': orders,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -276,13 +193,10 @@ def get_all_orders():
 
 
 @admin_bp.route('/orders/<int:order_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_order_status(order_id):
     """Update order status"""
     try:
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
         order = Order.query.get(order_id)
         if not order:
             return jsonify({'error': 'Order not found'}), 404
@@ -293,19 +207,21 @@ def update_order_status(order_id):
         if not new_status:
             return jsonify({'error': 'Status is required'}), 400
         
-        valid_statuses = ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled']
-        if new_status not in valid_statuses:
+        if new_status not in VALID_STATUSES:
             return jsonify({'error': 'Invalid status'}), 400
         
-        # Update status and timestamps
-        order.status = new_status
-        
-        if new_status == 'shipped' and not order.shipped_at:
-            order.shipped_at = datetime.utcnow()
-        elif new_status == 'delivered' and not order.delivered_at:
-            order.delivered_at = datetime.utcnow()
-        
-        db.session.commit()
+        # Same paths as the bulk endpoint, so cancelling restores stock and
+        # only allowed transitions go through
+        if new_status != order.status:
+            previous_status = order.status
+            if new_status == 'cancelled':
+                moved = cancel_orders([order.id])
+            else:
+                moved = transition_orders([order.id], new_status)
+            if not moved:
+                db.session.rollback()
+                return jsonify({'error': f'Cannot change status from {previous_status} to {new_status}'}), 400
+            db.session.commit()
         
         return jsonify({
             'message': 'Order status updated successfully',
@@ -317,14 +233,116 @@ def update_order_status(order_id):
         return jsonify({'error': 'Failed to update order status'}), 500
 
 
+@admin_bp.route('/orders/cancel', methods=['POST'])
+@admin_required
+def bulk_cancel_orders():
+    """Cancel many orders at once, e.g. for fraud sweeps"""
+    try:
+        data = request.get_json() or {}
+        order_ids = data.get('order_ids')
+        
+        if not order_ids or not isinstance(order_ids, list):
+            return jsonify({'error': 'order_ids must be a non-empty list'}), 400
+        
+        if len(order_ids) > 1000:
+            return jsonify({'error': 'At most 1000 orders can be cancelled at once'}), 400
+        
+        try:
+            order_ids = sorted({int(order_id) for order_id in order_ids})
+        except (TypeError, ValueError):
+            return jsonify({'error': 'order_ids must contain integers'}), 400
+        
+        cancelled_ids = cancel_orders(order_ids)
+        db.session.commit()
+        
+        cancelled = set(cancelled_ids)
+        return jsonify({
+            'message': f'{len(cancelled)} orders cancelled',
+            'cancelled': sorted(cancelled),
+            'skipped': [order_id for order_id in order_ids if order_id not in cancelled]
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to cancel orders'}), 500
+
+
+@admin_bp.route('/orders/status', methods=['POST'])
+@admin_required
+def bulk_update_order_status():
+    """Move many orders to one status, e.g. marking a warehouse wave shipped"""
+    try:
+        data = request.get_json() or {}
+        new_status = data.get('status')
+        order_ids = data.get('order_ids') or []
+        order_numbers = data.get('order_numbers') or []
+        
+        if new_status not in VALID_STATUSES:
+            return jsonify({'error': 'Invalid status'}), 400
+        
+        if not isinstance(order_ids, list) or not isinstance(order_numbers, list) or not (order_ids or order_numbers):
+            return jsonify({'error': 'order_ids or order_numbers must be a non-empty list'}), 400
+        
+        if len(order_ids) + len(order_numbers) > 1000:
+            return jsonify({'error': 'At most 1000 orders can be updated at once'}), 400
+        
+        try:
+            order_ids = {int(order_id) for order_id in order_ids}
+        except (TypeError, ValueError):
+            return jsonify({'error': 'order_ids must contain integers'}), 400
+        order_numbers = {str(number) for number in order_numbers}
+        
+        # Current state of every requested order, in one query
+        conditions = []
+        if order_ids:
+            conditions.append(Order.id.in_(order_ids))
+        if order_numbers:
+            conditions.append(Order.order_number.in_(order_numbers))
+        current = db.session.execute(
+            select(Order.id, Order.order_number, Order.status).where(or_(*conditions))
+        ).all()
+        found_ids = sorted(row.id for row in current)
+        
+        if new_status == 'cancelled':
+            cancelled = set(cancel_orders(found_ids))
+            moved = {row.id: row.status for row in current if row.id in cancelled}
+        else:
+            moved = transition_orders(found_ids, new_status)
+        db.session.commit()
+        
+        results = []
+        for row in sorted(current, key=lambda row: row.id):
+            if row.id in moved:
+                result = {'result': 'updated', 'previous_status': moved[row.id], 'status': new_status}
+            elif row.status == new_status:
+                result = {'result': 'unchanged', 'status': row.status}
+            else:
+                result = {'result': 'invalid_transition', 'status': row.status}
+            results.append(dict(result, order_id=row.id, order_number=row.order_number))
+        
+        found_numbers = {row.order_number for row in current}
+        results.extend({'result': 'not_found', 'order_id': order_id} for order_id in sorted(order_ids - set(found_ids)))
+        results.extend(
+            {'result': 'not_found', 'order_number': number} for number in sorted(order_numbers - found_numbers)
+        )
+        
+        return jsonify({
+            'message': f'{len(moved)} orders updated',
+            'status': new_status,
+            'updated': len(moved),
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update order statuses'}), 500
+
+
 @admin_bp.route('/analytics/products', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_product_analytics():
     """Get detailed product analytics"""
     try:
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
         # Get date range
         days = request.args.get('days', 30, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
@@ -334,34 +352,27 @@ def get_product_analytics():
             Product.id,
             Product.name,
             Product.category_id,
-            func.sum(OrderItem.quantity).label('total_sold'),
-            func.sum(OrderItem.total_price).label('total_revenue')
-        ).join(OrderItem).join(Order).filter(
-            Order.created_at >= start_date,
-            Order.payment_status == 'completed'
+            func.sum(DailyProductSales.units_sold).label('total_sold'),
+            func.sum(DailyProductSales.revenue).label('total_revenue')
+        ).select_from(DailyProductSales).join(Product, Product.id == DailyProductSales.product_id).filter(
+            DailyProductSales.day >= start_date.date()
         ).group_by(
             Product.id, Product.name, Product.category_id
-        ).order_by(func.sum(OrderItem.quantity).desc()).limit(10).all()
+        ).order_by(func.sum(DailyProductSales.units_sold).desc()).limit(10).all()
         
         # Low stock products
-        low_stock_products = Product.query.filter(
-            and_(
-                Product.is_active == True,
-                Product.stock_quantity <= 10
-            )
-        ).order_by(Product.stock_quantity.asc()).limit(20).all()
+        low_stock_products = low_stock_query().order_by(Product.stock_quantity.asc()).limit(20).all()
         
         # Category performance
         category_performance = db.session.query(
             Category.id,
             Category.name,
-            func.count(OrderItem.id).label('items_sold'),
-            func.sum(OrderItem.total_price).label('revenue')
-        ).join(Product).join(OrderItem).join(Order).filter(
-            Order.created_at >= start_date,
-            Order.payment_status == 'completed'
+            func.sum(DailyCategorySales.items_count).label('items_sold'),
+            func.sum(DailyCategorySales.revenue).label('revenue')
+        ).select_from(DailyCategorySales).join(Category, Category.id == DailyCategorySales.category_id).filter(
+            DailyCategorySales.day >= start_date.date()
         ).group_by(Category.id, Category.name).order_by(
-            func.sum(OrderItem.total_price).desc()
+            func.sum(DailyCategorySales.revenue).desc()
         ).all()
         
         return jsonify({
@@ -385,6 +396,7 @@ def get_product_analytics():
                     'id': product.id,
                     'name': product.name,
                     'stock_quantity': product.stock_quantity,
+                    'low_stock_threshold': product.low_stock_threshold,
                     'category': product.category.name if product.category else None
                 }
                 for product in low_stock_products
@@ -405,55 +417,37 @@ def get_product_analytics():
 
 
 @admin_bp.route('/analytics/orders', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_order_analytics():
     """Get detailed order analytics"""
     try:
-        current_user_id = get_jwt_identity()
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
         # Get date range
         days = request.args.get('days', 30, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
         
+        # Daily rollup rows for the window, oldest first
+        daily_orders = DailySales.query.filter(
+            DailySales.day >= start_date.date()
+        ).order_by(DailySales.day).all()
+        
         # Order statistics
-        total_orders = Order.query.filter(Order.created_at >= start_date).count()
-        completed_orders = Order.query.filter(
-            and_(
-                Order.created_at >= start_date,
-                Order.payment_status == 'completed'
-            )
-        ).count()
-        
-        total_revenue = db.session.query(func.sum(Order.total_amount)).filter(
-            and_(
-                Order.created_at >= start_date,
-                Order.payment_status == 'completed'
-            )
-        ).scalar() or 0
+        total_orders = sum(day.orders_count for day in daily_orders)
+        completed_orders = sum(day.paid_orders_count for day in daily_orders)
+        total_revenue = sum(day.paid_revenue for day in daily_orders)
         
         average_order_value = total_revenue / completed_orders if completed_orders > 0 else 0
         
-        # Daily order counts
-        daily_orders = db.session.query(
-            func.date(Order.created_at).label('date'),
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('daily_revenue')
+        # Order status and payment method distribution
+        breakdowns = db.session.query(
+            DailyOrderBreakdown.dimension,
+            DailyOrderBreakdown.value,
+            func.sum(DailyOrderBreakdown.orders_count).label('count')
         ).filter(
-            Order.created_at >= start_date
-        ).group_by(func.date(Order.created_at)).order_by('date').all()
+            DailyOrderBreakdown.day >= start_date.date()
+        ).group_by(DailyOrderBreakdown.dimension, DailyOrderBreakdown.value).all()
         
-        # Order status distribution
-        status_distribution = db.session.query(
-            Order.status,
-            func.count(Order.id).label('count')
-        ).filter(Order.created_at >= start_date).group_by(Order.status).all()
-        
-        # Payment method distribution
-        payment_distribution = db.session.query(
-            Order.payment_method,
-            func.count(Order.id).label('count')
-        ).filter(Order.created_at >= start_date).group_by(Order.payment_method).all()
+        status_distribution = [(value, count) for dimension, value, count in breakdowns if dimension == 'status' and count]
+        payment_distribution = [(value, count) for dimension, value, count in breakdowns if dimension == 'payment_method' and count]
         
         return jsonify({
             'date_range': {
@@ -470,11 +464,12 @@ def get_order_analytics():
             },
             'daily_orders': [
                 {
-                    'date': date.isoformat(),
-                    'order_count': int(order_count),
-                    'daily_revenue': float(daily_revenue or 0)
+                    'date': day.day.isoformat(),
+                    'order_count': day.orders_count,
+                    'daily_revenue': float(day.revenue or 0)
                 }
-                for date, order_count, daily_revenue in daily_orders
+                for day in daily_orders
+                if day.orders_count
             ],
             'status_distribution': {
                 status: int(count) for status, count in status_distribution
@@ -486,3 +481,357 @@ def get_order_analytics():
         
     except Exception as e:
         return jsonify({'error': 'Failed to get order analytics'}), 500
+
+
+@admin_bp.route('/invoices/exports', methods=['POST'])
+@admin_required
+def create_invoice_export():
+    """Start a batch export of all invoices in a date range"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        for field in ('start_date', 'end_date'):
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+        
+        try:
+            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Dates must use the YYYY-MM-DD format'}), 400
+        
+        if end_date < start_date:
+            return jsonify({'error': 'end_date must not be before start_date'}), 400
+        
+        export = InvoiceExport(
+            requested_by=current_user_id,
+            start_date=start_date,
+            end_date=end_date
+        )
+        db.session.add(export)
+        db.session.commit()
+        
+        schedule_invoice_export(export.id)
+        
+        return jsonify({
+            'message': 'Invoice export started',
+            'export': invoice_export_schema.dump(export)
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to start invoice export'}), 500
+
+
+@admin_bp.route('/invoices/exports/<int:export_id>', methods=['GET'])
+@admin_required
+def get_invoice_export(export_id):
+    """Get the progress of an invoice export"""
+    try:
+        export = InvoiceExport.query.get(export_id)
+        if not export:
+            return jsonify({'error': 'Export not found'}), 404
+        
+        return jsonify({'export': invoice_export_schema.dump(export)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get invoice export'}), 500
+
+
+@admin_bp.route('/invoices/exports/<int:export_id>/download', methods=['GET'])
+@admin_required
+def download_invoice_export(export_id):
+    """Download the ZIP archive of a completed invoice export"""
+    try:
+        export = InvoiceExport.query.get(export_id)
+        if not export:
+            return jsonify({'error': 'Export not found'}), 404
+        
+        if export.status != 'completed':
+            return jsonify({'error': 'Export is not ready', 'status': export.status}), 409
+        
+        return send_file(
+            export.file_path,
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name=os.path.basename(export.file_path)
+        )
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to download invoice export'}), 500
+
+
+@admin_bp.route('/inventory/alerts', methods=['GET'])
+@admin_required
+def get_stock_alerts():
+    """List low stock alerts, newest first"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        status = request.args.get('status', 'open').strip()  # open, resolved, all
+        
+        query = StockAlert.query
+        if status == 'open':
+            query = query.filter(StockAlert.resolved_at.is_(None))
+        elif status == 'resolved':
+            query = query.filter(StockAlert.resolved_at.isnot(None))
+        elif status != 'all':
+            return jsonify({'error': 'status must be open, resolved or all'}), 400
+        
+        pagination = query.order_by(StockAlert.created_at.desc(), StockAlert.id.desc()).paginate(
+            page=page,
+            per_page=per_page,
+            error_out=False
+        )
+        
+        return jsonify({
+            'alerts': stock_alerts_schema.dump(pagination.items),
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': pagination.total,
+                'pages': pagination.pages,
+                'has_next': pagination.has_next,
+                'has_prev': pagination.has_prev
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get stock alerts'}), 500
+
+
+@admin_bp.route('/categories/<int:category_id>/reorder-threshold', methods=['PUT'])
+@admin_required
+def update_category_reorder_threshold(category_id):
+    """Set a category's reorder threshold (null restores the default)"""
+    try:
+        category = Category.query.get(category_id)
+        if not category:
+            return jsonify({'error': 'Category not found'}), 404
+        
+        data = request.get_json() or {}
+        threshold = data.get('reorder_threshold')
+        if threshold is not None and (isinstance(threshold, bool) or not isinstance(threshold, int) or threshold < 0):
+            return jsonify({'error': 'reorder_threshold must be a non-negative integer'}), 400
+        
+        set_category_reorder_threshold(category, threshold)
+        opened, resolved = sync_stock_alerts(select(Product.id).where(Product.category_id == category.id))
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Reorder threshold updated',
+            'category': category_schema.dump(category),
+            'alerts_opened': opened,
+            'alerts_resolved': resolved
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update reorder threshold'}), 500
+
+
+@admin_bp.route('/promotions', methods=['GET'])
+@admin_required
+def get_promotions():
+    """List promotions, newest first"""
+    try:
+        query = Promotion.query
+        
+        active = request.args.get('active')
+        if active is not None:
+            query = query.filter(Promotion.is_active == (active.lower() == 'true'))
+        
+        promotions = query.order_by(Promotion.created_at.desc()).all()
+        
+        return jsonify({'promotions': promotions_schema.dump(promotions)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get promotions'}), 500
+
+
+@admin_bp.route('/promotions', methods=['POST'])
+@admin_required
+def create_promotion():
+    """Create a promotion or coupon"""
+    try:
+        data = request.get_json() or {}
+        
+        promotion = Promotion(scope='all', is_active=True)
+        try:
+            apply_promotion_changes(promotion, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if promotion.coupon_code and Promotion.query.filter_by(coupon_code=promotion.coupon_code).first():
+            return jsonify({'error': 'Coupon code already exists'}), 409
+        
+        db.session.add(promotion)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Promotion created successfully',
+            'promotion': promotion_schema.dump(promotion)
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create promotion'}), 500
+
+
+@admin_bp.route('/promotions/<int:promotion_id>', methods=['PUT'])
+@admin_required
+def update_promotion(promotion_id):
+    """Update a promotion"""
+    try:
+        promotion = Promotion.query.get(promotion_id)
+        if not promotion:
+            return jsonify({'error': 'Promotion not found'}), 404
+        
+        data = request.get_json() or {}
+        try:
+            with db.session.no_autoflush:
+                apply_promotion_changes(promotion, data)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+        
+        if promotion.coupon_code and Promotion.query.filter(
+            Promotion.coupon_code == promotion.coupon_code,
+            Promotion.id != promotion.id
+        ).first():
+            db.session.rollback()
+            return jsonify({'error': 'Coupon code already exists'}), 409
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Promotion updated successfully',
+            'promotion': promotion_schema.dump(promotion)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update promotion'}), 500
+
+
+@admin_bp.route('/promotions/<int:promotion_id>', methods=['DELETE'])
+@admin_required
+def delete_promotion(promotion_id):
+    """Delete a promotion"""
+    try:
+        promotion = Promotion.query.get(promotion_id)
+        if not promotion:
+            return jsonify({'error': 'Promotion not found'}), 404
+        
+        db.session.delete(promotion)
+        db.session.commit()
+        
+        return jsonify({'message': 'Promotion deleted successfully'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to delete promotion'}), 500
+
+
+def _export_response(chunks, name, export_format, compress):
+    filename = f'{name}_{datetime.utcnow():%Y%m%d%H%M%S}.{export_format}'
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@admin_bp.route('/orders/export', methods=['GET'])
+@admin_required
+def export_all_orders():
+    """Stream every order matching the admin order filters as CSV or NDJSON"""
+    try:
+        export_format = request.args.get('format', 'csv').strip()
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+        status_filter = request.args.get('status', '').strip()
+        search = request.args.get('search', '').strip()
+        
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid format'}), 400
+        
+        statement = filter_admin_orders(order_export_statement(), status_filter, search)
+        chunks = export_orders(db.engine, statement, export_format, compress)
+        
+        return _export_response(chunks, 'orders', export_format, compress)
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to export orders'}), 500
+
+
+@admin_bp.route('/users/export', methods=['GET'])
+@admin_required
+def export_all_users():
+    """Stream every user matching the admin user filters as CSV or NDJSON"""
+    try:
+        export_format = request.args.get('format', 'csv').strip()
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+        search = request.args.get('search', '').strip()
+        role_filter = request.args.get('role', '').strip()
+        
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid format'}), 400
+        
+        statement = filter_admin_users(user_export_statement(), search, role_filter)
+        chunks = export_users(db.engine, statement, export_format, compress)
+        
+        return _export_response(chunks, 'users', export_format, compress)
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to export users'}), 500
+
+
+def _snapshot_response(key, compute):
+    """Run a snapshot analytic and wrap it with the snapshot's metadata"""
+    snapshot = load_current_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'No analytics snapshot available yet'}), 503
+    return jsonify({
+        'snapshot': {'name': snapshot.name, 'created_at': snapshot.created_at},
+        key: compute(snapshot)
+    }), 200
+
+
+@admin_bp.route('/analytics/cohorts', methods=['GET'])
+@admin_required
+def get_cohort_analytics():
+    """Monthly cohort retention from the latest analytics snapshot"""
+    try:
+        months = min(max(request.args.get('months', 12, type=int), 1), 36)
+        
+        return _snapshot_response('cohorts', lambda snapshot: cohort_retention(snapshot, months))
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get cohort analytics'}), 500
+
+
+@admin_bp.route('/analytics/rfm', methods=['GET'])
+@admin_required
+def get_rfm_analytics():
+    """RFM customer segments from the latest analytics snapshot"""
+    try:
+        return _snapshot_response('rfm', rfm_segments)
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get RFM analytics'}), 500
+
+
+@admin_bp.route('/analytics/baskets', methods=['GET'])
+@admin_required
+def get_basket_analytics():
+    """Basket size and order value distribution from the latest analytics snapshot"""
+    try:
+        return _snapshot_response('baskets', basket_metrics)
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get basket analytics'}), 500
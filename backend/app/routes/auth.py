@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, create_access_token, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, decode_token
 from app import db
 from app.models import User, user_schema, users_schema
+from app.principals import create_user_refresh_token, create_user_token, load_principal
+from app.revocation import revoke_token
+from app.passwords import PasswordHashingBusy, busy_response
 from marshmallow import ValidationError
 import re
 
@@ -63,16 +66,20 @@ def register():
         db.session.commit()
         
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
         
         return jsonify({
             'message': 'User registered successfully',
             'user': user_schema.dump(user),
-            'access_token': access_token
+            'access_token': access_token,
+            'refresh_token': create_user_refresh_token(user)
         }), 201
         
     except ValidationError as e:
         return jsonify({'error': e.messages}), 400
+    except PasswordHashingBusy as e:
+        db.session.rollback()
+        return busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Registration failed'}), 500
@@ -97,19 +104,82 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Account is deactivated'}), 401
         
+        # Upgrade hashes made with an older cost factor while we have the password
+        if user.password_needs_rehash():
+            try:
+                user.set_password(data['password'])
+                db.session.commit()
+            except PasswordHashingBusy:
+                db.session.rollback()
+        
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
         
         return jsonify({
             'message': 'Login successful',
             'user': user_schema.dump(user),
-            'access_token': access_token
+            'access_token': access_token,
+            'refresh_token': create_user_refresh_token(user)
         }), 200
         
+    except PasswordHashingBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': 'Login failed'}), 500
 
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """Exchange a refresh token for new access and refresh tokens"""
+    try:
+        principal = load_principal(get_jwt_identity())
+        if not principal or not principal.is_active:
+            return jsonify({'error': 'Account is deactivated'}), 401
+        
+        # Rotation: each refresh token can be redeemed once
+        if not revoke_token(get_jwt()):
+            db.session.rollback()
+            return jsonify({'error': 'Refresh token has already been used'}), 401
+        db.session.commit()
+        
+        return jsonify({
+            'access_token': create_user_token(principal),
+            'refresh_token': create_user_refresh_token(principal)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Token refresh failed'}), 500
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    """Revoke the presented token and, if given, the refresh token in the body"""
+    try:
+        tokens = [get_jwt()]
+        data = request.get_json(silent=True) or {}
+        if data.get('refresh_token'):
+            try:
+                refresh_token = decode_token(data['refresh_token'])
+            except Exception:
+                return jsonify({'error': 'Invalid refresh token'}), 400
+            if refresh_token['type'] != 'refresh' or refresh_token['sub'] != get_jwt_identity():
+                return jsonify({'error': 'Invalid refresh token'}), 400
+            tokens.append(refresh_token)
+        
+        for token in tokens:
+            revoke_token(token)
+        db.session.commit()
+        
+        return jsonify({'message': 'Logged out successfully'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Logout failed'}), 500
+
+
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
@@ -204,6 +274,9 @@ def change_password():
         
         return jsonify({'message': 'Password changed successfully'}), 200
         
+    except PasswordHashingBusy as e:
+        db.session.rollback()
+        return busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to change password'}), 500
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Cart, Product, User, cart_schema, cart_items_schema
+from app.pricing import cart_version, cart_view_cache, load_cart_lines, price_lines
+from app.promotions import get_promotion_index
 from sqlalchemy import and_
 
 cart_bp = Blueprint('cart', __name__)
@@ -14,26 +16,26 @@ def get_cart():
     try:
         current_user_id = get_jwt_identity()
         
-        cart_items = Cart.query.filter_by(user_id=current_user_id).all()
-        
-        # Calculate totals
-        subtotal = 0
-        total_items = 0
-        
-        for item in cart_items:
-            if item.product and item.product.is_active:
-                subtotal += float(item.product.current_price) * item.quantity
-                total_items += item.quantity
-        
-        return jsonify({
-            'cart_items': cart_items_schema.dump(cart_items),
-            'summary': {
-                'total_items': total_items,
-                'subtotal': subtotal,
-                'estimated_tax': round(subtotal * 0.08, 2),  # 8% tax
-                'estimated_total': round(subtotal * 1.08, 2)
+        # Reuse the priced view while neither the cart nor its products changed
+        cache_key = (current_user_id, cart_version(current_user_id), get_promotion_index().version)
+        cart_view = cart_view_cache.get(cache_key)
+        
+        if cart_view is None:
+            cart_items = load_cart_lines(current_user_id)
+            totals = price_lines(cart_items)
+            cart_view = {
+                'cart_items': cart_items_schema.dump(cart_items),
+                'summary': {
+                    'total_items': totals['total_items'],
+                    'subtotal': float(totals['subtotal']),
+                    'discount': float(totals['discount']),
+                    'estimated_tax': float(totals['tax']),
+                    'estimated_total': float(totals['total'])
+                }
             }
-        }), 200
+            cart_view_cache.set(cache_key, cart_view)
+        
+        return jsonify(cart_view), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to get cart'}), 500
@@ -223,12 +225,22 @@ def validate_cart():
     """Validate cart items before checkout"""
     try:
         current_user_id = get_jwt_identity()
+        coupon_code = (request.get_json(silent=True) or {}).get('coupon_code')
+        if coupon_code is not None and not isinstance(coupon_code, str):
+            return jsonify({'error': 'coupon_code must be a string'}), 400
         
-        cart_items = Cart.query.filter_by(user_id=current_user_id).all()
+        cart_items = load_cart_lines(current_user_id)
         
         validation_errors = []
         valid_items = []
         
+        if coupon_code and not get_promotion_index().is_valid_coupon(coupon_code):
+            validation_errors.append({
+                'coupon_code': coupon_code,
+                'error': 'Invalid or expired coupon code'
+            })
+            coupon_code = None
+        
         for item in cart_items:
             if not item.product or not item.product.is_active:
                 validation_errors.append({
@@ -247,16 +259,17 @@ def validate_cart():
                 valid_items.append(item)
         
         # Calculate totals for valid items
-        subtotal = sum(float(item.product.current_price) * item.quantity for item in valid_items)
+        totals = price_lines(valid_items, coupon_code)
         
         return jsonify({
             'valid': len(validation_errors) == 0,
             'validation_errors': validation_errors,
             'valid_items': cart_items_schema.dump(valid_items),
             'summary': {
-                'subtotal': subtotal,
-                'tax': round(subtotal * 0.08, 2),
-                'total': round(subtotal * 1.08, 2)
+                'subtotal': float(totals['subtotal']),
+                'discount': float(totals['discount']),
+                'tax': float(totals['tax']),
+                'total': float(totals['total'])
             }
         }), 200
         
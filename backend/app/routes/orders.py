@@ -1,22 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import Order, OrderItem, Cart, Product, User, order_schema, orders_schema
+from app.order_numbers import generate_order_number
+from app.order_queries import with_order_details, order_summary_query, serialize_order_summaries
+from app.order_archive import load_archived_order
+from app.order_status import CANCELLABLE_STATUSES, cancel_orders
+from app.events import ORDER_CREATED, record_order_event
+from app.pricing import load_cart_lines, price_lines
+from app.promotions import get_promotion_index, normalize_coupon
+from app.rollups import record_order_created
+from app.inventory import sync_stock_alerts
+from app.invoices import COMPANY_INFO, get_invoice_pdf_path, invoice_cache_path, schedule_invoice_render
 from datetime import datetime
+import os
 import uuid
-import random
 
 orders_bp = Blueprint('orders', __name__)
 
 
-def generate_order_number():
-    """Generate unique order number"""
-    prefix = "EMP"
-    timestamp = datetime.utcnow().strftime("%Y%m%d")
-    random_suffix = str(random.randint(1000, 9999))
-    return f"{prefix}{timestamp}{random_suffix}"
-
-
 def simulate_payment_processing(payment_data):
     """Simulate payment processing"""
     # In a real application, this would integrate with a payment gateway
@@ -59,6 +61,10 @@ def get_orders():
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 10, type=int), 50)
         status = request.args.get('status', '').strip()
+        view = request.args.get('view', 'full').strip()
+        
+        if view not in ('full', 'summary'):
+            return jsonify({'error': 'Invalid view'}), 400
         
         # Build query
         query = Order.query.filter_by(user_id=current_user_id)
@@ -69,6 +75,11 @@ def get_orders():
         # Order by creation date (newest first)
         query = query.order_by(Order.created_at.desc())
         
+        if view == 'summary':
+            query = order_summary_query(query)
+        else:
+            query = with_order_details(query)
+        
         # Paginate
         pagination = query.paginate(
             page=page,
@@ -76,10 +87,13 @@ def get_orders():
             error_out=False
         )
         
-        orders = pagination.items
+        if view == 'summary':
+            orders = serialize_order_summaries(pagination.items)
+        else:
+            orders = orders_schema.dump(pagination.items)
         
         return jsonify({
-            'orders': orders_schema.dump(orders),
+            'orders': orders,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -107,6 +121,10 @@ def get_order(order_id):
         ).first()
         
         if not order:
+            # Orders past the retention window live in the archive
+            archived_order = load_archived_order(order_id, current_user_id)
+            if archived_order:
+                return jsonify({'order': archived_order, 'archived': True}), 200
             return jsonify({'error': 'Order not found'}), 404
         
         return jsonify({'order': order_schema.dump(order)}), 200
@@ -133,15 +151,12 @@ def create_order():
                 return jsonify({'error': f'{field} is required'}), 400
         
         # Get cart items
-        cart_items = Cart.query.filter_by(user_id=current_user_id).all()
+        cart_items = load_cart_lines(current_user_id)
         
         if not cart_items:
             return jsonify({'error': 'Cart is empty'}), 400
         
-        # Validate cart items and calculate totals
-        order_items_data = []
-        subtotal = 0
-        
+        # Validate cart items
         for cart_item in cart_items:
             product = cart_item.product
             
@@ -156,23 +171,16 @@ def create_order():
                     'available': product.stock_quantity,
                     'requested': cart_item.quantity
                 }), 400
-            
-            item_total = float(product.current_price) * cart_item.quantity
-            subtotal += item_total
-            
-            order_items_data.append({
-                'product': product,
-                'quantity': cart_item.quantity,
-                'unit_price': product.current_price,
-                'total_price': item_total
-            })
-        
-        # Calculate taxes and total
-        tax_rate = 0.08  # 8% tax
-        tax_amount = round(subtotal * tax_rate, 2)
-        shipping_amount = 0  # Free shipping for MVP
-        discount_amount = 0  # No discounts for MVP
-        total_amount = subtotal + tax_amount + shipping_amount - discount_amount
+        
+        coupon_code = data.get('coupon_code')
+        if coupon_code is not None and not isinstance(coupon_code, str):
+            return jsonify({'error': 'coupon_code must be a string'}), 400
+        if coupon_code and not get_promotion_index().is_valid_coupon(coupon_code):
+            return jsonify({'error': 'Invalid or expired coupon code'}), 400
+        
+        # Calculate line totals, discounts, taxes and total
+        totals = price_lines(cart_items, coupon_code)
+        order_items_data = totals['lines']
         
         # Process payment simulation
         payment_success, payment_result = simulate_payment_processing(data['payment_info'])
@@ -185,11 +193,11 @@ def create_order():
             user_id=current_user_id,
             order_number=generate_order_number(),
             status='confirmed',
-            subtotal=subtotal,
-            tax_amount=tax_amount,
-            shipping_amount=shipping_amount,
-            discount_amount=discount_amount,
-            total_amount=total_amount,
+            subtotal=totals['subtotal'],
+            tax_amount=totals['tax'],
+            shipping_amount=totals['shipping'],
+            discount_amount=totals['discount'],
+            total_amount=totals['total'],
             payment_method=data['payment_info'].get('payment_method', 'credit_card'),
             payment_status='completed',
             transaction_id=payment_result
@@ -222,15 +230,19 @@ def create_order():
         db.session.flush()  # Get order ID
         
         # Create order items and update stock
+        order_items = []
         for item_data in order_items_data:
             order_item = OrderItem(
                 order_id=order.id,
                 product_id=item_data['product'].id,
                 quantity=item_data['quantity'],
                 unit_price=item_data['unit_price'],
-                total_price=item_data['total_price']
+                total_price=item_data['line_total'],
+                order_created_at=order.created_at
             )
+            order_item.snapshot_product(item_data['product'])
             db.session.add(order_item)
+            order_items.append(order_item)
             
             # Update product stock
             item_data['product'].stock_quantity -= item_data['quantity']
@@ -238,8 +250,21 @@ def create_order():
         # Clear cart
         Cart.query.filter_by(user_id=current_user_id).delete()
         
+        record_order_created(order, order_items)
+        db.session.flush()
+        sync_stock_alerts([item.product_id for item in order_items])
+        record_order_event(
+            ORDER_CREATED, order,
+            item_count=len(order_items_data),
+            coupon_code=normalize_coupon(coupon_code),
+            promotion_ids=totals['promotion_ids']
+        )
+        
         db.session.commit()
         
+        # Invoices never change once the order is confirmed, render it now
+        schedule_invoice_render(order.id)
+        
         return jsonify({
             'message': 'Order created successfully',
             'order': order_schema.dump(order)
@@ -265,16 +290,13 @@ def cancel_order(order_id):
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
-        if order.status not in ['pending', 'confirmed']:
+        if order.status not in CANCELLABLE_STATUSES:
             return jsonify({'error': 'Order cannot be cancelled'}), 400
         
-        # Update order status
-        order.status = 'cancelled'
-        
-        # Restore product stock
-        for order_item in order.order_items:
-            if order_item.product:
-                order_item.product.stock_quantity += order_item.quantity
+        # Update order status and restore product stock in one transaction
+        if not cancel_orders([order.id], user_id=current_user_id):
+            db.session.rollback()
+            return jsonify({'error': 'Order cannot be cancelled'}), 400
         
         db.session.commit()
         
@@ -334,18 +356,47 @@ def get_invoice(order_id):
             'order': order_schema.dump(order),
             'invoice_date': order.created_at.isoformat(),
             'due_date': order.created_at.isoformat(),  # Already paid
-            'company_info': {
-                'name': 'Empower Fashion',
-                'address': '123 Fashion Avenue',
-                'city': 'New York',
-                'state': 'NY',
-                'postal_code': '10001',
-                'phone': '(555) 123-4567',
-                'email': 'orders@empowerfashion.com'
-            }
+            'company_info': COMPANY_INFO
         }
         
         return jsonify({'invoice': invoice_data}), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to generate invoice'}), 500
+
+
+@orders_bp.route('/invoice/<int:order_id>.pdf', methods=['GET'])
+@jwt_required()
+def get_invoice_pdf(order_id):
+    """Download an order's invoice as PDF"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        order = Order.query.with_entities(Order.id, Order.order_number).filter_by(
+            id=order_id,
+            user_id=current_user_id
+        ).first()
+        
+        if not order:
+            return jsonify({'error': 'Order not found'}), 404
+        
+        # Cache hit costs a stat and a streamed file read; render only on a miss
+        path = invoice_cache_path(order.id, order.order_number)
+        if not os.path.exists(path):
+            path = get_invoice_pdf_path(Order.query.get(order.id))
+        
+        response = send_file(
+            path,
+            mimetype='application/pdf',
+            download_name=f"INV-{order.order_number}.pdf",
+            conditional=True,
+            etag=True,
+            max_age=31536000
+        )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to generate invoice'}), 500
@@ -1,17 +1,18 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Product, Category, User, product_schema, products_schema, category_schema, categories_schema
+from app.models import Product, Category, product_schema, products_schema, category_schema, categories_schema
+from app.inventory import sync_stock_alerts
+from app.principals import admin_required
 from sqlalchemy import or_, and_
 from marshmallow import ValidationError
 
 products_bp = Blueprint('products', __name__)
 
 
-def is_admin(user_id):
-    """Check if user is admin"""
-    user = User.query.get(user_id)
-    return user and user.is_admin
+def invalid_reorder_threshold(value):
+    """Reorder thresholds are non-negative integers, or null to inherit"""
+    return value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0)
+
 
 
 @products_bp.route('', methods=['GET'])
@@ -121,15 +122,10 @@ def get_product(product_id):
 
 
 @products_bp.route('', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_product():
     """Create a new product (admin only)"""
     try:
-        current_user_id = get_jwt_identity()
-        
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         data = request.get_json()
         
         # Validate required fields
@@ -147,6 +143,9 @@ def create_product():
         if not category:
             return jsonify({'error': 'Category not found'}), 400
         
+        if invalid_reorder_threshold(data.get('reorder_threshold')):
+            return jsonify({'error': 'reorder_threshold must be a non-negative integer'}), 400
+        
         # Create new product
         product = Product(
             name=data['name'],
@@ -155,6 +154,7 @@ def create_product():
             sale_price=data.get('sale_price'),
             sku=data['sku'],
             stock_quantity=data.get('stock_quantity', 0),
+            reorder_threshold=data.get('reorder_threshold'),
             category_id=data['category_id'],
             brand=data.get('brand', ''),
             color=data.get('color', ''),
@@ -170,6 +170,8 @@ def create_product():
         )
         
         db.session.add(product)
+        db.session.flush()
+        sync_stock_alerts([product.id])
         db.session.commit()
         
         return jsonify({
@@ -185,15 +187,10 @@ def create_product():
 
 
 @products_bp.route('/<int:product_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_product(product_id):
     """Update a product (admin only)"""
     try:
-        current_user_id = get_jwt_identity()
-        
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         product = Product.query.get(product_id)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
@@ -217,6 +214,10 @@ def update_product(product_id):
             product.sku = data['sku']
         if 'stock_quantity' in data:
             product.stock_quantity = data['stock_quantity']
+        if 'reorder_threshold' in data:
+            if invalid_reorder_threshold(data['reorder_threshold']):
+                return jsonify({'error': 'reorder_threshold must be a non-negative integer'}), 400
+            product.reorder_threshold = data['reorder_threshold']
         if 'category_id' in data:
             category = Category.query.get(data['category_id'])
             if not category:
@@ -247,6 +248,8 @@ def update_product(product_id):
         if 'is_active' in data:
             product.is_active = data['is_active']
         
+        db.session.flush()
+        sync_stock_alerts([product.id])
         db.session.commit()
         
         return jsonify({
@@ -260,15 +263,10 @@ def update_product(product_id):
 
 
 @products_bp.route('/<int:product_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_product(product_id):
     """Delete a product (admin only)"""
     try:
-        current_user_id = get_jwt_identity()
-        
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         product = Product.query.get(product_id)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
@@ -296,15 +294,10 @@ def get_categories():
 
 
 @products_bp.route('/categories', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_category():
     """Create a new category (admin only)"""
     try:
-        current_user_id = get_jwt_identity()
-        
-        if not is_admin(current_user_id):
-            return jsonify({'error': 'Admin access required'}), 403
-        
         data = request.get_json()
         
         # Validate required fields
@@ -315,11 +308,15 @@ def create_category():
         if Category.query.filter_by(name=data['name']).first():
             return jsonify({'error': 'Category already exists'}), 400
         
+        if invalid_reorder_threshold(data.get('reorder_threshold')):
+            return jsonify({'error': 'reorder_threshold must be a non-negative integer'}), 400
+        
         # Create new category
         category = Category(
             name=data['name'],
             description=data.get('description', ''),
-            image_url=data.get('image_url', '')
+            image_url=data.get('image_url', ''),
+            reorder_threshold=data.get('reorder_threshold')
         )
         
         db.session.add(category)
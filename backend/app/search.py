@@ -0,0 +1,219 @@
+"""Indexed admin search over orders and customers.
+
+Orders match on their order number or their customer; customers match on
+email and name. Matching is a case-insensitive substring match, as with the
+ILIKE filters this replaces, but it is answered from an index:
+
+* On PostgreSQL, pg_trgm GIN indexes over the lowercased search text
+  (``flask search init-index``) serve the LIKE directly, and results are
+  ranked by word_similarity.
+* Elsewhere, search_trigrams holds every trigram of each row's search text,
+  kept current on insert and update. Rows containing all of the term's
+  trigrams are rechecked with LIKE and ranked by the share of their
+  trigrams the term covers.
+
+A complete order number or email skips both and uses the unique index.
+"""
+from sqlalchemy import and_, case, delete, event, func, insert, inspect, literal, literal_column, or_, select, text
+from app import db
+from app.models import Order, SearchTrigram, User
+from app.order_numbers import ORDER_NUMBER_PREFIX
+
+
+SEARCH_BATCH_SIZE = 1000
+USER_SEARCH_FIELDS = ('email', 'first_name', 'last_name')
+
+_separator = literal_column("' '")
+_empty = literal_column("''")
+
+# entity -> (id column, SQL search text, source columns)
+SEARCH_ENTITIES = {
+    'order': (Order.id, func.lower(Order.order_number), [Order.order_number]),
+    'user': (
+        User.id,
+        func.lower(
+            User.email + _separator + func.coalesce(User.first_name, _empty)
+            + _separator + func.coalesce(User.last_name, _empty)
+        ),
+        [User.email, User.first_name, User.last_name]
+    ),
+}
+
+# Must match the SQL search text above for PostgreSQL to use them
+PG_TRGM_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_orders_search_trgm ON orders USING gin (lower(order_number) gin_trgm_ops)',
+    "CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gin "
+    "(lower(email || ' ' || coalesce(first_name, '') || ' ' || coalesce(last_name, '')) gin_trgm_ops)",
+]
+
+
+def search_text(*values):
+    """Python equivalent of the SQL search text for a row's source values"""
+    return ' '.join(value or '' for value in values).lower()
+
+
+def trigrams(value):
+    """Every three character substring of ``value``"""
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def uses_pg_trgm():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def _greatest(first, second):
+    return func.greatest(first, second) if uses_pg_trgm() else func.max(first, second)
+
+
+def _text_match(entity, term):
+    """(condition, rank) for rows of ``entity`` whose search text contains ``term``"""
+    id_column, search_expression, _ = SEARCH_ENTITIES[entity]
+    contains = search_expression.contains(term, autoescape=True)
+    if uses_pg_trgm():
+        return contains, func.word_similarity(term, search_expression)
+
+    grams = trigrams(term)
+    if not grams:
+        # Too short for the index; like pg_trgm, this falls back to a scan
+        return contains, literal(0.0)
+    candidates = select(SearchTrigram.entity_id).where(
+        SearchTrigram.entity == entity,
+        SearchTrigram.trigram.in_(sorted(grams))
+    ).group_by(SearchTrigram.entity_id).having(func.count() == len(grams))
+    rank = literal(float(len(grams))) / (func.length(search_expression) - 2)
+    return and_(id_column.in_(candidates), contains), rank
+
+
+def _exact_order_id(term):
+    if not term.startswith(ORDER_NUMBER_PREFIX.lower()):
+        return None
+    return db.session.execute(select(Order.id).where(Order.order_number == term.upper())).scalar()
+
+
+def _exact_user_id(term):
+    if '@' not in term:
+        return None
+    return db.session.execute(select(User.id).where(User.email == term)).scalar()
+
+
+def search_orders(term):
+    """(condition, rank) over Order for an admin search term.
+
+    The rank is the better of the order number's and the customer's
+    similarity to the term.
+    """
+    term = term.strip().lower()
+    order_id = _exact_order_id(term)
+    if order_id is not None:
+        return Order.id == order_id, literal(1.0)
+    user_id = _exact_user_id(term)
+    if user_id is not None:
+        return Order.user_id == user_id, literal(1.0)
+
+    number_match, number_rank = _text_match('order', term)
+    customer_match, customer_rank = _text_match('user', term)
+    customer_rank = select(customer_rank).where(
+        User.id == Order.user_id,
+        customer_match
+    ).correlate(Order).scalar_subquery()
+
+    condition = or_(number_match, Order.user_id.in_(select(User.id).where(customer_match)))
+    rank = _greatest(case((number_match, number_rank), else_=0.0), func.coalesce(customer_rank, 0.0))
+    return condition, rank
+
+
+def search_users(term):
+    """(condition, rank) over User for an admin search term"""
+    term = term.strip().lower()
+    user_id = _exact_user_id(term)
+    if user_id is not None:
+        return User.id == user_id, literal(1.0)
+    return _text_match('user', term)
+
+
+def _trigram_rows(entity, entity_id, value):
+    return [{'entity': entity, 'trigram': gram, 'entity_id': entity_id} for gram in sorted(trigrams(value))]
+
+
+def index_search_text(connection, entity, entity_id, value, replace=True):
+    """Store the trigrams of one row's search text"""
+    if replace:
+        connection.execute(delete(SearchTrigram).where(
+            SearchTrigram.entity == entity,
+            SearchTrigram.entity_id == entity_id
+        ))
+    rows = _trigram_rows(entity, entity_id, value)
+    if rows:
+        connection.execute(insert(SearchTrigram), rows)
+
+
+def _index_rows(entity, rows):
+    """Insert the trigrams of (id, *source values) rows in one batched statement"""
+    trigram_rows = [
+        trigram_row
+        for entity_id, *values in rows
+        for trigram_row in _trigram_rows(entity, entity_id, search_text(*values))
+    ]
+    if trigram_rows:
+        # A Core insert: the ORM's bulk insert path costs twice as much per row here
+        db.session.execute(SearchTrigram.__table__.insert(), trigram_rows)
+
+
+def index_new_users(rows):
+    """Index (id, email, first_name, last_name) rows of users inserted in bulk, bypassing the listeners"""
+    if not uses_pg_trgm():
+        _index_rows('user', rows)
+
+
+@event.listens_for(Order, 'after_insert')
+def index_order(mapper, connection, target):
+    if connection.dialect.name != 'postgresql':
+        index_search_text(connection, 'order', target.id, search_text(target.order_number), replace=False)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def index_user(mapper, connection, target):
+    if connection.dialect.name == 'postgresql':
+        return
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in USER_SEARCH_FIELDS):
+        return
+    index_search_text(
+        connection, 'user', target.id,
+        search_text(*(getattr(target, name) for name in USER_SEARCH_FIELDS))
+    )
+
+
+def create_trigram_indexes():
+    """Create the pg_trgm extension and GIN indexes (PostgreSQL only)"""
+    db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    for statement in PG_TRGM_INDEXES:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+
+def rebuild_search_index(batch_size=SEARCH_BATCH_SIZE):
+    """Recreate search_trigrams from the orders and users tables, one batch per transaction.
+
+    Also drops rows of deleted or archived orders. Returns the number of
+    rows indexed per entity.
+    """
+    counts = {}
+    for entity, (id_column, _, columns) in SEARCH_ENTITIES.items():
+        db.session.execute(delete(SearchTrigram).where(SearchTrigram.entity == entity))
+        db.session.commit()
+
+        last_id = 0
+        counts[entity] = 0
+        while True:
+            rows = db.session.execute(
+                select(id_column, *columns).where(id_column > last_id).order_by(id_column).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            _index_rows(entity, rows)
+            db.session.commit()
+            last_id = rows[-1][0]
+            counts[entity] += len(rows)
+    return counts
@@ -0,0 +1,167 @@
+"""Columnar snapshots of the order tables for offline analytics.
+
+A snapshot is a directory of ``<table>.<column>.npy`` files plus a
+manifest.json, written under ANALYTICS_SNAPSHOT_DIR by
+``flask analytics snapshot``. Columns are streamed from the database
+straight into memory-mapped .npy files, so the job's memory use does not
+depend on table size. The CURRENT file names the latest complete snapshot
+and is replaced atomically, so readers never see a half-written snapshot.
+
+Strings with few distinct values (order status) are stored as int8 codes
+with their labels in the manifest; datetimes are stored as datetime64[s].
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from app.models import Order, OrderItem, Product, User
+from app.invoices import write_atomic
+
+
+SNAPSHOT_BATCH_SIZE = 10000
+SNAPSHOTS_KEPT = 2
+
+ORDER_STATUSES = ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled']
+
+# table -> (ordering column, bounded by the snapshot's max order id, [(column name, expression, dtype)])
+SNAPSHOT_TABLES = {
+    'orders': (Order.id, True, [
+        ('id', Order.id, 'int64'),
+        ('user_id', Order.user_id, 'int64'),
+        ('created_at', Order.created_at, 'datetime64[s]'),
+        ('status', Order.status, 'int8'),
+        ('total_amount', Order.total_amount, 'float64'),
+    ]),
+    'order_items': (OrderItem.order_id, True, [
+        ('order_id', OrderItem.order_id, 'int64'),
+        ('product_id', OrderItem.product_id, 'int64'),
+        ('quantity', OrderItem.quantity, 'int32'),
+        ('total_price', OrderItem.total_price, 'float64'),
+    ]),
+    'products': (Product.id, False, [
+        ('id', Product.id, 'int64'),
+        ('category_id', Product.category_id, 'int64'),
+        ('price', Product.price, 'float64'),
+    ]),
+    'users': (User.id, False, [
+        ('id', User.id, 'int64'),
+        ('created_at', User.created_at, 'datetime64[s]'),
+    ]),
+}
+
+CATEGORICAL_COLUMNS = {('orders', 'status'): ORDER_STATUSES}
+
+
+def snapshot_root(root=None):
+    return root or current_app.config['ANALYTICS_SNAPSHOT_DIR']
+
+
+def column_path(directory, table, column):
+    return os.path.join(directory, f'{table}.{column}.npy')
+
+
+def _encoder(table, column, dtype):
+    labels = CATEGORICAL_COLUMNS.get((table, column))
+    if labels is not None:
+        codes = {label: code for code, label in enumerate(labels)}
+        return lambda value: codes.get(value, -1)
+    if dtype.startswith('datetime64'):
+        return lambda value: np.datetime64(value, 's') if value is not None else np.datetime64('NaT')
+    if dtype.startswith('float'):
+        return lambda value: float(value) if value is not None else np.nan
+    return lambda value: value if value is not None else -1
+
+
+def _write_table(directory, table, order_column, bounded, columns, max_order_id):
+    condition = order_column <= max_order_id if bounded else True
+    total = db.session.execute(select(func.count()).select_from(order_column.table).where(condition)).scalar()
+
+    arrays = [
+        np.lib.format.open_memmap(column_path(directory, table, name), mode='w+', dtype=dtype, shape=(total,))
+        for name, _, dtype in columns
+    ]
+    encoders = [_encoder(table, name, dtype) for name, _, dtype in columns]
+
+    rows = db.session.execute(
+        select(*[expression for _, expression, _ in columns]).where(condition).order_by(order_column)
+        .execution_options(stream_results=True, yield_per=SNAPSHOT_BATCH_SIZE)
+    )
+    count = 0
+    for batch in rows.partitions():
+        # Rows deleted after the count (e.g. archived) leave unused slots at the end
+        batch = batch[:total - count]
+        for array, encode, values in zip(arrays, encoders, zip(*batch)):
+            array[count:count + len(batch)] = [encode(value) for value in values]
+        count += len(batch)
+        if count >= total:
+            break
+
+    for array in arrays:
+        array.flush()
+    return {
+        'rows': count,
+        'columns': {name: dtype for name, _, dtype in columns}
+    }
+
+
+def write_snapshot(root=None):
+    """Export the analytics tables to a new snapshot directory and make it current.
+
+    Orders and items are bounded by the highest order id seen at the start,
+    so the snapshot never contains items of orders it does not include.
+    Returns the snapshot directory.
+    """
+    root = snapshot_root(root)
+    created_at = datetime.utcnow()
+    name = created_at.strftime('%Y%m%dT%H%M%S%f')
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+
+    try:
+        max_order_id = db.session.execute(select(func.coalesce(func.max(Order.id), 0))).scalar()
+        tables = {
+            table: _write_table(directory, table, order_column, bounded, columns, max_order_id)
+            for table, (order_column, bounded, columns) in SNAPSHOT_TABLES.items()
+        }
+        manifest = {
+            'name': name,
+            'created_at': created_at.isoformat(),
+            'tables': tables,
+            'categories': {f'{table}.{column}': labels for (table, column), labels in CATEGORICAL_COLUMNS.items()}
+        }
+        write_atomic(os.path.join(directory, 'manifest.json'), json.dumps(manifest, indent=2).encode('utf-8'))
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        db.session.rollback()
+
+    write_atomic(os.path.join(root, 'CURRENT'), name.encode('utf-8'))
+    prune_snapshots(root, keep=SNAPSHOTS_KEPT)
+    return directory
+
+
+def current_snapshot_dir(root=None):
+    """Directory of the latest complete snapshot, or None"""
+    root = snapshot_root(root)
+    try:
+        with open(os.path.join(root, 'CURRENT')) as handle:
+            name = handle.read().strip()
+    except FileNotFoundError:
+        return None
+    directory = os.path.join(root, name)
+    return directory if os.path.exists(os.path.join(directory, 'manifest.json')) else None
+
+
+def prune_snapshots(root, keep):
+    """Delete all but the ``keep`` newest snapshot directories"""
+    names = sorted(
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name))
+    )
+    for name in names[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
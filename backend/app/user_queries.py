@@ -0,0 +1,19 @@
+from app.models import User
+from app.search import search_users
+
+
+def filter_admin_users(query, search=None, role=None, ranked=False):
+    """Apply the admin user list filters to an ORM query or a select()
+
+    With ``ranked``, the best search matches are ordered first.
+    """
+    if search:
+        condition, rank = search_users(search)
+        query = query.filter(condition)
+        if ranked:
+            query = query.order_by(rank.desc())
+    if role == 'admin':
+        query = query.filter(User.is_admin.is_(True))
+    elif role == 'customer':
+        query = query.filter(User.is_admin.is_(False))
+    return query
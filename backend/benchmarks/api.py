@@ -0,0 +1,495 @@
+"""Benchmark every API endpoint against a deterministic dataset.
+
+Usage (from the backend directory):
+    python -m benchmarks.api --scale 10k
+    python -m benchmarks.api --scale 100k --requests 50 --update-baseline
+
+The dataset (see benchmarks.datasets) is built once per scale and seed in
+instance/benchmarks and copied for every run, so the writes a run makes
+never reach the next one. --database-url runs against another database
+instead, such as PostgreSQL; the dataset is built there if it is empty,
+and the write endpoints modify it.
+
+Every case sends --warmup untimed requests, then --requests timed ones
+through the Flask test client. It records latency percentiles and the
+median number of SQL statements per request. Results are compared with the
+scale's entry in the baseline file. The run fails in any of these cases:
+  * a case issues more queries than its baseline
+  * a case's median latency exceeds its baseline by more than --tolerance
+    and by more than MIN_REGRESSION_MS
+  * a case answers with an unexpected status
+  * an endpoint has no case
+Baseline latencies are scaled by the time of a fixed calibration workload
+on the current machine relative to the baseline's, so the baseline travels
+between machines roughly. Refresh it with --update-baseline after an
+intended change.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import date
+from statistics import median
+from unittest import mock
+from sqlalchemy import event, func, select
+
+from app import create_app, db
+from app import invoice_exports
+from app.invoice_exports import run_invoice_export
+from app.models import Cart, Category, InvoiceExport, Order, OrderItem, Product, Promotion, User
+from app.principals import create_user_refresh_token, create_user_token
+from app.snapshots import write_snapshot
+from benchmarks.datasets import ADMIN_EMAIL, CUSTOMER_EMAIL, DATASET_VERSION, PASSWORDS, SCALES, build_dataset
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BACKEND_DIR, 'instance', 'benchmarks')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+MIN_REGRESSION_MS = 2.0
+
+# Settings for stable measurements: no rate limiting or background renders, and
+# caches that do not expire during a run
+BENCHMARK_ENV = {
+    'RATELIMIT_ENABLED': 'false',
+    'INVOICE_PRERENDER': 'false',
+    'BCRYPT_ROUNDS': '4',
+    'JWT_ACCESS_TOKEN_MINUTES': '1440',
+    'PRINCIPAL_CACHE_TTL': '3600',
+    'REVOCATION_FILTER_REFRESH': '3600',
+}
+
+ADDRESS = {
+    'first_name': 'Bench', 'last_name': 'Customer', 'address_line1': '1 Benchmark Way',
+    'city': 'Nairobi', 'state': 'NA', 'postal_code': '00100', 'country': 'KE'
+}
+PAYMENT = {
+    'payment_method': 'credit_card', 'card_number': '4111111111111111',
+    'expiry_month': 1, 'expiry_year': 2030, 'cvv': '123'
+}
+
+Case = namedtuple('Case', ['name', 'method', 'path', 'role', 'body', 'setup', 'status'])
+
+
+def case(name, method, path, role=None, body=None, setup=None, status=200):
+    """A benchmarked request.
+
+    ``path`` is formatted with the context and the values ``setup`` returns;
+    ``body`` may be a function of those values. ``name`` is the endpoint,
+    optionally followed by ``:variant``.
+    """
+    return Case(name, method, path, role, body, setup, status)
+
+
+# Setup steps run untimed before each request and return path/body values
+
+def _spare_products(ctx, count):
+    return [next(ctx['spare_products']) for _ in range(count)]
+
+
+def _new_cart_item(ctx, n):
+    item = Cart(user_id=ctx['customer_id'], product_id=_spare_products(ctx, 1)[0], quantity=1)
+    db.session.add(item)
+    db.session.commit()
+    return {'cart_item_id': item.id}
+
+
+def _fill_cart(ctx, n):
+    Cart.query.filter_by(user_id=ctx['customer_id']).delete()
+    db.session.add_all([
+        Cart(user_id=ctx['customer_id'], product_id=product_id, quantity=1)
+        for product_id in _spare_products(ctx, 3)
+    ])
+    db.session.commit()
+    return {}
+
+
+def _create_orders(ctx, count):
+    orders = []
+    for product_id in _spare_products(ctx, count):
+        product = db.session.get(Product, product_id)
+        order = Order(
+            user_id=ctx['customer_id'], order_number=f"EMPBENCH{ctx['run']}{next(ctx['sequence']):08d}",
+            status='confirmed', payment_status='completed', subtotal=product.price, total_amount=product.price
+        )
+        db.session.add(order)
+        db.session.flush()
+        item = OrderItem(order_id=order.id, product_id=product.id, quantity=1,
+                         unit_price=product.price, total_price=product.price)
+        item.snapshot_product(product)
+        db.session.add(item)
+        orders.append(order)
+    db.session.commit()
+    return [order.id for order in orders]
+
+
+def _new_order(ctx, n):
+    return {'order_id': _create_orders(ctx, 1)[0]}
+
+
+def _new_orders(ctx, n):
+    return {'order_ids': _create_orders(ctx, 10)}
+
+
+def _confirmed_order(ctx, n):
+    Order.query.filter_by(id=ctx['admin_order_id']).update({'status': 'confirmed'})
+    db.session.commit()
+    return {}
+
+
+def _new_product(ctx, n):
+    product = Product(name='Bench product', price=10, sku=f"BENCHNEW-{ctx['run']}-{n}",
+                      slug=f"bench-new-{ctx['run']}-{n}", category_id=ctx['category_id'], stock_quantity=50)
+    db.session.add(product)
+    db.session.commit()
+    return {'product_id': product.id}
+
+
+def _new_promotion(ctx, n):
+    promotion = Promotion(name='Bench promotion', kind='percentage', value=10)
+    db.session.add(promotion)
+    db.session.commit()
+    return {'promotion_id': promotion.id}
+
+
+def _fresh_access_token(ctx, n):
+    return {'token': create_user_token(db.session.get(User, ctx['customer_id']))}
+
+
+def _fresh_refresh_token(ctx, n):
+    return {'token': create_user_refresh_token(db.session.get(User, ctx['customer_id']))}
+
+
+def _unique(ctx, n):
+    return {'unique': f"{ctx['run']}-{n}"}
+
+
+CASES = [
+    # auth
+    case('auth.register', 'POST', '/api/auth/register', setup=_unique, status=201, body=lambda p: {
+        'email': f"bench-{p['unique']}@bench.example.com", 'password': 'benchpass123',
+        'first_name': 'Bench', 'last_name': 'Register'
+    }),
+    case('auth.login', 'POST', '/api/auth/login', body={'email': CUSTOMER_EMAIL, 'password': PASSWORDS[CUSTOMER_EMAIL]}),
+    case('auth.refresh', 'POST', '/api/auth/refresh', setup=_fresh_refresh_token),
+    case('auth.logout', 'POST', '/api/auth/logout', setup=_fresh_access_token),
+    case('auth.get_profile', 'GET', '/api/auth/profile', 'customer'),
+    case('auth.update_profile', 'PUT', '/api/auth/profile', 'customer', body={'phone': '555-0199'}),
+    case('auth.change_password', 'PUT', '/api/auth/change-password', 'customer',
+         body={'current_password': PASSWORDS[CUSTOMER_EMAIL], 'new_password': PASSWORDS[CUSTOMER_EMAIL]}),
+    case('auth.verify_token', 'GET', '/api/auth/verify-token', 'customer'),
+    # products
+    case('products.get_products', 'GET', '/api/products'),
+    case('products.get_products:filtered', 'GET',
+         '/api/products?category_id={category_id}&min_price=20&max_price=80&sort_by=price&sort_order=asc'),
+    case('products.get_products:search', 'GET', '/api/products?search=jacket'),
+    case('products.get_product', 'GET', '/api/products/{product_id}'),
+    case('products.get_featured_products', 'GET', '/api/products/featured'),
+    case('products.search_products', 'GET', '/api/products/search?q=navy'),
+    case('products.get_categories', 'GET', '/api/products/categories'),
+    case('products.create_category', 'POST', '/api/products/categories', 'admin', setup=_unique, status=201,
+         body=lambda p: {'name': f"Bench category {p['unique']}"}),
+    case('products.create_product', 'POST', '/api/products', 'admin', setup=_unique, status=201, body=lambda p: {
+        'name': 'Bench product', 'price': 25, 'sku': f"BENCHAPI-{p['unique']}", 'slug': f"bench-api-{p['unique']}",
+        'category_id': p['category_id'], 'stock_quantity': 40
+    }),
+    case('products.update_product', 'PUT', '/api/products/{product_id}', 'admin', body={'stock_quantity': 120}),
+    case('products.delete_product', 'DELETE', '/api/products/{product_id}', 'admin', setup=_new_product),
+    # cart
+    case('cart.get_cart', 'GET', '/api/cart', 'customer'),
+    case('cart.get_cart_count', 'GET', '/api/cart/count', 'customer'),
+    case('cart.validate_cart', 'POST', '/api/cart/validate', 'customer'),
+    case('cart.add_to_cart', 'POST', '/api/cart', 'customer', setup=lambda ctx, n: {'spare': _spare_products(ctx, 1)[0]},
+         body=lambda p: {'product_id': p['spare'], 'quantity': 1}),
+    case('cart.update_cart_item', 'PUT', '/api/cart/{cart_item_id}', 'customer', setup=_new_cart_item,
+         body={'quantity': 2}),
+    case('cart.remove_cart_item', 'DELETE', '/api/cart/{cart_item_id}', 'customer', setup=_new_cart_item),
+    case('cart.clear_cart', 'DELETE', '/api/cart/clear', 'customer', setup=_fill_cart),
+    # orders
+    case('orders.get_orders', 'GET', '/api/orders', 'customer'),
+    case('orders.get_orders:summary', 'GET', '/api/orders?view=summary', 'customer'),
+    case('orders.get_order', 'GET', '/api/orders/{order_id}', 'customer'),
+    case('orders.get_invoice', 'GET', '/api/orders/invoice/{order_id}', 'customer'),
+    case('orders.get_invoice_pdf', 'GET', '/api/orders/invoice/{order_id}.pdf', 'customer'),
+    case('orders.simulate_payment', 'POST', '/api/orders/simulate-payment', body=PAYMENT),
+    case('orders.create_order', 'POST', '/api/orders', 'customer', setup=_fill_cart, status=201,
+         body={'shipping_address': ADDRESS, 'billing_address': ADDRESS, 'payment_info': PAYMENT}),
+    case('orders.cancel_order', 'PUT', '/api/orders/{order_id}/cancel', 'customer', setup=_new_order),
+    # admin
+    case('admin.get_dashboard_stats', 'GET', '/api/admin/dashboard', 'admin'),
+    case('admin.get_users', 'GET', '/api/admin/users', 'admin'),
+    case('admin.get_users:sorted', 'GET', '/api/admin/users?sort=lifetime_value&segment=vip', 'admin'),
+    case('admin.get_users:search', 'GET', '/api/admin/users?search=customer12', 'admin'),
+    case('admin.update_user', 'PUT', '/api/admin/users/{customer_id}', 'admin', body={'phone': '555-0142'}),
+    case('admin.export_all_users', 'GET', '/api/admin/users/export?search=customer1', 'admin'),
+    case('admin.get_all_orders', 'GET', '/api/admin/orders', 'admin'),
+    case('admin.get_all_orders:search', 'GET', '/api/admin/orders?search=customer12&status=delivered', 'admin'),
+    case('admin.update_order_status', 'PUT', '/api/admin/orders/{admin_order_id}', 'admin', setup=_confirmed_order,
+         body={'status': 'processing'}),
+    case('admin.bulk_update_order_status', 'POST', '/api/admin/orders/status', 'admin', setup=_new_orders,
+         body=lambda p: {'status': 'processing', 'order_ids': p['order_ids']}),
+    case('admin.bulk_cancel_orders', 'POST', '/api/admin/orders/cancel', 'admin', setup=_new_orders,
+         body=lambda p: {'order_ids': p['order_ids']}),
+    case('admin.export_all_orders', 'GET', '/api/admin/orders/export?status=pending&search=customer1', 'admin'),
+    case('admin.get_product_analytics', 'GET', '/api/admin/analytics/products', 'admin'),
+    case('admin.get_order_analytics', 'GET', '/api/admin/analytics/orders', 'admin'),
+    case('admin.get_cohort_analytics', 'GET', '/api/admin/analytics/cohorts', 'admin'),
+    case('admin.get_rfm_analytics', 'GET', '/api/admin/analytics/rfm', 'admin'),
+    case('admin.get_basket_analytics', 'GET', '/api/admin/analytics/baskets', 'admin'),
+    case('admin.get_stock_alerts', 'GET', '/api/admin/inventory/alerts', 'admin'),
+    case('admin.update_category_reorder_threshold', 'PUT', '/api/admin/categories/{category_id}/reorder-threshold',
+         'admin', body={'reorder_threshold': 8}),
+    case('admin.get_promotions', 'GET', '/api/admin/promotions', 'admin'),
+    case('admin.create_promotion', 'POST', '/api/admin/promotions', 'admin', status=201,
+         body={'name': 'Bench sale', 'kind': 'percentage', 'value': 5}),
+    case('admin.update_promotion', 'PUT', '/api/admin/promotions/{promotion_id}', 'admin', setup=_new_promotion,
+         body={'value': 15}),
+    case('admin.delete_promotion', 'DELETE', '/api/admin/promotions/{promotion_id}', 'admin', setup=_new_promotion),
+    # A range without orders keeps the background export job trivial
+    case('admin.create_invoice_export', 'POST', '/api/admin/invoices/exports', 'admin', status=202,
+         body={'start_date': '2000-01-01', 'end_date': '2000-01-01'}),
+    case('admin.get_invoice_export', 'GET', '/api/admin/invoices/exports/{export_id}', 'admin'),
+    case('admin.download_invoice_export', 'GET', '/api/admin/invoices/exports/{export_id}/download', 'admin'),
+]
+
+
+def calibrate(rounds=5):
+    """Best time in ms of a fixed SQLite and JSON workload, to scale baselines by machine speed"""
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        connection = sqlite3.connect(':memory:')
+        connection.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, value TEXT)')
+        connection.executemany('INSERT INTO t (value) VALUES (?)', ((str(i),) for i in range(20000)))
+        for i in range(200):
+            connection.execute('SELECT count(*), max(value) FROM t WHERE id > ?', (i * 50,)).fetchone()
+        json.loads(json.dumps([{'id': i, 'value': str(i)} for i in range(20000)]))
+        connection.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 3)
+
+
+def _wait_for_background_jobs():
+    """Let queued invoice exports finish so they do not slow down the next case"""
+    if invoice_exports._job_executor is not None:
+        invoice_exports._job_executor.submit(lambda: None).result()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def _dataset_path(args):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    for name in ('INVOICE_CACHE_DIR', 'INVOICE_EXPORT_DIR', 'ANALYTICS_SNAPSHOT_DIR'):
+        os.environ[name] = os.path.join(DATA_DIR, name.lower())
+    return os.path.join(DATA_DIR, f'{args.scale}-{args.seed}-v{DATASET_VERSION}.db')
+
+
+def _build_if_needed(app, size, seed):
+    with app.app_context():
+        db.create_all()
+        if db.session.execute(select(func.count(User.id))).scalar():
+            return False
+        started = time.perf_counter()
+        counts = build_dataset(size, seed)
+        print(f"built dataset in {time.perf_counter() - started:.1f}s: "
+              + ', '.join(f'{count:,} {name}' for name, count in counts.items()))
+        return True
+
+
+def _context(client):
+    """Ids and tokens the cases refer to"""
+    customer = User.query.filter_by(email=CUSTOMER_EMAIL).one()
+    admin_order = Order.query.filter(Order.user_id != customer.id).order_by(Order.id).first()
+    export = InvoiceExport(requested_by=User.query.filter_by(email=ADMIN_EMAIL).one().id,
+                           start_date=date(2000, 1, 1), end_date=date(2000, 1, 1))
+    db.session.add(export)
+    db.session.commit()
+    run_invoice_export(export.id)
+    # The cohort, RFM and basket reports read the analytics snapshot
+    write_snapshot()
+
+    spare = db.session.execute(
+        select(Product.id).where(Product.is_active.is_(True), Product.stock_quantity >= 100).order_by(Product.id.desc())
+    ).scalars().all()
+    tokens = {}
+    for role, email in (('admin', ADMIN_EMAIL), ('customer', CUSTOMER_EMAIL)):
+        response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORDS[email]})
+        tokens[role] = response.json['access_token']
+    return {
+        'run': uuid.uuid4().hex[:8],
+        'sequence': itertools.count(),
+        'customer_id': customer.id,
+        'order_id': Order.query.filter_by(user_id=customer.id).order_by(Order.id).first().id,
+        'admin_order_id': admin_order.id,
+        'product_id': db.session.execute(select(func.min(Product.id))).scalar(),
+        'category_id': db.session.execute(select(func.min(Category.id))).scalar(),
+        'promotion_id': None,
+        'export_id': export.id,
+        'spare_products': iter(spare),
+        'tokens': tokens,
+    }
+
+
+def run_case(client, ctx, bench_case, iterations, warmup, counter):
+    timings, queries, statuses = [], [], set()
+    for n in range(warmup + iterations):
+        params = dict(ctx)
+        if bench_case.setup:
+            params.update(bench_case.setup(ctx, n) or {})
+        token = params.get('token') or ctx['tokens'].get(bench_case.role)
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        body = bench_case.body(params) if callable(bench_case.body) else bench_case.body
+        path = bench_case.path.format(**params)
+
+        counter['statements'] = 0
+        started = time.perf_counter()
+        response = client.open(path, method=bench_case.method, json=body, headers=headers)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        # Requests share the app context, so drop what they left in the session
+        db.session.remove()
+        statuses.add(response.status_code)
+        if n >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(counter['statements'])
+    _wait_for_background_jobs()
+
+    timings.sort()
+    return {
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'queries': int(median(queries)),
+    }, statuses
+
+
+def compare(result, baseline, tolerance, speed=1.0):
+    """Regression messages for one case; ``speed`` scales the baseline latency to this machine"""
+    if baseline is None:
+        return []
+    problems = []
+    if result['queries'] > baseline['queries']:
+        problems.append(f"queries {baseline['queries']} -> {result['queries']}")
+    # The median: tail latencies of a few dozen requests are too noisy to gate on
+    expected = baseline['p50_ms'] * speed
+    if result['p50_ms'] > expected * (1 + tolerance) and result['p50_ms'] - expected > MIN_REGRESSION_MS:
+        problems.append(f"p50 {expected:.2f}ms -> {result['p50_ms']:.2f}ms")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', default='10k', help=f"dataset size: {', '.join(SCALES)} or a number")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=30, help='timed requests per case')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed requests per case')
+    parser.add_argument('--only', help='run the cases whose name starts with this prefix')
+    parser.add_argument('--database-url', help='benchmark this database instead of a SQLite copy')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the SQLite dataset')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=1.0, help='allowed median slowdown (1.0 = twice as slow)')
+    parser.add_argument('--update-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args(argv)
+    size = SCALES[args.scale] if args.scale in SCALES else int(args.scale)
+
+    os.environ.update(BENCHMARK_ENV)
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+        app = create_app()
+        _build_if_needed(app, size, args.seed)
+    else:
+        dataset_path = _dataset_path(args)
+        if args.rebuild and os.path.exists(dataset_path):
+            os.remove(dataset_path)
+        os.environ['DATABASE_URL'] = f'sqlite:///{dataset_path}'
+        app = create_app()
+        _build_if_needed(app, size, args.seed)
+        with app.app_context():
+            db.engine.dispose()
+        run_path = os.path.join(DATA_DIR, 'run.db')
+        shutil.copyfile(dataset_path, run_path)
+        os.environ['DATABASE_URL'] = f'sqlite:///{run_path}'
+        app = create_app()
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(args.scale, {}).get('cases', {})
+    calibration = calibrate()
+    speed = calibration / baselines[args.scale]['calibration_ms'] if baseline else 1.0
+    print(f"calibration {calibration:.1f}ms, baseline latencies scaled by {speed:.2f}")
+
+    covered = {bench_case.name.split(':')[0] for bench_case in CASES}
+    uncovered = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                       if rule.endpoint != 'static' and rule.endpoint not in covered)
+
+    results, failures = {}, []
+    counter = {'statements': 0}
+    request_thread = threading.get_ident()
+
+    def count_statement(*_):
+        # Background jobs (invoice exports) run on other threads
+        if threading.get_ident() == request_thread:
+            counter['statements'] += 1
+
+    with app.app_context(), mock.patch('random.random', return_value=0.0):
+        client = app.test_client()
+        ctx = _context(client)
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        print(f"{'case':48s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'queries':>7s}  baseline p50")
+        for bench_case in CASES:
+            if args.only and not bench_case.name.startswith(args.only):
+                continue
+            result, statuses = run_case(client, ctx, bench_case, args.requests, args.warmup, counter)
+            results[bench_case.name] = result
+            problems = compare(result, baseline.get(bench_case.name), args.tolerance, speed)
+            if statuses != {bench_case.status}:
+                problems.append(f"status {sorted(statuses)}, expected {bench_case.status}")
+            if problems:
+                failures.append(f"{bench_case.name}: {'; '.join(problems)}")
+            base = baseline.get(bench_case.name)
+            base_p50 = f"{base['p50_ms'] * speed:.2f}ms" if base else 'new'
+            print(f"{bench_case.name:48s} {result['p50_ms']:8.2f}ms {result['p95_ms']:8.2f}ms "
+                  f"{result['p99_ms']:8.2f}ms {result['queries']:7d}  {base_p50:>10s}"
+                  f"{'  REGRESSION' if problems else ''}")
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'scale': args.scale, 'requests': args.requests, 'cases': results}, f, indent=2)
+    if args.update_baseline:
+        # Keep the cases this run skipped, rescaled to this machine's calibration
+        cases = {
+            name: {key: round(value * speed, 3) if key.endswith('_ms') else value for key, value in result.items()}
+            for name, result in baseline.items()
+        } if args.only else {}
+        cases.update(results)
+        baselines[args.scale] = {'requests': args.requests, 'calibration_ms': calibration, 'cases': cases}
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"updated the {args.scale} baseline in {args.baseline}")
+        failures = [failure for failure in failures if 'status' in failure]
+
+    for endpoint in uncovered:
+        failures.append(f'{endpoint}: no benchmark case')
+    if failures:
+        print('FAILED:')
+        for failure in failures:
+            print(f'  {failure}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
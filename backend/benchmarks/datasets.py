@@ -0,0 +1,32 @@
+"""Deterministic datasets for the API benchmarks.
+
+build_dataset(size, seed) runs the data generator (app.datagen) on an empty
+database with ``size`` products, orders and cart rows and ``size // 10``
+customers. Given the same size, seed and end date, it writes the same rows.
+
+ADMIN_EMAIL is an admin; CUSTOMER_EMAIL owns DEMO_CUSTOMER_ORDERS of the
+orders and a few cart items, and is the customer the benchmarks act as.
+PASSWORDS maps each of them to its password.
+"""
+from app.datagen import DEMO_ADMIN, DEMO_CUSTOMER, generate_data
+
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+# Part of the cached dataset's file name; bump it when the generated rows change
+DATASET_VERSION = 2
+
+ADMIN_EMAIL, CUSTOMER_EMAIL = DEMO_ADMIN[0], DEMO_CUSTOMER[0]
+PASSWORDS = dict([DEMO_ADMIN, DEMO_CUSTOMER])
+
+
+def build_dataset(size, seed=42, end=None):
+    """Fill an empty database with a dataset of ``size`` products, orders and cart rows"""
+    return generate_data(
+        users=max(100, size // 10),
+        categories=min(200, max(10, size // 1000)),
+        products=size,
+        carts=size,
+        orders=size,
+        seed=seed,
+        end=end,
+    )
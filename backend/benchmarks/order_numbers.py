@@ -0,0 +1,80 @@
+"""Benchmark order number generation under parallel load.
+
+Usage (from the backend directory):
+    python -m benchmarks.order_numbers --processes 8 --count 200000
+    python -m benchmarks.order_numbers --processes 8 --fixed-node-ids
+
+Every process generates ``count`` numbers as fast as it can. By default each
+process leases its node id from a scratch SQLite database, the way workers do
+in production; with --fixed-node-ids process i uses node id i instead. The
+run fails if any number is repeated across processes or if a process ever
+produced a number that does not sort after its predecessor.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from app import create_app, db
+from app.order_numbers import OrderNumberGenerator
+
+
+def _generate(count, node_id=None):
+    if node_id is None:
+        # Forked workers inherit DATABASE_URL pointing at the scratch database
+        with create_app().app_context():
+            return _run(OrderNumberGenerator(), count)
+    return _run(OrderNumberGenerator(node_id=node_id), count)
+
+
+def _run(generator, count):
+    started = time.perf_counter()
+    numbers = [generator.next() for _ in range(count)]
+    elapsed = time.perf_counter() - started
+    monotonic = all(a < b for a, b in zip(numbers, numbers[1:]))
+    return generator.node_id, numbers, elapsed, monotonic
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--count', type=int, default=100000, help='numbers per process')
+    parser.add_argument('--fixed-node-ids', action='store_true',
+                        help='give process i node id i instead of leasing one')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.fixed_node_ids:
+            jobs = [(args.count, node_id) for node_id in range(args.processes)]
+        else:
+            os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'order_numbers.db')}"
+            with create_app().app_context():
+                db.create_all()
+            jobs = [(args.count, None)] * args.processes
+
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(_generate, jobs)
+        wall = time.perf_counter() - started
+
+    total = args.processes * args.count
+    unique = len({number for _, numbers, _, _ in results for number in numbers})
+    node_ids = [node_id for node_id, _, _, _ in results]
+    all_monotonic = all(monotonic for _, _, _, monotonic in results)
+
+    for node_id, _, elapsed, monotonic in results:
+        print(f"node {node_id:4d}: {args.count / elapsed:,.0f} numbers/s, monotonic={monotonic}")
+    print(f"generated {total:,} numbers in {wall:.2f}s across {args.processes} processes "
+          f"({total / wall:,.0f} numbers/s)")
+    print(f"unique: {unique:,} / {total:,}  distinct node ids: {len(set(node_ids))}")
+
+    if unique != total or not all_monotonic:
+        print("FAILED: duplicate or out-of-order order numbers")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
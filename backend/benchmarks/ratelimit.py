@@ -0,0 +1,63 @@
+"""Benchmark the cost of a rate limit check.
+
+Usage (from the backend directory):
+    python -m benchmarks.ratelimit --clients 10000 --checks 200000 --threads 4
+
+Each thread takes tokens for random clients from one shared backend. The
+run reports microseconds per check for the in-memory backend and, with
+``--sqlite PATH``, for the shared SQLite backend too.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+from app.ratelimit import MemoryBackend, RateLimiter, SQLiteBackend
+
+
+LIMITS = {'auth.login': ['ip:10/minute'], 'cart': ['user:60/minute;burst=20']}
+
+
+def _run(limiter, clients, checks, seed):
+    rng = random.Random(seed)
+    rules = limiter.rules_for('auth.login', 'auth')
+    for _ in range(checks):
+        client = rng.randrange(clients)
+        limiter.hit(rules, 'auth.login', f'10.{client >> 16}.{client >> 8 & 255}.{client & 255}')
+
+
+def bench(backend, clients, checks, threads):
+    limiter = RateLimiter(LIMITS, backend)
+    workers = [
+        threading.Thread(target=_run, args=(limiter, clients, checks // threads, seed))
+        for seed in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--sqlite', help='benchmark the SQLite backend on this file too')
+    args = parser.parse_args(argv)
+
+    backends = [('memory', MemoryBackend())]
+    if args.sqlite:
+        backends.append(('sqlite', SQLiteBackend(args.sqlite)))
+    for name, backend in backends:
+        micros = bench(backend, args.clients, args.checks, args.threads)
+        print(f"{name:6s}: {micros:.2f} us/check over {args.checks:,} checks, "
+              f"{args.clients:,} clients, {args.threads} threads")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
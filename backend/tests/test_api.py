@@ -1,19 +1,51 @@
+import csv
+import gzip
+import io
+import json
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
 from app import create_app, db
-from app.models import User, Product, Category, Order
+from app.models import User, Product, Category, Order, OrderItem, InvoiceExport, OutboxEvent, RevokedToken, OrderNumberNode, SearchTrigram, CustomerStats, StockAlert, DailySales, DailyProductSales, DailyCategorySales, DailyOrderBreakdown
+from app.events import _handlers, dispatch_batch, record_order_event, register_handler
+from app.order_archive import load_archived_order
+from app.order_numbers import NODE_LEASE_SECONDS, OrderNumberGenerator
+from app.pricing import cart_view_cache
+from app.promotions import invalidate_promotion_index
+from app.dashboard import dashboard_cache
+from app.principals import principal_cache
+from app.ratelimit import MemoryBackend, RateLimiter, parse_rule
+from app.revocation import revocation_filter
+from app import passwords
+from app.snapshots import write_snapshot
+from app.rollups import ROLLUP_MODELS, rebuild_rollups, record_order_created
 
 
 @pytest.fixture
-def app():
+def app(tmp_path):
     """Create application for testing."""
     app = create_app()
     app.config['TESTING'] = True
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['BCRYPT_ROUNDS'] = 4
+    app.config['REVOCATION_FILTER_REFRESH'] = 3600
+    app.config['INVOICE_CACHE_DIR'] = str(tmp_path / 'invoices')
+    app.config['INVOICE_PRERENDER'] = False
     
     with app.app_context():
         db.create_all()
         yield app
         db.drop_all()
+    cart_view_cache.clear()
+    dashboard_cache.clear()
+    principal_cache.clear()
+    revocation_filter.clear()
+    invalidate_promotion_index()
 
 
 @pytest.fixture
@@ -83,3 +115,1021 @@ def test_categories_endpoint(client):
     response = client.get('/api/products/categories')
     assert response.status_code == 200
     assert 'categories' in response.json
+
+
+def test_order_numbers_unique_and_sortable():
+    """Test order numbers stay unique and ordered when the clock stands still."""
+    generator = OrderNumberGenerator(node_id=7, clock=lambda: 1700000000.0)
+    numbers = [generator.next() for _ in range(10000)]
+    assert len(set(numbers)) == len(numbers)
+    assert numbers == sorted(numbers)
+    assert all(number.startswith('EMP20231114') for number in numbers)
+
+
+def test_order_number_node_ids_are_leased_per_process(app):
+    """Test generators without a node id lease distinct ids and take over only expired leases."""
+    first, second = OrderNumberGenerator(), OrderNumberGenerator()
+    first.next()
+    second.next()
+    assert {first.node_id, second.node_id} == {0, 1}
+
+    # An expired lease is reused; its old holder notices on renewal and leases another id
+    OrderNumberNode.query.filter_by(node_id=0).update(
+        {'renewed_at': datetime.utcnow() - timedelta(seconds=NODE_LEASE_SECONDS + 1)}
+    )
+    db.session.commit()
+    third = OrderNumberGenerator()
+    third.next()
+    assert third.node_id == 0
+    owner = first if first.node_id == 0 else second
+    owner._renewed_at -= 3600
+    owner.next()
+    assert owner.node_id == 2
+    assert OrderNumberNode.query.count() == 3
+
+
+def _promote_to_admin(client, user):
+    """Make ``user`` an admin and return headers with a token carrying the admin claim."""
+    user.is_admin = True
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'email': user.email, 'password': 'testpass123'})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+
+def _create_catalog(count=3):
+    """Create a category with ``count`` active products."""
+    category = Category(name='Tops')
+    db.session.add(category)
+    db.session.flush()
+    products = [
+        Product(
+            name=f'Product {i}',
+            price=10 + i,
+            sku=f'SKU-{i}',
+            stock_quantity=50,
+            category_id=category.id,
+            primary_image=f'img-{i}.jpg'
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+
+def _create_orders(user, products, count, snapshot=True):
+    """Create ``count`` orders for ``user`` containing every product."""
+    for n in range(count):
+        order = Order(
+            user_id=user.id,
+            order_number=f'EMPTEST{user.id}-{n:05d}',
+            status='confirmed',
+            subtotal=10,
+            total_amount=10.8
+        )
+        db.session.add(order)
+        db.session.flush()
+        for product in products:
+            order_item = OrderItem(
+                order_id=order.id,
+                product_id=product.id,
+                quantity=2,
+                unit_price=product.price,
+                total_price=product.price * 2
+            )
+            if snapshot:
+                order_item.snapshot_product(product)
+            db.session.add(order_item)
+    db.session.commit()
+
+
+def _count_queries(app, func):
+    """Run ``func`` and return its result with the number of SQL statements issued."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, len(statements)
+
+
+def test_order_history_views(app, client, auth_headers):
+    """Test order history summary view and constant query count of the full view."""
+    user = User.query.filter_by(email='test@example.com').first()
+    products = _create_catalog()
+    _create_orders(user, products, 5)
+
+    response, summary_queries = _count_queries(
+        app, lambda: client.get('/api/orders?view=summary', headers=auth_headers)
+    )
+    assert response.status_code == 200
+    summary = response.json['orders'][0]
+    assert summary['item_count'] == 6
+    assert summary['thumbnail'] == 'img-0.jpg'
+    assert 'order_items' not in summary
+
+    response, few_orders_queries = _count_queries(
+        app, lambda: client.get('/api/orders?per_page=2', headers=auth_headers)
+    )
+    assert response.status_code == 200
+    assert len(response.json['orders'][0]['order_items']) == 3
+
+    response, many_orders_queries = _count_queries(
+        app, lambda: client.get('/api/orders?per_page=5', headers=auth_headers)
+    )
+    assert many_orders_queries == few_orders_queries
+    assert summary_queries < few_orders_queries
+
+
+def test_order_item_snapshot_backfill(app, client, auth_headers):
+    """Test backfilled product snapshots survive later product changes."""
+    user = User.query.filter_by(email='test@example.com').first()
+    products = _create_catalog(count=1)
+    _create_orders(user, products, 1, snapshot=False)
+
+    result = app.test_cli_runner().invoke(args=['orders', 'snapshot-items', '--batch-size', '1'])
+    assert result.exit_code == 0
+    assert OrderItem.query.first().product_sku == 'SKU-0'
+
+    products[0].name = 'Renamed'
+    products[0].is_active = False
+    db.session.commit()
+
+    response = client.get('/api/orders', headers=auth_headers)
+    item = response.json['orders'][0]['order_items'][0]
+    assert item['product']['name'] == 'Product 0'
+    assert item['product']['primary_image'] == 'img-0.jpg'
+
+
+def test_invoice_pdf_is_cached(app, client, auth_headers, tmp_path):
+    """Test invoice PDFs are rendered once and served with immutable caching."""
+    app.config['INVOICE_CACHE_DIR'] = str(tmp_path)
+    user = User.query.filter_by(email='test@example.com').first()
+    _create_orders(user, _create_catalog(), 1)
+    order = Order.query.first()
+
+    response = client.get(f'/api/orders/invoice/{order.id}.pdf', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.data.startswith(b'%PDF-')
+    assert 'immutable' in response.headers['Cache-Control']
+    assert len(list(tmp_path.rglob('*.pdf'))) == 1
+
+    response = client.get(
+        f'/api/orders/invoice/{order.id}.pdf',
+        headers={**auth_headers, 'If-None-Match': response.headers['ETag']}
+    )
+    assert response.status_code == 304
+
+
+def test_invoice_batch_export(app, tmp_path):
+    """Test the invoice export job writes one PDF per order into a ZIP."""
+    app.config['INVOICE_CACHE_DIR'] = str(tmp_path / 'cache')
+    app.config['INVOICE_EXPORT_DIR'] = str(tmp_path / 'exports')
+    app.config['INVOICE_EXPORT_WORKERS'] = 1
+    app.config['INVOICE_EXPORT_BATCH_SIZE'] = 2
+    user = User(email='buyer@example.com', first_name='B', last_name='Uyer')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    _create_orders(user, _create_catalog(), 3)
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+
+    result = app.test_cli_runner().invoke(args=['orders', 'export-invoices', today, today])
+    assert result.exit_code == 0, result.output
+
+    export = InvoiceExport.query.first()
+    assert export.status == 'completed'
+    assert export.processed_orders == 3
+    with zipfile.ZipFile(export.file_path) as archive:
+        names = archive.namelist()
+    assert sorted(names) == sorted(f'INV-{order.order_number}.pdf' for order in Order.query.all())
+
+
+def test_archive_old_orders(app, client, auth_headers):
+    """Test orders past the retention window move to the compressed archive."""
+    user = User.query.filter_by(email='test@example.com').first()
+    _create_orders(user, _create_catalog(), 2)
+    old_order, recent_order = Order.query.order_by(Order.id).all()
+    old_order.created_at = datetime.utcnow() - timedelta(days=800)
+    db.session.commit()
+    old_order_id, recent_order_id, user_id = old_order.id, recent_order.id, user.id
+    old_day = old_order.created_at.date()
+    rebuild_rollups(old_day, old_day)
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['orders', 'archive', '--retention-days', '365'])
+    assert result.exit_code == 0, result.output
+
+    assert [order.id for order in Order.query.all()] == [recent_order_id]
+    assert OrderItem.query.filter_by(order_id=old_order_id).count() == 0
+    assert OrderItem.query.filter_by(order_id=recent_order_id).first().order_created_at is not None
+
+    response = client.get(f'/api/orders/{old_order_id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['archived'] is True
+    assert len(response.json['order']['order_items']) == 3
+    # Amounts come back exactly as stored, not as floats
+    assert response.json['order']['total_amount'] == '10.80'
+    assert load_archived_order(old_order_id)['order_items'][0]['unit_price'] == Decimal('10.00')
+
+    # Rebuilding the archived day would lose its orders, so it is kept
+    assert rebuild_rollups(old_day, old_day) is None
+    db.session.commit()
+    assert DailySales.query.filter_by(day=old_day).one().orders_count == 1
+
+    # Customer statistics still count the archived order
+    result = app.test_cli_runner().invoke(args=['customers', 'refresh-stats'])
+    assert result.exit_code == 0, result.output
+    stats = CustomerStats.query.filter_by(user_id=user_id).one()
+    assert (stats.orders_count, float(stats.lifetime_value)) == (2, 21.6)
+    assert stats.first_order_at.date() == old_day
+
+
+def test_cancel_restores_stock(app, client, auth_headers):
+    """Test cancelling orders restores stock once, including single and bulk admin cancels."""
+    user = User.query.filter_by(email='test@example.com').first()
+    products = _create_catalog()
+    _create_orders(user, products, 4)
+    first, second, third, fourth = [order.id for order in Order.query.order_by(Order.id)]
+
+    response = client.put(f'/api/orders/{first}/cancel', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['order']['status'] == 'cancelled'
+    response = client.put(f'/api/orders/{first}/cancel', headers=auth_headers)
+    assert response.status_code == 400
+
+    auth_headers = _promote_to_admin(client, user)
+    db.session.commit()
+    response = client.post(
+        '/api/admin/orders/cancel',
+        json={'order_ids': [first, second, third, 999]},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json['cancelled'] == [second, third]
+    assert response.json['skipped'] == [first, 999]
+
+    # The single-order endpoint follows the allowed transitions too
+    response = client.put(f'/api/admin/orders/{fourth}', json={'status': 'delivered'}, headers=auth_headers)
+    assert response.status_code == 400
+    response = client.put(f'/api/admin/orders/{fourth}', json={'status': 'cancelled'}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json['order']['status'] == 'cancelled'
+    assert OutboxEvent.query.filter_by(event_type='order.cancelled').count() == 4
+
+    db.session.expire_all()
+    assert [product.stock_quantity for product in Product.query.order_by(Product.id)] == [58, 58, 58]
+
+
+def test_outbox_dispatch_with_retries(app, client, auth_headers):
+    """Test order events are written with state changes and retried on failure."""
+    user = User.query.filter_by(email='test@example.com').first()
+    _create_orders(user, _create_catalog(), 1)
+    order_id = Order.query.first().id
+    client.put(f'/api/orders/{order_id}/cancel', headers=auth_headers)
+
+    event = OutboxEvent.query.one()
+    assert event.event_type == 'order.cancelled'
+    assert event.payload['order_id'] == order_id
+
+    received = []
+    failures = []
+
+    def flaky_handler(message):
+        if not failures:
+            failures.append(message['id'])
+            raise RuntimeError('downstream unavailable')
+        received.append(message)
+
+    register_handler('order.cancelled', flaky_handler)
+    try:
+        assert dispatch_batch() == 1
+        db.session.expire_all()
+        assert event.status == 'pending' and event.attempts == 1
+
+        event.available_at = datetime.utcnow()
+        db.session.commit()
+        assert dispatch_batch() == 1
+        db.session.expire_all()
+        assert event.status == 'delivered'
+        assert [message['payload']['status'] for message in received] == ['cancelled']
+    finally:
+        _handlers['order.cancelled'].remove(flaky_handler)
+
+
+ADDRESS = {
+    'first_name': 'Test', 'last_name': 'User', 'address_line1': '1 Main St',
+    'city': 'Nairobi', 'state': 'NA', 'postal_code': '00100', 'country': 'KE'
+}
+
+PAYMENT = {
+    'payment_method': 'credit_card', 'card_number': '4111111111111111',
+    'expiry_month': 1, 'expiry_year': 2030, 'cvv': '123'
+}
+
+
+def _checkout(client, headers, **extra):
+    # The simulated payment gateway declines 5% of payments at random
+    with mock.patch('random.random', return_value=0.0):
+        return client.post('/api/orders', json={
+            'shipping_address': ADDRESS, 'billing_address': ADDRESS, 'payment_info': PAYMENT, **extra
+        }, headers=headers)
+
+
+def test_cart_validate_and_order_totals_agree(app, client, auth_headers):
+    """Test the cart, checkout validation and created order use the same pricing."""
+    products = _create_catalog()
+    products[0].price = 19.99
+    products[1].price = 0.15
+    db.session.commit()
+    for product, quantity in zip(products, [3, 7, 1]):
+        client.post('/api/cart', json={'product_id': product.id, 'quantity': quantity}, headers=auth_headers)
+
+    summary = client.get('/api/cart', headers=auth_headers).json['summary']
+    assert summary == {'total_items': 11, 'subtotal': 73.02, 'discount': 0.0, 'estimated_tax': 5.84, 'estimated_total': 78.86}
+
+    # A price change invalidates the cached cart view
+    products[2].price = 13
+    db.session.commit()
+    summary = client.get('/api/cart', headers=auth_headers).json['summary']
+    assert summary['subtotal'] == 74.02
+
+    validated = client.post('/api/cart/validate', headers=auth_headers).json['summary']
+    assert validated == {'subtotal': 74.02, 'discount': 0.0, 'tax': 5.92, 'total': 79.94}
+
+    response = _checkout(client, auth_headers)
+    assert response.status_code == 201
+    order = response.json['order']
+    assert float(order['subtotal']) == 74.02
+    assert float(order['total_amount']) == 79.94
+
+
+def test_promotions_and_coupons(app, client, auth_headers):
+    """Test promotions are matched by product attributes and coupons apply at checkout."""
+    user = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, user)
+    products = _create_catalog()
+    products[0].brand = 'Acme'
+    products[1].tags = ['Summer', 'linen']
+    db.session.commit()
+    for product, quantity in zip(products, [2, 1, 3]):
+        client.post('/api/cart', json={'product_id': product.id, 'quantity': quantity}, headers=auth_headers)
+
+    assert client.get('/api/cart', headers=auth_headers).json['summary']['discount'] == 0.0
+
+    for promotion in [
+        {'name': 'Acme week', 'kind': 'percentage', 'value': 10, 'scope': 'brand', 'scope_value': 'acme'},
+        {'name': 'Summer', 'kind': 'fixed', 'value': 2.5, 'scope': 'tag', 'scope_value': 'summer'},
+        {'name': '3 for 2', 'kind': 'bxgy', 'buy_quantity': 2, 'get_quantity': 1, 'scope': 'sku', 'scope_value': 'SKU-2'},
+        {'name': 'Expired', 'kind': 'percentage', 'value': 90, 'ends_at': '2000-01-01'},
+        {'name': 'Welcome', 'kind': 'percentage', 'value': 50, 'scope': 'category',
+         'scope_value': str(products[0].category_id), 'coupon_code': 'welcome'},
+    ]:
+        response = client.post('/api/admin/promotions', json=promotion, headers=auth_headers)
+        assert response.status_code == 201
+    assert client.post('/api/admin/promotions', json={'name': 'Bad', 'kind': 'bxgy'}, headers=auth_headers).status_code == 400
+    for bad in ({'value': 'NaN'}, {'value': 'Infinity'}, {'is_active': 'false'}, {'name': 7}, {'coupon_code': 5}):
+        body = {'name': 'Bad', 'kind': 'fixed', 'value': 5, **bad}
+        assert client.post('/api/admin/promotions', json=body, headers=auth_headers).status_code == 400
+
+    # 10% of 20.00, 2.50 off 11.00, one of three 12.00 units free
+    summary = client.get('/api/cart', headers=auth_headers).json['summary']
+    assert summary['subtotal'] == 67.0
+    assert summary['discount'] == 16.5
+
+    assert _checkout(client, auth_headers, coupon_code='NOPE').status_code == 400
+    for bad_code in (123, ['WELCOME']):
+        assert _checkout(client, auth_headers, coupon_code=bad_code).status_code == 400
+        response = client.post('/api/cart/validate', json={'coupon_code': bad_code}, headers=auth_headers)
+        assert response.status_code == 400
+
+    # The coupon beats the automatic promotions on every line
+    response = _checkout(client, auth_headers, coupon_code='Welcome')
+    assert response.status_code == 201
+    assert float(response.json['order']['discount_amount']) == 33.5
+    assert float(response.json['order']['total_amount']) == 36.18
+
+    event = OutboxEvent.query.filter_by(event_type='order.created').one()
+    assert event.payload['coupon_code'] == 'WELCOME'
+
+
+def _rollup_rows():
+    rows = {}
+    for model in ROLLUP_MODELS:
+        columns = model.__table__.columns
+        # Status buckets emptied by a status change stay behind with zero orders
+        rows[model.__tablename__] = sorted(
+            tuple(str(getattr(row, column.key)) for column in columns)
+            for row in model.query.all() if getattr(row, 'orders_count', 1)
+        )
+    return rows
+
+
+def test_sales_rollups(app, client, auth_headers):
+    """Test rollups follow checkouts and status changes and match a full rebuild."""
+    user = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, user)
+    products = _create_catalog()
+    db.session.commit()
+
+    order_ids = []
+    for quantities in ([1, 2, 0], [0, 1, 3]):
+        for product, quantity in zip(products, quantities):
+            if quantity:
+                client.post('/api/cart', json={'product_id': product.id, 'quantity': quantity}, headers=auth_headers)
+        order_ids.append(_checkout(client, auth_headers).json['order']['id'])
+
+    client.put(f'/api/orders/{order_ids[0]}/cancel', headers=auth_headers)
+    client.put(f'/api/admin/orders/{order_ids[1]}', json={'status': 'shipped'}, headers=auth_headers)
+
+    today = DailySales.query.one()
+    assert (today.orders_count, today.paid_orders_count, today.units_sold) == (2, 2, 7)
+    assert float(today.revenue) == 85.32
+
+    analytics = client.get('/api/admin/analytics/orders', headers=auth_headers).json
+    assert analytics['summary']['total_orders'] == 2
+    assert analytics['status_distribution'] == {'cancelled': 1, 'shipped': 1}
+    assert analytics['payment_distribution'] == {'credit_card': 2}
+
+    products_analytics = client.get('/api/admin/analytics/products', headers=auth_headers).json
+    assert {p['product_id']: p['total_sold'] for p in products_analytics['top_products']} == {
+        products[0].id: 1, products[1].id: 3, products[2].id: 3
+    }
+    assert products_analytics['category_performance'][0]['items_sold'] == 4
+
+    dashboard = client.get('/api/admin/dashboard', headers=auth_headers).json
+    assert dashboard['totals']['orders'] == 2
+    assert dashboard['order_status_distribution'] == {'cancelled': 1, 'shipped': 1}
+
+    # The catch-up job recomputes exactly what the incremental updates built
+    incremental = _rollup_rows()
+    rebuild_rollups(today.day, today.day)
+    db.session.commit()
+    assert _rollup_rows() == incremental
+
+    # Product sales only count paid orders, on the dashboard as in analytics
+    unpaid = Order(user_id=user.id, order_number='EMPUNPAID', status='pending', payment_status='pending',
+                   subtotal=100, total_amount=100, created_at=datetime.utcnow())
+    db.session.add(unpaid)
+    db.session.flush()
+    item = OrderItem(order_id=unpaid.id, product_id=products[2].id, quantity=10, unit_price=10, total_price=100)
+    db.session.add(item)
+    db.session.flush()
+    record_order_created(unpaid, [item])
+    db.session.commit()
+    dashboard_cache.clear()
+    dashboard = client.get('/api/admin/dashboard', headers=auth_headers).json
+    assert dashboard['totals']['orders'] == 3
+    assert {p['product_id']: p['total_sold'] for p in dashboard['top_products']} == {
+        products[0].id: 1, products[1].id: 3, products[2].id: 3
+    }
+    products_analytics = client.get('/api/admin/analytics/products', headers=auth_headers).json
+    assert products_analytics['top_products'][0]['total_sold'] == 3
+
+
+def test_dashboard_is_cached_single_flight(app, client, auth_headers):
+    """Test the dashboard uses a few aggregate queries and concurrent loads compute it once."""
+    user = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, user)
+    for product, quantity in zip(_create_catalog(), [1, 2, 3]):
+        client.post('/api/cart', json={'product_id': product.id, 'quantity': quantity}, headers=auth_headers)
+    _checkout(client, auth_headers)
+
+    response, queries = _count_queries(app, lambda: client.get('/api/admin/dashboard', headers=auth_headers))
+    assert response.status_code == 200
+    # Admin check plus four dashboard queries
+    assert queries <= 5
+    assert response.json['totals'] == {'users': 1, 'products': 3, 'orders': 1, 'revenue': 73.44}
+    assert response.json['recent_stats']['new_users'] == 1
+    assert response.json['order_status_distribution'] == {'confirmed': 1}
+
+    # Served from the cache: at most the admin check hits the database
+    _, queries = _count_queries(app, lambda: client.get('/api/admin/dashboard', headers=auth_headers))
+    assert queries <= 1
+
+    dashboard_cache.clear()
+    calls = []
+    started = threading.Event()
+
+    def slow_compute():
+        calls.append(1)
+        started.wait(1)
+        return {'computed': len(calls)}
+
+    threads = [
+        threading.Thread(target=lambda: results.append(dashboard_cache.get_or_compute('key', slow_compute)))
+        for _ in range(8)
+    ]
+    results = []
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [{'computed': 1}] * 8
+
+
+def test_streaming_order_and_user_exports(app, client, auth_headers):
+    """Test exports stream flattened order items and honour the admin filters."""
+    user = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, user)
+    products = _create_catalog(2)
+    _create_orders(user, products, 3)
+    Order.query.first().status = 'shipped'
+    db.session.commit()
+
+    response = client.get('/api/admin/orders/export?status=confirmed', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 4
+    assert {row['status'] for row in rows} == {'confirmed'}
+    assert rows[0]['customer_email'] == 'test@example.com'
+    assert (rows[0]['item_sku'], rows[0]['item_quantity'], rows[0]['total_amount']) == ('SKU-0', '2', '10.80')
+
+    response = client.get('/api/admin/orders/export?format=ndjson&gzip=true&search=test%40example', headers=auth_headers)
+    assert response.mimetype == 'application/gzip'
+    orders = [json.loads(line) for line in gzip.decompress(response.data).decode('utf-8').splitlines()]
+    assert len(orders) == 3
+    assert [item['sku'] for item in orders[0]['items']] == ['SKU-0', 'SKU-1']
+
+    response = client.get('/api/admin/users/export?format=ndjson&role=admin', headers=auth_headers)
+    users = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(u['email'], u['is_admin']) for u in users] == [('test@example.com', True)]
+    assert 'password_hash' not in users[0]
+
+    assert client.get('/api/admin/orders/export?format=xml', headers=auth_headers).status_code == 400
+
+
+def test_columnar_snapshot_analytics(app, client, auth_headers, tmp_path):
+    """Test cohort, RFM and basket analytics are computed from the snapshot files only."""
+    app.config['ANALYTICS_SNAPSHOT_DIR'] = str(tmp_path)
+    admin = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, admin)
+    assert client.get('/api/admin/analytics/cohorts', headers=auth_headers).status_code == 503
+
+    customer = User(email='c@example.com', first_name='C', last_name='D', password_hash='x')
+    db.session.add(customer)
+    products = _create_catalog(2)
+    _create_orders(admin, products, 3)
+    _create_orders(customer, products[:1], 1)
+    orders = Order.query.order_by(Order.id).all()
+    # The admin ordered in January and March; the customer only in February
+    for order, created_at in zip(orders, ['2026-01-05', '2026-03-10', '2026-03-20', '2026-02-01']):
+        order.created_at = datetime.fromisoformat(created_at)
+    orders[2].status = 'cancelled'
+    db.session.commit()
+
+    write_snapshot()
+
+    response, queries = _count_queries(app, lambda: client.get('/api/admin/analytics/cohorts?months=3', headers=auth_headers))
+    assert queries <= 1
+    assert response.json['cohorts'] == [
+        {'cohort': '2026-01', 'customers': 1, 'retention': [1.0, 0.0, 1.0]},
+        {'cohort': '2026-02', 'customers': 1, 'retention': [1.0, 0.0, 0.0]},
+    ]
+
+    baskets = client.get('/api/admin/analytics/baskets', headers=auth_headers).json['baskets']
+    assert baskets['orders'] == 3
+    assert baskets['units_distribution'] == {'2': 1, '4': 2}
+    assert baskets['avg_distinct_products'] == round(5 / 3, 2)
+
+    rfm = client.get('/api/admin/analytics/rfm', headers=auth_headers).json['rfm']
+    assert rfm['customers'] == 2
+    assert sum(segment['customers'] for segment in rfm['segments'].values()) == 2
+
+
+def test_low_stock_alerts(app, client, auth_headers):
+    """Test stock alerts open and resolve as stock crosses per-category and per-product thresholds."""
+    user = User.query.filter_by(email='test@example.com').first()
+    products = _create_catalog()
+    products[0].stock_quantity = 12
+    db.session.commit()
+    assert StockAlert.query.count() == 0
+
+    client.post('/api/cart', json={'product_id': products[0].id, 'quantity': 3}, headers=auth_headers)
+    order_id = _checkout(client, auth_headers).json['order']['id']
+    alert = StockAlert.query.one()
+    assert (alert.product_id, alert.threshold, alert.stock_quantity, alert.resolved_at) == (products[0].id, 10, 9, None)
+
+    client.put(f'/api/orders/{order_id}/cancel', headers=auth_headers)
+    db.session.expire_all()
+    assert alert.resolved_at is not None and alert.resolved_stock_quantity == 12
+
+    auth_headers = _promote_to_admin(client, user)
+    db.session.commit()
+    category_id = products[0].category_id
+    response = client.put(f'/api/admin/categories/{category_id}/reorder-threshold',
+                          json={'reorder_threshold': 60}, headers=auth_headers)
+    assert (response.json['alerts_opened'], response.json['alerts_resolved']) == (3, 0)
+    response = client.put(f'/api/products/{products[1].id}', json={'reorder_threshold': 5}, headers=auth_headers)
+    assert response.json['product']['low_stock_threshold'] == 5
+
+    response = client.get('/api/admin/inventory/alerts', headers=auth_headers)
+    assert sorted(a['product']['sku'] for a in response.json['alerts']) == ['SKU-0', 'SKU-2']
+    response = client.get('/api/admin/inventory/alerts?status=all', headers=auth_headers)
+    assert response.json['pagination']['total'] == 4
+
+    # Stock changed outside the app is picked up by the scanner
+    db.session.execute(db.update(Product).where(Product.id == products[2].id).values(stock_quantity=100))
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['inventory', 'scan-stock', '--once'])
+    assert 'Opened 0 and resolved 1' in result.output
+
+    analytics = client.get('/api/admin/analytics/products', headers=auth_headers).json
+    assert [p['id'] for p in analytics['low_stock_products']] == [products[0].id]
+
+
+def test_admin_search_uses_trigram_index(app, client, auth_headers):
+    """Test admin order and customer search: exact fast paths, trigram matches and reindexing."""
+    admin = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, admin)
+    alice = User(email='alice.smith@example.com', first_name='Alice', last_name='Smith')
+    bob = User(email='bob@smithson.io', first_name='Bob', last_name='Smithson')
+    carol = User(email='carol@example.com', first_name='Carol', last_name='Jones')
+    for user in (alice, bob, carol):
+        user.set_password('password123')
+    db.session.add_all([alice, bob, carol])
+    db.session.commit()
+    products = _create_catalog(1)
+    _create_orders(alice, products, 2)
+    _create_orders(carol, products, 1)
+
+    def users(search):
+        response = client.get('/api/admin/users', query_string={'search': search}, headers=auth_headers)
+        return [user['email'] for user in response.json['users']]
+
+    def orders(search):
+        response = client.get('/api/admin/orders', query_string={'search': search, 'view': 'summary'}, headers=auth_headers)
+        return sorted(order['order_number'] for order in response.json['orders'])
+
+    # Shorter matching documents rank first
+    assert users('SMITH') == ['bob@smithson.io', 'alice.smith@example.com']
+    assert users('Carol@Example.com') == ['carol@example.com']
+    assert sorted(users('le')) == ['alice.smith@example.com', 'carol@example.com', 'test@example.com']
+    assert users('100%') == []
+
+    assert orders(f'EMPTEST{alice.id}-00001') == [f'EMPTEST{alice.id}-00001']
+    assert orders(f'test{alice.id}-0') == [f'EMPTEST{alice.id}-00000', f'EMPTEST{alice.id}-00001']
+    assert orders('jones') == [f'EMPTEST{carol.id}-00000']
+
+    carol.last_name = 'Baker'
+    db.session.commit()
+    assert orders('jones') == []
+    assert orders('baker') == [f'EMPTEST{carol.id}-00000']
+
+    db.session.execute(db.delete(SearchTrigram))
+    db.session.commit()
+    assert users('smith') == []
+    result = app.test_cli_runner().invoke(args=['search', 'init-index'])
+    assert 'Indexed 3 orders and 4 users' in result.output
+    assert users('smith') == ['bob@smithson.io', 'alice.smith@example.com']
+
+
+def test_bulk_order_status_transitions(app, client, auth_headers):
+    """Test bulk transitions validate each order and stamp shipped_at once, set-based."""
+    user = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, user)
+    products = _create_catalog(1)
+    _create_orders(user, products, 4)
+    first, second, third, fourth = Order.query.order_by(Order.id).all()
+    fourth.status = 'delivered'
+    db.session.commit()
+    first_number = first.order_number
+
+    response, queries = _count_queries(app, lambda: client.post('/api/admin/orders/status', json={
+        'status': 'shipped',
+        'order_ids': [first.id, second.id, fourth.id, 999],
+        'order_numbers': [third.order_number, 'EMP-MISSING']
+    }, headers=auth_headers))
+    assert response.status_code == 200
+    assert response.json['updated'] == 3
+    assert response.json['results'][0] == {
+        'result': 'updated', 'order_id': first.id, 'order_number': first_number,
+        'previous_status': 'confirmed', 'status': 'shipped'
+    }
+    assert [r['result'] for r in response.json['results']] == [
+        'updated', 'updated', 'updated', 'invalid_transition', 'not_found', 'not_found'
+    ]
+    assert queries < 15
+
+    db.session.expire_all()
+    shipped_at = first.shipped_at
+    assert shipped_at is not None and fourth.shipped_at is None
+    assert OutboxEvent.query.filter_by(event_type='order.status_changed').count() == 3
+
+    response = client.post('/api/admin/orders/status', json={
+        'status': 'shipped', 'order_ids': [first.id]
+    }, headers=auth_headers)
+    assert response.json['results'][0]['result'] == 'unchanged'
+    response = client.post('/api/admin/orders/status', json={
+        'status': 'delivered', 'order_ids': [first.id, second.id]
+    }, headers=auth_headers)
+    assert response.json['updated'] == 2
+    db.session.expire_all()
+    assert first.shipped_at == shipped_at and first.delivered_at is not None
+    assert client.post('/api/admin/orders/status', json={'status': 'lost', 'order_ids': [1]},
+                       headers=auth_headers).status_code == 400
+
+
+def test_customer_stats_sorting_and_segments(app, client, auth_headers):
+    """Test customer_stats rows follow order events and drive the admin user sorts and filters."""
+    admin = User.query.filter_by(email='test@example.com').first()
+    auth_headers = _promote_to_admin(client, admin)
+    customers = [User(email=f'c{i}@example.com', first_name='C', last_name=str(i)) for i in range(3)]
+    for user in customers:
+        user.set_password('password123')
+    db.session.add_all(customers)
+    db.session.commit()
+    assert CustomerStats.query.count() == 4
+
+    products = _create_catalog(1)
+    _create_orders(customers[0], products, 1)
+    _create_orders(customers[1], products, 3)
+    for order in Order.query.filter_by(user_id=customers[1].id):
+        record_order_event('order.created', order)
+    db.session.commit()
+    while dispatch_batch():
+        pass
+
+    def emails(**params):
+        response = client.get('/api/admin/users', query_string=params, headers=auth_headers)
+        return [(user['email'], user['stats']['orders_count']) for user in response.json['users']]
+
+    # Events refresh only their customer; the job refreshes everyone
+    assert emails(sort='orders_count', min_orders=1) == [('c1@example.com', 3)]
+    result = app.test_cli_runner().invoke(args=['customers', 'refresh-stats'])
+    assert 'Refreshed statistics for 4 customers' in result.output
+    assert emails(sort='lifetime_value', min_orders=1) == [('c1@example.com', 3), ('c0@example.com', 1)]
+    assert emails(sort='orders_count', order='asc', segment='new') == [('c0@example.com', 1)]
+    assert emails(segment='loyal') == [('c1@example.com', 3)]
+    assert len(emails(segment='prospect')) == 2
+
+    order_id = Order.query.filter_by(user_id=customers[0].id).first().id
+    client.post('/api/admin/orders/cancel', json={'order_ids': [order_id]}, headers=auth_headers)
+    while dispatch_batch():
+        pass
+    assert emails(min_orders=1) == [('c1@example.com', 3)]
+    assert client.get('/api/admin/users?sort=nope', headers=auth_headers).status_code == 400
+
+    # Cancelling a single order refreshes the customer too; cancelled orders stay cancelled
+    order_id = Order.query.filter_by(user_id=customers[1].id).first().id
+    response = client.put(f'/api/admin/orders/{order_id}', json={'status': 'cancelled'}, headers=auth_headers)
+    assert response.status_code == 200
+    while dispatch_batch():
+        pass
+    assert emails(min_orders=1) == [('c1@example.com', 2)]
+    response = client.put(f'/api/admin/orders/{order_id}', json={'status': 'confirmed'}, headers=auth_headers)
+    assert response.status_code == 400
+
+    # Users without a stats row are still listed, as prospects
+    CustomerStats.query.filter_by(user_id=customers[2].id).delete()
+    db.session.commit()
+    assert ('c2@example.com', 0) in emails(segment='prospect')
+    assert len(emails()) == 4
+    # and sort like customers without orders, who never come before the others by last order
+    assert [email for email, _ in emails(sort='lifetime_value', order='asc')] == [
+        'c2@example.com', 'c0@example.com', 'test@example.com', 'c1@example.com'
+    ]
+    for order in ('asc', 'desc'):
+        assert emails(sort='last_order_at', order=order)[0] == ('c1@example.com', 2)
+
+
+def test_admin_authorization_uses_claims_and_principal_cache(app, client, auth_headers):
+    """Test admin routes authorize from token claims and a cached principal, invalidated on role changes."""
+    client.get('/api/cart/count', headers=auth_headers)  # loads the revocation filter
+    response, queries = _count_queries(app, lambda: client.get('/api/admin/inventory/alerts', headers=auth_headers))
+    assert response.status_code == 403 and queries == 0
+
+    admin = User.query.filter_by(email='test@example.com').first()
+    admin_headers = _promote_to_admin(client, admin)
+    client.post('/api/auth/register', json={
+        'email': 'ops@example.com', 'password': 'testpass123', 'first_name': 'Ops', 'last_name': 'User'
+    })
+    ops = User.query.filter_by(email='ops@example.com').first()
+    ops_headers = _promote_to_admin(client, ops)
+
+    _, first = _count_queries(app, lambda: client.get('/api/admin/inventory/alerts', headers=ops_headers))
+    response, second = _count_queries(app, lambda: client.get('/api/admin/inventory/alerts', headers=ops_headers))
+    assert response.status_code == 200 and second == first - 1
+
+    response = client.put(f'/api/admin/users/{ops.id}', json={'is_active': False}, headers=admin_headers)
+    assert response.status_code == 200
+    assert client.get('/api/admin/inventory/alerts', headers=ops_headers).status_code == 403
+    assert client.post('/api/products', json={}, headers=ops_headers).status_code == 403
+
+
+def test_password_hashing_pool_backpressure_and_rehash(app, client, auth_headers):
+    """Test logins rehash at the configured cost and get a fast 503 when the hashing pool is full."""
+    credentials = {'email': 'test@example.com', 'password': 'testpass123'}
+    user = User.query.filter_by(email='test@example.com').first()
+    assert passwords.hash_cost(user.password_hash) == 4
+
+    app.config['BCRYPT_ROUNDS'] = 5
+    assert client.post('/api/auth/login', json=credentials).status_code == 200
+    db.session.expire_all()
+    assert passwords.hash_cost(user.password_hash) == 5
+
+    # Take every worker and queue slot
+    taken = 0
+    while passwords._slots.acquire(blocking=False):
+        taken += 1
+    try:
+        response = client.post('/api/auth/login', json=credentials)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/api/products').status_code == 200
+    finally:
+        for _ in range(taken):
+            passwords._slots.release()
+    assert client.post('/api/auth/login', json=credentials).status_code == 200
+
+    # A corrupted stored hash fails the login instead of erroring
+    user.password_hash = 'not-a-bcrypt-hash'
+    db.session.commit()
+    assert passwords.hash_cost(user.password_hash) is None
+    assert client.post('/api/auth/login', json=credentials).status_code == 401
+
+
+def test_rate_limiting_auth_and_write_endpoints(app, client, auth_headers):
+    """Test login is limited per IP, cart writes per user, and reads are never limited."""
+    app.extensions['rate_limiter'] = RateLimiter(
+        {'auth.login': ['ip:3/minute'], 'cart': ['user:2/minute']}, MemoryBackend()
+    )
+    credentials = {'email': 'test@example.com', 'password': 'testpass123'}
+    for remaining in (2, 1, 0):
+        response = client.post('/api/auth/login', json=credentials)
+        assert response.status_code == 200
+        assert response.headers['X-RateLimit-Limit'] == '3'
+        assert response.headers['X-RateLimit-Remaining'] == str(remaining)
+    response = client.post('/api/auth/login', json=credentials)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 20
+    # Another client IP has its own bucket
+    assert client.post('/api/auth/login', json=credentials,
+                       environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+    # Behind a trusted proxy, clients are told apart by X-Forwarded-For
+    with mock.patch.dict('os.environ', {'TRUSTED_PROXY_COUNT': '1', 'DATABASE_URL': 'sqlite:///:memory:'}):
+        proxied = create_app()
+    proxied.extensions['rate_limiter'] = RateLimiter({'auth.login': ['ip:1/minute']}, MemoryBackend())
+    with proxied.app_context():
+        db.create_all()
+        proxy_client = proxied.test_client()
+        for forwarded_for, status in (('203.0.113.1', 401), ('203.0.113.1', 429), ('203.0.113.2', 401)):
+            response = proxy_client.post('/api/auth/login', json={'email': 'nobody@example.com', 'password': 'x'},
+                                         headers={'X-Forwarded-For': forwarded_for})
+            assert response.status_code == status
+
+    for _ in range(2):
+        assert client.delete('/api/cart/clear', headers=auth_headers).status_code != 429
+    assert client.delete('/api/cart/clear', headers=auth_headers).status_code == 429
+    assert client.get('/api/cart', headers=auth_headers).status_code == 200
+
+    assert parse_rule('user:60/minute;burst=20') == ('user', 20, 1.0, 'user:60/minute;burst=20')
+
+
+def test_refresh_token_rotation_and_revocation(app, client, auth_headers):
+    """Test refresh tokens rotate, logout revokes tokens, and unrevoked tokens skip the database."""
+    credentials = {'email': 'test@example.com', 'password': 'testpass123'}
+    login = client.post('/api/auth/login', json=credentials).json
+    refresh_headers = {'Authorization': f"Bearer {login['refresh_token']}"}
+    access_headers = {'Authorization': f"Bearer {login['access_token']}"}
+
+    # Refresh tokens are only accepted by /refresh, and only once
+    assert client.get('/api/auth/profile', headers=refresh_headers).status_code == 422
+    rotated = client.post('/api/auth/refresh', headers=refresh_headers)
+    assert rotated.status_code == 200
+    assert client.post('/api/auth/refresh', headers=refresh_headers).status_code == 401
+    assert RevokedToken.query.count() == 1
+
+    # The filter answers for tokens that were never revoked without a query
+    response, statements = _count_queries(app, lambda: client.get('/api/auth/verify-token', headers=access_headers))
+    assert response.status_code == 200
+    assert statements == 1  # verify-token's own user lookup
+
+    response = client.post('/api/auth/logout', headers=access_headers,
+                           json={'refresh_token': rotated.json['refresh_token']})
+    assert response.status_code == 200
+    assert client.get('/api/auth/profile', headers=access_headers).status_code == 401
+    assert client.post('/api/auth/refresh', headers={
+        'Authorization': f"Bearer {rotated.json['refresh_token']}"
+    }).status_code == 401
+
+    # Deactivated users cannot refresh
+    fresh = client.post('/api/auth/login', json=credentials).json
+    user = User.query.filter_by(email='test@example.com').first()
+    user.is_active = False
+    db.session.commit()
+    principal_cache.clear()
+    assert client.post('/api/auth/refresh', headers={
+        'Authorization': f"Bearer {fresh['refresh_token']}"
+    }).status_code == 401
+
+    # Tokens from before expiry was enforced are retired
+    with app.test_request_context():
+        legacy = create_access_token(identity=user.id, expires_delta=False)
+    assert client.get('/api/auth/profile', headers={'Authorization': f'Bearer {legacy}'}).status_code == 401
+
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(seconds=-1)
+    revocation_filter.clear()
+    runner = app.test_cli_runner()
+    assert 'Purged 0' in runner.invoke(args=['tokens', 'purge']).output
+
+
+def test_bulk_customer_import(app, client, auth_headers, tmp_path):
+    """Test the CSV import hashes or keeps passwords, checks emails per chunk and reports rejections."""
+    import bcrypt
+    legacy_hash = bcrypt.hashpw(b'oldpass123', bcrypt.gensalt(4)).decode('utf-8')
+    csv_path = tmp_path / 'customers.csv'
+    csv_path.write_text(
+        'email,first_name,last_name,phone,password,password_hash\n'
+        'Ana@Example.com,Ana,Moraes,555,newpass123,\n'
+        f'bo@example.com,Bo,Lindqvist,,,{legacy_hash}\n'
+        'ana@example.com,Ana,Again,,newpass123,\n'
+        'test@example.com,Test,User,,testpass123,\n'
+        'not-an-email,No,Email,,newpass123,\n'
+        'weak@example.com,Weak,Password,,short,\n'
+        'hash@example.com,Bad,Hash,,,plaintext\n'
+        'cy@example.com,Cy,"Multi\nLine",,newpass123,\n'
+    )
+    rejects_path = tmp_path / 'rejects.csv'
+    result = app.test_cli_runner().invoke(args=[
+        'customers', 'import', str(csv_path), '--chunk-size', '3', '--workers', '1', '--rejects', str(rejects_path)
+    ])
+    assert 'Imported 3 of 8 rows, rejected 5' in result.output
+
+    with open(rejects_path, newline='') as f:
+        rejects = {row['email']: (row['line'], row['reason']) for row in csv.DictReader(f)}
+    assert rejects == {
+        'ana@example.com': ('4', 'Duplicate email in file'),
+        'test@example.com': ('5', 'Email already registered'),
+        'not-an-email': ('6', 'Invalid email format'),
+        'weak@example.com': ('7', 'Password must be at least 8 characters long'),
+        'hash@example.com': ('8', 'password_hash is not a bcrypt hash'),
+    }
+
+    for email, password in [('ana@example.com', 'newpass123'), ('bo@example.com', 'oldpass123')]:
+        assert client.post('/api/auth/login', json={'email': email, 'password': password}).status_code == 200
+    imported = User.query.filter(User.email.in_(['ana@example.com', 'bo@example.com', 'cy@example.com'])).all()
+    assert all(user.customer_stats.segment == 'prospect' for user in imported)
+
+    admin_headers = _promote_to_admin(client, User.query.filter_by(email='test@example.com').first())
+    response = client.get('/api/admin/users?search=lindq', headers=admin_headers)
+    assert [user['email'] for user in response.json['users']] == ['bo@example.com']
+
+
+def test_benchmark_cases_cover_every_endpoint(app):
+    """Test the API benchmark has a case for every endpoint and its dataset builds."""
+    from benchmarks.api import CASES
+    from benchmarks.datasets import build_dataset
+    covered = {bench_case.name.split(':')[0] for bench_case in CASES}
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint != 'static'}
+    assert endpoints <= covered
+
+    counts = build_dataset(200, seed=7)
+    assert counts['orders'] == Order.query.count() == 200
+    assert CustomerStats.query.count() == counts['users']
+    assert DailySales.query.count() > 0
+
+
+def test_data_generator_is_deterministic_and_skewed(app, client):
+    """Test the data generator command writes the same realistic rows for the same seed."""
+    from app.datagen import DEMO_ADMIN, DEMO_CUSTOMER, DEMO_CUSTOMER_ORDERS, generate_data
+    args = ['data', 'generate', '--users', '60', '--categories', '5', '--products', '80',
+            '--carts', '40', '--orders', '400', '--seed', '3', '--end-date', '2024-06-01']
+    result = app.test_cli_runner().invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert 'Wrote 400 orders' in result.output
+    assert (User.query.count(), Product.query.count(), Order.query.count()) == (60, 80, 400)
+
+    def fingerprint():
+        return (
+            [(order.user_id, order.created_at, order.status, order.total_amount)
+             for order in Order.query.order_by(Order.id)],
+            [(item.product_id, item.quantity) for item in OrderItem.query.order_by(OrderItem.id)],
+        )
+    first = fingerprint()
+    assert all(datetime(2023, 6, 2) <= created_at < datetime(2024, 6, 1) for _, created_at, _, _ in first[0])
+    # Popular products sell far more than the average
+    sales = db.session.query(OrderItem.product_id, db.func.count()).group_by(OrderItem.product_id).all()
+    assert max(count for _, count in sales) > 4 * len(first[1]) / 80
+    assert Order.query.filter_by(user_id=2).count() == DEMO_CUSTOMER_ORDERS
+
+    for email, password in (DEMO_ADMIN, DEMO_CUSTOMER):
+        assert client.post('/api/auth/login', json={'email': email, 'password': password}).status_code == 200
+    with pytest.raises(ValueError):
+        generate_data(10, 1, 10, 0, 0)
+
+    db.drop_all()
+    db.create_all()
+    generate_data(60, 5, 80, 40, 400, seed=3, end=datetime(2024, 6, 1))
+    assert fingerprint() == first
@@ -24,12 +24,44 @@ api.interceptors.request.use(
   }
 );
 
+// Access tokens are short-lived: on a 401, exchange the refresh token once and retry
+let refreshing: Promise<string> | null = null;
+
+const refreshAccessToken = async (): Promise<string> => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) {
+    throw new Error('No refresh token');
+  }
+  const response = await axios.post(`${API_BASE_URL}/auth/refresh`, null, {
+    headers: { Authorization: `Bearer ${refreshToken}` },
+  });
+  localStorage.setItem('token', response.data.access_token);
+  localStorage.setItem('refreshToken', response.data.refresh_token);
+  return response.data.access_token;
+};
+
 // Add response interceptor to handle auth errors
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const request = error.config;
+    if (error.response?.status === 401 && request && !request._retried) {
+      request._retried = true;
+      try {
+        // Concurrent 401s share one refresh, since each refresh token works once
+        refreshing = refreshing || refreshAccessToken().finally(() => {
+          refreshing = null;
+        });
+        const token = await refreshing;
+        request.headers.Authorization = `Bearer ${token}`;
+        return api(request);
+      } catch {
+        // Fall through to signing out
+      }
+    }
     if (error.response?.status === 401) {
       localStorage.removeItem('token');
+      localStorage.removeItem('refreshToken');
       localStorage.removeItem('user');
       window.location.href = '/login';
     }
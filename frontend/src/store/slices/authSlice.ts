@@ -24,8 +24,9 @@ export const login = createAsyncThunk(
   async (credentials: LoginCredentials, { rejectWithValue }) => {
     try {
       const response = await api.post('/auth/login', credentials);
-      const { user, access_token } = response.data;
+      const { user, access_token, refresh_token } = response.data;
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
       localStorage.setItem('user', JSON.stringify(user));
       return { user, token: access_token };
     } catch (error: any) {
@@ -39,8 +40,9 @@ export const register = createAsyncThunk(
   async (userData: RegisterData, { rejectWithValue }) => {
     try {
       const response = await api.post('/auth/register', userData);
-      const { user, access_token } = response.data;
+      const { user, access_token, refresh_token } = response.data;
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refreshToken', refresh_token);
       localStorage.setItem('user', JSON.stringify(user));
       return { user, token: access_token };
     } catch (error: any) {
@@ -50,7 +52,13 @@ export const register = createAsyncThunk(
 );
 
 export const logout = createAsyncThunk('auth/logout', async () => {
+  try {
+    await api.post('/auth/logout', { refresh_token: localStorage.getItem('refreshToken') });
+  } catch {
+    // Signing out locally is enough if the tokens are already invalid
+  }
   localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
   localStorage.removeItem('user');
 });
 